@@ -0,0 +1,2 @@
+# Offline benchmark suite: a fake Graph server, a stub model and a runner.
+# Run with `python -m bench.run`; no network or Microsoft/OpenAI credentials needed.
@@ -0,0 +1,182 @@
+import asyncio
+import random
+import re
+import socket
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+_GIVEN_NAME_FILTER = re.compile(r"startswith\(givenName, '((?:[^']|'')*)'\)")
+
+
+class FakeGraph:
+    """
+    In-process stand-in for the Graph endpoints the assistant uses
+
+    Every request (and every $batch sub-request) waits `latency` seconds plus up to
+    `jitter`, and is answered with 429 + Retry-After with probability `rate_429`, or
+    whenever more than `max_concurrent` operations are already running (0: no limit).
+    `fail_next` makes chosen operations fail deterministically. Counts of what was
+    received are kept in `counts`, per operation in `counts["<METHOD> <path>"]`.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=0, max_concurrent=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.max_concurrent = max_concurrent
+        self._active = 0
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        # event id -> event, so PATCH can update what POST created
+        self.events = {}
+        # "<METHOD> <path>" -> statuses the next operations on it are answered with
+        self.faults = {}
+        self.app = Starlette(routes=[
+            Route("/v1.0/$batch", self._batch, methods=["POST"]),
+            Route("/v1.0/users", self._users_route, methods=["GET"]),
+            Route("/v1.0/me/events", self._events_route, methods=["POST"]),
+            Route("/v1.0/me/events/{event_id}", self._event_route, methods=["PATCH"]),
+            Route("/v1.0/me/calendar/getSchedule", self._schedule_route, methods=["POST"]),
+        ])
+
+    def fail_next(self, method, path, *statuses):
+        """Answer the next operations on `path` (e.g. "/me/events") with `statuses`, in order"""
+        self.faults.setdefault(f"{method} {path}", []).extend(statuses)
+
+    # --- behaviour shared by direct requests and $batch sub-requests ---
+
+    async def _delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+
+    def _throttled(self):
+        over_limit = self.max_concurrent and self._active > self.max_concurrent
+        if over_limit or self.rate_429 and self.random.random() < self.rate_429:
+            self.counts["throttled"] += 1
+            return 429, {"Retry-After": str(self.retry_after)}, {"error": {"code": "TooManyRequests"}}
+        return None
+
+    def _users(self, query):
+        match = _GIVEN_NAME_FILTER.search(unquote(query.get("$filter", "")))
+        if not match:
+            return 400, {}, {"error": {"code": "BadRequest", "message": "unsupported filter"}}
+        name = match.group(1).replace("''", "'")
+        return 200, {}, {"value": [{"givenName": name, "mail": f"{name.lower()}@contoso.example"}]}
+
+    def _events(self, body):
+        event = dict(body)
+        event["id"] = uuid.uuid4().hex
+        event["webLink"] = f"https://outlook.example/{event['id']}"
+        self.events[event["id"]] = event
+        return 201, {}, event
+
+    def _update_event(self, event_id, body):
+        if event_id not in self.events:
+            return 404, {}, {"error": {"code": "ErrorItemNotFound"}}
+        self.events[event_id].update(body)
+        return 200, {}, self.events[event_id]
+
+    def _schedule(self, body):
+        return 200, {}, {"value": [
+            {"scheduleId": email, "scheduleItems": []} for email in body.get("schedules", [])
+        ]}
+
+    async def _dispatch(self, method, path, query, body):
+        self.counts["operations"] += 1
+        self.counts[f"{method} {path}"] += 1
+        self._active += 1
+        try:
+            await self._delay()
+            throttled = self._throttled()
+        finally:
+            self._active -= 1
+        if throttled:
+            return throttled
+        faults = self.faults.get(f"{method} {path}")
+        if faults:
+            status = faults.pop(0)
+            self.counts["faults"] += 1
+            return status, {"Retry-After": "0"}, {"error": {"code": "InjectedFault", "status": status}}
+        if method == "GET" and path == "/users":
+            return self._users(query)
+        if method == "POST" and path == "/me/events":
+            return self._events(body)
+        if method == "PATCH" and path.startswith("/me/events/"):
+            return self._update_event(path.rsplit("/", 1)[1], body)
+        if method == "POST" and path == "/me/calendar/getSchedule":
+            return self._schedule(body)
+        return 404, {}, {"error": {"code": "NotFound"}}
+
+    # --- HTTP routes ---
+
+    async def _respond(self, request: Request, path):
+        self.counts["http_requests"] += 1
+        body = await request.json() if request.method in ("POST", "PATCH") else None
+        query = {k: v[0] for k, v in parse_qs(request.url.query).items()}
+        status, headers, payload = await self._dispatch(request.method, path, query, body)
+        return JSONResponse(payload, status_code=status, headers=headers)
+
+    async def _users_route(self, request):
+        return await self._respond(request, "/users")
+
+    async def _events_route(self, request):
+        return await self._respond(request, "/me/events")
+
+    async def _event_route(self, request):
+        return await self._respond(request, f"/me/events/{request.path_params['event_id']}")
+
+    async def _schedule_route(self, request):
+        return await self._respond(request, "/me/calendar/getSchedule")
+
+    async def _batch(self, request: Request):
+        self.counts["http_requests"] += 1
+        self.counts["batches"] += 1
+        payload = await request.json()
+
+        async def run(sub):
+            url = urlsplit(sub["url"])
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            status, headers, body = await self._dispatch(sub["method"], url.path, query, sub.get("body"))
+            return {"id": sub["id"], "status": status, "headers": headers, "body": body}
+
+        responses = await asyncio.gather(*(run(sub) for sub in payload.get("requests", [])))
+        return JSONResponse({"responses": responses})
+
+    # --- lifecycle ---
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Serve in the background on the running loop; returns the Graph base url"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        self._server = uvicorn.Server(uvicorn.Config(self.app, log_level="warning", access_log=False))
+        self._task = asyncio.create_task(self._server.serve(sockets=[sock]))
+        while not self._server.started:
+            await asyncio.sleep(0.01)
+        return f"http://{host}:{sock.getsockname()[1]}/v1.0"
+
+    async def stop(self):
+        self._server.should_exit = True
+        await self._task
+
+
+# hands out a dummy bearer token; the fake server never checks it
+class FakeCredential:
+    def get_token(self, *scopes, **kwargs):
+        from azure.core.credentials import AccessToken
+        return AccessToken("fake-token", int(time.time()) + 3600)
+
+
+def fake_graph_client(base_url):
+    """GraphServiceClient on the shared transport, pointed at a FakeGraph"""
+    from utils import build_graph_client
+    return build_graph_client(FakeCredential(), ["User.Read"], base_url=base_url)
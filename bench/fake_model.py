@@ -0,0 +1,99 @@
+import asyncio
+import json
+import random
+import re
+from datetime import datetime, timedelta
+
+from agents import Model, ModelResponse, Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+
+_WITH_NAMES = re.compile(r"\bwith ([\w' ,-]+?)(?: about | tomorrow| next |$)")
+
+
+def intent_for(text: str) -> dict:
+    """Deterministic IntentParserOutput fields for a benchmark request"""
+    match = _WITH_NAMES.search(text)
+    names = [n.strip() for n in re.split(r",| and ", match.group(1))] if match else []
+    start = (datetime.now() + timedelta(days=1)).replace(hour=14, minute=0, second=0, microsecond=0)
+    return {
+        "subject": text[:60],
+        "attendees": [n for n in names if n],
+        "start_date_time": start.isoformat(),
+        "start_time_zone": "Pacific Standard Time",
+        "end_date_time": (start + timedelta(minutes=30)).isoformat(),
+        "end_time_zone": "Pacific Standard Time",
+        "description": "",
+        "location": "",
+    }
+
+
+class FakeModel(Model):
+    """
+    Stub model provider for the Agents SDK
+
+    Answers every request with the structured output `intent_for` derives from the
+    user's text, after `latency` seconds plus up to `jitter`, and reports token usage
+    proportional to the prompt so cost accounting can be exercised.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def _answer(self, system_instructions, input):
+        self.calls += 1
+        text = input if isinstance(input, str) else " ".join(
+            str(item.get("content", "")) for item in input if isinstance(item, dict)
+        )
+        output = json.dumps(intent_for(text))
+        message = ResponseOutputMessage(
+            id=f"msg_{self.calls}",
+            content=[ResponseOutputText(text=output, type="output_text", annotations=[])],
+            role="assistant",
+            status="completed",
+            type="message",
+        )
+        prompt_tokens = (len(system_instructions or "") + len(text)) // 4
+        usage = Usage(requests=1, input_tokens=prompt_tokens, output_tokens=len(output) // 4,
+                      total_tokens=prompt_tokens + len(output) // 4)
+        return output, message, usage
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, *, previous_response_id=None):
+        output, message, usage = self._answer(system_instructions, input)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+        return ModelResponse([message], usage, None)
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, *, previous_response_id=None):
+        """Streams the same answer as get_response in ~4-character deltas spread over the latency"""
+        output, message, usage = self._answer(system_instructions, input)
+        chunks = [output[i:i + 4] for i in range(0, len(output), 4)]
+        loop = asyncio.get_running_loop()
+        start, delay = loop.time(), (self.latency + self.random.random() * self.jitter) / len(chunks)
+        for i, chunk in enumerate(chunks):
+            if delay:
+                # sleep until an absolute deadline so per-chunk timer overhead doesn't add up
+                await asyncio.sleep(max(0.0, start + (i + 1) * delay - loop.time()))
+            # model_construct keeps the stub independent of the exact openai event schema version
+            yield ResponseTextDeltaEvent.model_construct(
+                type="response.output_text.delta", delta=chunk, item_id=message.id,
+                output_index=0, content_index=0, sequence_number=i, logprobs=[],
+            )
+        response = Response.model_construct(
+            id=f"resp_{self.calls}", object="response", output=[message],
+            usage=ResponseUsage.model_construct(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens,
+                                                total_tokens=usage.total_tokens),
+        )
+        yield ResponseCompletedEvent.model_construct(type="response.completed", response=response,
+                                                     sequence_number=len(chunks))
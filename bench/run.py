@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import agents
+
+from bench.fake_graph import FakeGraph, fake_graph_client
+from bench.fake_model import FakeModel
+
+# (name, requests, attendees per request, concurrent requests)
+DEFAULT_CASES = [
+    ("attendees-1", 50, 1, 1),
+    ("attendees-10", 50, 10, 1),
+    ("attendees-100", 20, 100, 1),
+    ("batch-1k", 1000, 3, 50),
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def request_text(i, attendees, unique_names=False):
+    # unique names defeat the name cache, so every request pays for its directory lookups
+    names = ", ".join(f"user{i}x{j}" if unique_names else f"user{j}" for j in range(attendees))
+    return f"benchmark sync with {names} tomorrow 2pm"
+
+
+async def run_case(name, requests, attendees, concurrency, graph_options, model_options, fast_path=True,
+                   stream=False, unique_names=False, outbox=False):
+    # imported here so `python -m bench.run --help` stays fast
+    import main
+    from utils import close_http_client
+    from utils.single_pass import schedule_request
+
+    outbox_dir = None
+    if outbox:
+        # schedule_meeting returns once the event is queued; the drain is timed separately
+        outbox_dir = tempfile.TemporaryDirectory()
+        os.environ["OUTBOX_PATH"] = os.path.join(outbox_dir.name, "outbox.db")
+
+    fake = FakeGraph(**graph_options)
+    base_url = await fake.start()
+    model = FakeModel(**model_options)
+    agent = main.get_intent_parser_agent().clone(model=model)
+    client = fake_graph_client(base_url)
+
+    latencies, failures = [], 0
+    tokens = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal failures, tokens
+        async with semaphore:
+            start = time.perf_counter()
+            text = request_text(i, attendees, unique_names)
+            try:
+                result = await schedule_request(client, agent, text, main.current_time_context(),
+                                                stream=stream, fast_path=fast_path)
+                tokens += result["usage"]["input_tokens"] + result["usage"]["output_tokens"]
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    drain = None
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        wall = time.perf_counter() - start
+        if outbox:
+            from utils.outbox import close_outbox
+            await close_outbox(timeout=600)
+            drain = time.perf_counter() - start - wall
+            del os.environ["OUTBOX_PATH"]
+            outbox_dir.cleanup()
+        await close_http_client()
+        await fake.stop()
+
+    latencies.sort()
+    result = {
+        "case": name,
+        "requests": requests,
+        "attendees": attendees,
+        "concurrency": concurrency,
+        "failures": failures,
+        "wall_s": round(wall, 4),
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "llm_calls": model.calls,
+        "llm_tokens_per_meeting": round(tokens / (requests - failures), 1) if requests > failures else 0.0,
+        "graph_http_requests": fake.counts["http_requests"],
+        "graph_operations": fake.counts["operations"],
+        "graph_throttled": fake.counts["throttled"],
+    }
+    if drain is not None:
+        result["outbox_drain_s"] = round(drain, 4)
+    return result
+
+
+def format_table(results):
+    columns = ["case", "requests", "failures", "throughput_rps", "p50_ms", "p95_ms", "p99_ms",
+               "llm_calls", "llm_tokens_per_meeting", "graph_http_requests", "graph_operations", "graph_throttled"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    lines = ["  ".join(c.rjust(widths[c]) for c in columns)]
+    for result in results:
+        lines.append("  ".join(str(result[c]).rjust(widths[c]) for c in columns))
+    return "\n".join(lines)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Regressions against a previous --json report: slower p95 or more Graph requests per case"""
+    previous = {r["case"]: r for r in baseline}
+    problems = []
+    for result in results:
+        before = previous.get(result["case"])
+        if not before:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            problems.append(f"{result['case']}: p95 {result['p95_ms']} ms vs {before['p95_ms']} ms")
+        if result["graph_http_requests"] > before["graph_http_requests"]:
+            problems.append(f"{result['case']}: {result['graph_http_requests']} Graph requests "
+                            f"vs {before['graph_http_requests']}")
+        if result["failures"] > before["failures"]:
+            problems.append(f"{result['case']}: {result['failures']} failures vs {before['failures']}")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark (fake Graph + stub model)")
+    parser.add_argument("--cases", nargs="*", help="subset of case names to run")
+    parser.add_argument("--graph-latency", type=float, default=0.02, help="seconds added to every Graph operation")
+    parser.add_argument("--graph-jitter", type=float, default=0.01, help="extra random Graph latency, seconds")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="probability a Graph operation is throttled")
+    parser.add_argument("--graph-max-concurrent", type=int, default=0,
+                        help="throttle Graph operations beyond this many at once (0: never)")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="seconds per stub model call")
+    parser.add_argument("--model-jitter", type=float, default=0.0, help="extra random model latency, seconds")
+    parser.add_argument("--no-fast-parse", action="store_true", help="send every request to the (stub) model")
+    parser.add_argument("--stream", action="store_true", help="streamed parse with attendee prefetch")
+    parser.add_argument("--unique-names", action="store_true", help="different attendee names in every request")
+    parser.add_argument("--outbox", action="store_true",
+                        help="queue events in the outbox (latency is until queued; the drain is reported apart)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="fail if results regress against this --json report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95 slowdown vs baseline")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    agents.set_tracing_disabled(True)
+
+    graph_options = {"latency": args.graph_latency, "jitter": args.graph_jitter,
+                     "rate_429": args.rate_429, "max_concurrent": args.graph_max_concurrent, "seed": args.seed}
+    model_options = {"latency": args.model_latency, "jitter": args.model_jitter, "seed": args.seed}
+    cases = [c for c in DEFAULT_CASES if not args.cases or c[0] in args.cases]
+
+    results = []
+    for case in cases:
+        results.append(await run_case(*case, graph_options, model_options, not args.no_fast_parse, args.stream,
+                                       args.unique_names, args.outbox))
+    print(format_table(results))
+    for result in results:
+        if "outbox_drain_s" in result:
+            print(f"{result['case']}: outbox drained {result['outbox_drain_s']} s after the last request")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare_to_baseline(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,31 +1,24 @@
-from agents import set_default_openai_key, Agent, Runner, RunContextWrapper, handoff, ItemHelpers
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
-from dataclasses import dataclass
-from typing import Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING
 import os
 import asyncio
+import argparse
 import sys
-from rich.console import Console
-from rich.panel import Panel
-from rich import print as rprint
 from datetime import datetime
-from utils import schedule_meeting, get_user_info
 import time
-import threading
-from server.autho_code_server import run_server, get_auth_code
-from azure.identity import AuthorizationCodeCredential
-from msgraph import GraphServiceClient
-from test import wait_for_auth_code
-import requests
+
+# heavy dependencies (agents, msgraph, msal, rich, pydantic) are imported where they are
+# first needed, so commands like `help` don't pay for them
+if TYPE_CHECKING:
+    from agents import Agent, RunContextWrapper
+    from models import CurrentTime, MeetingEditContext
 
 
 
 load_dotenv()
 
 
-api_key = os.getenv("OPENAI_KEY")
-set_default_openai_key(api_key)
 CLIENT_ID = os.getenv("CLIENT_ID")
 TENANT_ID = "common"
 SCOPES = ["User.Read"]
@@ -33,36 +26,9 @@ REDIRECT_URI = "http://localhost:8000/callback"
 AUTHORITY = f"https://login.microsoftonline.com/common"
 
 
-class IntentParserOutput(BaseModel):
-    """Class for structuring the output to parse the intent of a meeting through teams by using Microsoft Graph api"""
-    subject: str = Field(description="Meeting subject/title")
-    start_date_time: str = Field(description="Start time in ISO 8601 format")
-    start_time_zone: str = Field(description="Microsoft Graph compatible windows time zone")
-    end_date_time: str = Field(description="End time in ISO 8601 format")
-    end_time_zone: str = Field(description="Microsoft Graph compatible windows time zone")
-    attendees: list[str] = Field(description="List of attendee names")
-    description: str = Field(description="Meeting description/body")
-    location: str = Field(description="Meeting location")
-
-
-class ScheduleMeetingOutput(BaseModel):
-    """Class for structuring the meeting event output created"""
-    id: str
-    subject: str
-    start: str = Field(description="ISO 8601 start time")
-    end: str = Field(description="ISO 8601 end time")
-    web_link: Optional[str] = Field(description="Link to join the meeting")
-    
-class CurrentTime(BaseModel):
-    current_time: str 
-
-
-def dynamic_instructions(
-        context: RunContextWrapper[CurrentTime], agent: Agent[CurrentTime]) -> str:
-    now = context.context.current_time
-    return f"""
-    The current time is {now}.
-
+# static part of the intent parser's prompt; kept byte-identical between calls so the
+# provider's prompt cache can reuse it, with everything that changes appended after it
+INTENT_INSTRUCTIONS = """
     You are a helpful scheduling assistant that creates meetings in the future in Outlook calendars.
     Always use current or future dates (never before today).
 
@@ -82,36 +48,104 @@ def dynamic_instructions(
     - UTC
 
     If time zone is not specified, default to "Pacific Standard Time".
-    If a meeting description is not provided, leave it empty. If the user wants to schedule a meeting, handoff to the scheduling agent 
+    If a meeting description is not provided, leave it empty.
+
+    If the meeting repeats ("every Monday", "daily", "first Friday of each month"), fill in
+    recurrence with Microsoft Graph's pattern types (daily, weekly, absoluteMonthly,
+    relativeMonthly, absoluteYearly, relativeYearly) and use the first occurrence as the
+    start and end. Use range_type endDate with end_date (YYYY-MM-DD) when the series ends
+    on a date, numbered with number_of_occurrences for a count, and noEnd otherwise.
+    For a single meeting, leave recurrence null.
     """
 
-Scheduler_Agent = Agent(
-    name="Scheduling Agent",
-    instructions="Call the neccessary tools to schedule a meeting",
-    tools=[
-        schedule_meeting
-    ]
-)
+# precision of the current time shown to the model: second, minute, hour or day
+PROMPT_TIME_GRANULARITY = os.getenv("PROMPT_TIME_GRANULARITY", "minute")
+_TIME_FORMATS = {
+    "second": "%Y-%m-%d %H:%M:%S",
+    "minute": "%Y-%m-%d %H:%M",
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+}
+
+
+def prompt_time(current_time: str, granularity: str = None) -> str:
+    """CurrentTime ("%Y-%m-%d %H:%M:%S") truncated to PROMPT_TIME_GRANULARITY, with the weekday"""
+    value = datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
+    fmt = _TIME_FORMATS.get(granularity or PROMPT_TIME_GRANULARITY, _TIME_FORMATS["minute"])
+    return f"{value.strftime(fmt)} ({value:%A})"
+
+
+def dynamic_instructions(
+        context: "RunContextWrapper[CurrentTime]", agent: "Agent[CurrentTime]") -> str:
+    return f"{INTENT_INSTRUCTIONS}\n    The current time is {prompt_time(context.context.current_time)}.\n"
+
+# static part of the edit agent's prompt; the meeting and the current time follow it
+EDIT_INSTRUCTIONS = """
+    You are a helpful scheduling assistant editing a meeting that was already scheduled.
+    The user's message is a follow-up such as "make it 3pm instead" or "add bob".
+
+    Return only what the follow-up changes:
+    - Leave every field the user did not ask to change as null.
+    - Put names of people to invite in add_attendees and people to drop in remove_attendees;
+      never repeat attendees who stay.
+    - When the start moves, move the end too so the meeting keeps its length unless the user
+      gives a new end or duration.
+    - Dates and times are ISO 8601 (YYYY-MM-DDThh:mm:ss) in the meeting's time zone unless
+      the user names another Microsoft Graph compatible Windows time zone.
+    """
+
+
+def edit_instructions(
+        context: "RunContextWrapper[MeetingEditContext]", agent: "Agent[MeetingEditContext]") -> str:
+    return (f"{EDIT_INSTRUCTIONS}\n    The meeting: {context.context.meeting}\n"
+            f"    The current time is {prompt_time(context.context.current_time)}.\n")
+
+
+@lru_cache(maxsize=None)
+def get_intent_parser_agent():
+    from agents import Agent
+    from models import CurrentTime, IntentParserOutput
+
+    configure_openai()
+    return Agent[CurrentTime](
+        name="Intent Parser Agent",
+        instructions=dynamic_instructions,
+        output_type=IntentParserOutput
+    )
+
+
+@lru_cache(maxsize=None)
+def get_edit_agent():
+    from agents import Agent
+    from models import IntentPatch, MeetingEditContext
+
+    configure_openai()
+    return Agent[MeetingEditContext](
+        name="Meeting Edit Agent",
+        instructions=edit_instructions,
+        output_type=IntentPatch
+    )
+
 
+@lru_cache(maxsize=None)
+def configure_openai():
+    from agents import set_default_openai_key
 
-IntentParser_Agent = Agent[CurrentTime](
-    name="Intent Parser Agent",
-    instructions=dynamic_instructions,
-    output_type=IntentParserOutput
-)
+    api_key = os.getenv("OPENAI_KEY")
+    set_default_openai_key(api_key)
 
 
 async def process_user_request(user_input):
     """Process the user's natural language request using the agentic framework"""
+    from rich.console import Console
+    from utils.intent import parse_intent
+
     console = Console()
     
     with console.status("[bold green]Processing your request..."):
         # Run the agent to understand the request
-        context_obj = CurrentTime(current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        result = await Runner.run(starting_agent=IntentParser_Agent, 
-                                  input=user_input,
-                                  context=context_obj)
-        meeting_details = result.final_output_as(IntentParserOutput)
+        context_obj = current_time_context()
+        meeting_details = await parse_intent(get_intent_parser_agent(), user_input, context_obj)
 
         
     # # Show the extracted meeting details
@@ -170,6 +204,9 @@ async def process_user_request(user_input):
 
 def show_help():
     """Show help information about the assistant capabilities"""
+    from rich import print as rprint
+    from rich.panel import Panel
+
     rprint(Panel.fit(
         "[bold]Scheduling Assistant Capabilities:[/bold]\n\n"
         "This AI assistant can understand natural language requests to schedule meetings.\n\n"
@@ -258,45 +295,179 @@ def show_help():
 #             # Process the user's request using the agent
 #             return await process_user_request(user_input)
 
-async def test():
-    # Run the Flask server in a background thread
-    thread = threading.Thread(target=run_server, daemon=True)
-    thread.start()
+async def get_graph_client():
+    """Return an authenticated Graph client, signing in through the browser only if the token cache can't"""
+    from server import get_credential
+    from utils import build_graph_client
 
-    # Trigger the auth URL
-    requests.get("http://localhost:8000")
+    credential = await get_credential(SCOPES)
+    return build_graph_client(credential, SCOPES)
 
-    # Wait for the user to log in and capture the code
-    code = await wait_for_auth_code()
-    
-    credential = AuthorizationCodeCredential(
-        client_id=CLIENT_ID,
-        tenant_id=TENANT_ID,
-        authorization_code=code,
-        redirect_uri=REDIRECT_URI
-    )
-    
-    client = GraphServiceClient(credentials=credential, scopes=SCOPES)
 
-    context_obj = CurrentTime(current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    result = await Runner.run(starting_agent=IntentParser_Agent, 
-                              input="I want to schedule a meeting next thursday 12PM to 12:30PM pst with alice about Japanese tutoring class",
-                              context=context_obj)
-    meeting_details = result.final_output
-    
-    return await schedule_meeting(client, meeting_details)
+def current_time_context():
+    from models import CurrentTime
 
+    return CurrentTime(current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
-    
 
+async def test(stream=False):
+    from utils.metrics import format_usage
+    from utils.single_pass import schedule_request
 
-if __name__ == "__main__":
+    client = await get_graph_client()
+
+    context_obj = current_time_context()
+    user_input = "I want to schedule a meeting next thursday 12PM to 12:30PM pst with alice about Japanese tutoring class"
+    result = await schedule_request(client, get_intent_parser_agent(), user_input, context_obj, stream=stream)
+    print(f"meeting usage: {format_usage(result['usage'])}")
+    return result["event"]
+
+
+async def session(stream=False):
+    """Schedule a meeting, then apply each follow-up line ("make it 3pm instead", "add bob") to it"""
+    from utils.edit_session import MeetingSession
+    from utils.metrics import format_usage
+    from utils.validation import InvalidMeeting
+
+    meeting = MeetingSession(await get_graph_client(), get_intent_parser_agent(), get_edit_agent(),
+                             current_time_context)
+    while True:
+        user_input = (await asyncio.to_thread(input, "> ")).strip()
+        if user_input.lower() == "exit":
+            return meeting.event
+        if not user_input:
+            continue
+        try:
+            if meeting.details is None:
+                result = await meeting.schedule(user_input, stream=stream)
+            else:
+                result = await meeting.edit(user_input)
+        except InvalidMeeting as e:
+            print(f"not scheduled: {e}")
+            continue
+        except Exception as e:
+            # a Graph or outbox failure only fails this line; the session goes on
+            print(f"error: {type(e).__name__}: {e}")
+            continue
+        print(result["event"])
+        print(f"usage: {format_usage(result['usage'])}")
 
-    print(asyncio.run(test()))
+
+async def batch(input_path, output_path=None):
+    """Schedule every request in a JSONL file, see utils.pipeline.run_batch"""
+    from utils.pipeline import run_batch
+
+    client = await get_graph_client()
+    return await run_batch(client, get_intent_parser_agent(), current_time_context, input_path, output_path)
+
+
+async def run_service(host="127.0.0.1", port=8080):
+    """
+    Run the scheduling service (server.service)
+
+    Callers authenticate with an API key from SERVICE_API_KEYS ("key=account,..."); each
+    key acts for one account already signed in through the token cache (username or
+    home account id), which gets its own pooled Graph client. Tokens only ever come from
+    the cache: a request handler never starts the browser sign-in, and an account without
+    a cached sign-in gets a 401.
+    """
+    from server import MsalTokenCredential
+    from server.service import create_app, serve
+    from utils.client_pool import GraphClientPool
+
+    def credential_for(user):
+        # with an account_id the credential is silent only and raises PermissionError (401)
+        return MsalTokenCredential(SCOPES, account_id=user)
+
+    pool = GraphClientPool(credential_for, SCOPES).start()
+    if os.getenv("OUTBOX_PATH"):
+        from utils.outbox import get_outbox
+        # events queued before a restart are sent with their owner's pooled client
+        get_outbox().start(client_for=pool.get)
+
+    async def on_shutdown():
+        if "utils.outbox" in sys.modules:
+            await sys.modules["utils.outbox"].close_outbox()
+        await pool.close()
+
+    app = create_app(pool.get, get_intent_parser_agent(), current_time_context, on_shutdown=on_shutdown)
+    await serve(app, host, port)
+
+
+async def run_and_close(coro, metrics_port=None):
+    """Run a coroutine, then close the shared Graph connection pool"""
+    from utils.metrics import format_usage, track_usage
+
+    metrics_server = None
+    if metrics_port:
+        from server import CallbackServer
+        metrics_server = await CallbackServer(port=metrics_port).start()
+    try:
+        # every model call of the session, across requests
+        with track_usage() as usage:
+            return await coro
+    finally:
+        if usage["requests"]:
+            print(f"session usage: {format_usage(usage)}")
+        if metrics_server is not None:
+            await metrics_server.close()
+        # events still in the outbox are sent before the connections close
+        if "utils.outbox" in sys.modules:
+            await sys.modules["utils.outbox"].close_outbox()
+        # only touch the transport if something actually loaded it
+        if "utils.transport" in sys.modules:
+            await sys.modules["utils.transport"].close_http_client()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="AI Meeting Scheduling Assistant")
+    parser.add_argument("command", nargs="?", choices=["help"],
+                        help="'help' shows what the assistant can do")
+    parser.add_argument("--batch", metavar="REQUESTS_JSONL",
+                        help="schedule every request in a JSONL file instead of the demo request")
+    parser.add_argument("--output", metavar="RESULTS_JSONL",
+                        help="where --batch writes results (default: <input>.results.jsonl); "
+                             "re-running with the same file resumes after the last completed line")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="run the scheduling service (parse/resolve/schedule over HTTP) on PORT")
+    parser.add_argument("--session", action="store_true",
+                        help="schedule a meeting, then edit it with follow-up lines until 'exit'")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the parse and resolve attendees while the model is still generating")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://localhost:PORT/metrics while running")
+    parser.add_argument("--metrics-log", action="store_true",
+                        help="write per-stage timings and counts as JSON lines to stderr "
+                             "(set SCHEDULER_METRICS=0 to disable instrumentation)")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="run the command and report how long each module took to import")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.startup_profile:
+        from utils.startup import run_with_import_profile
+        sys.exit(run_with_import_profile([arg for arg in sys.argv if arg != "--startup-profile"]))
+
+    if args.metrics_log:
+        from utils.metrics import enable_json_log
+        enable_json_log()
+
+    if args.command == "help":
+        show_help()
+    elif args.serve:
+        asyncio.run(run_and_close(run_service(port=args.serve), args.metrics_port))
+    elif args.session:
+        print(asyncio.run(run_and_close(session(args.stream), args.metrics_port)))
+    elif args.batch:
+        print(asyncio.run(run_and_close(batch(args.batch, args.output), args.metrics_port)))
+    else:
+        print(asyncio.run(run_and_close(test(args.stream), args.metrics_port)))
 
     # try:
     #     asyncio.run(main())
     # except KeyboardInterrupt:
     #     print("\nExiting...")
     #     sys.exit(0)
-
@@ -1 +1,2 @@
-from .output_models import IntentParserOutput
\ No newline at end of file
+from .output_models import (IntentParserOutput, IntentPatch, RecurrenceSpec, ScheduleMeetingOutput, CurrentTime,
+                            MeetingEditContext)
@@ -1,14 +1,68 @@
 from pydantic import BaseModel, Field
+from typing import Literal, Optional
 
 
 
+class RecurrenceSpec(BaseModel):
+    """How a recurring meeting repeats; mirrors Graph's patternedRecurrence"""
+    pattern_type: Literal["daily", "weekly", "absoluteMonthly", "relativeMonthly", "absoluteYearly", "relativeYearly"] = \
+        Field(description="daily, weekly, absoluteMonthly (the 15th), relativeMonthly (the first monday), "
+                          "absoluteYearly or relativeYearly")
+    # no non-null defaults: structured outputs reject "default" in the schema
+    interval: int = Field(description="Repeat every `interval` days/weeks/months/years")
+    days_of_week: list[str] = Field(default_factory=list,
+                                    description="Lowercase weekdays for weekly and relative patterns, e.g. monday")
+    day_of_month: Optional[int] = Field(default=None, description="Day of the month for absolute patterns")
+    month: Optional[int] = Field(default=None, description="Month (1-12) for yearly patterns")
+    index: Optional[Literal["first", "second", "third", "fourth", "last"]] = \
+        Field(default=None, description="Which of the days_of_week in the month for relative patterns")
+    range_type: Literal["endDate", "noEnd", "numbered"] = \
+        Field(description="endDate (until end_date), numbered (number_of_occurrences) or noEnd")
+    end_date: Optional[str] = Field(default=None, description="Last date of the series, YYYY-MM-DD")
+    number_of_occurrences: Optional[int] = Field(default=None, description="Number of meetings in the series")
+
+
 class IntentParserOutput(BaseModel):
     """Class for structuring the output to parse the intent of a meeting through teams by using Microsoft Graph api"""
     subject: str = Field(description="Meeting subject/title")
+    # generated right after the subject so streamed runs can start resolving names early
+    attendees: list[str] = Field(description="List of attendee names")
     start_date_time: str = Field(description="Start time in ISO 8601 format")
     start_time_zone: str = Field(description="Microsoft Graph compatible windows time zone")
     end_date_time: str = Field(description="End time in ISO 8601 format")
     end_time_zone: str = Field(description="Microsoft Graph compatible windows time zone")
-    attendees: list[str] = Field(description="List of attendee names")
     description: str = Field(description="Meeting description/body")
     location: str = Field(description="Meeting location")
+    # last, so streamed runs see the attendees as early as before
+    recurrence: Optional[RecurrenceSpec] = Field(default=None, description="Repeat pattern, null for a single meeting")
+
+
+class IntentPatch(BaseModel):
+    """Changes a follow-up request makes to the previously parsed meeting; None leaves a field as it was"""
+    subject: Optional[str] = Field(default=None, description="New subject/title")
+    add_attendees: list[str] = Field(default_factory=list, description="Names of attendees to invite")
+    remove_attendees: list[str] = Field(default_factory=list, description="Names of attendees to drop")
+    start_date_time: Optional[str] = Field(default=None, description="New start time in ISO 8601 format")
+    start_time_zone: Optional[str] = Field(default=None, description="New start Windows time zone")
+    end_date_time: Optional[str] = Field(default=None, description="New end time in ISO 8601 format")
+    end_time_zone: Optional[str] = Field(default=None, description="New end Windows time zone")
+    description: Optional[str] = Field(default=None, description="New meeting description/body")
+    location: Optional[str] = Field(default=None, description="New meeting location")
+
+
+class ScheduleMeetingOutput(BaseModel):
+    """Class for structuring the meeting event output created"""
+    id: str
+    subject: str
+    start: str = Field(description="ISO 8601 start time")
+    end: str = Field(description="ISO 8601 end time")
+    web_link: Optional[str] = Field(description="Link to join the meeting")
+
+
+class CurrentTime(BaseModel):
+    current_time: str
+
+
+class MeetingEditContext(CurrentTime):
+    """Run context of the edit agent: the meeting being edited, as IntentParserOutput JSON"""
+    meeting: str
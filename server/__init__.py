@@ -1,6 +1,23 @@
 # Initialize the server package
 # This makes the server directory a proper Python package
 
-from .autho_code_server import get_auth_code, run_server
+import importlib
 
-__all__ = ['get_auth_code']
+from .autho_code_server import get_auth_code, wait_for_auth_code, CallbackServer
+
+# token_cache loads msal and msal_extensions, so it is imported on first use only;
+# `server.service` and the rest of the package do not need it
+_LAZY = {
+    "get_credential": ".token_cache",
+    "MsalTokenCredential": ".token_cache",
+}
+
+__all__ = ['get_auth_code', 'wait_for_auth_code', 'CallbackServer', 'get_credential', 'MsalTokenCredential']
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
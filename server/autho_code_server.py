@@ -1,15 +1,11 @@
 import os
-from flask import Flask, request
-from msal import PublicClientApplication
+import asyncio
+from urllib.parse import urlsplit, parse_qs
 from dotenv import load_dotenv
 import webbrowser
-from azure.identity import AuthorizationCodeCredential
-from msgraph import GraphServiceClient
 
 load_dotenv()
 
-app = Flask(__name__)
-
 CLIENT_ID = os.getenv("CLIENT_ID")
 TENANT_ID = os.getenv("TENANT_ID")
 SCOPES = ["User.Read"]
@@ -18,33 +14,128 @@ AUTHORITY = f"https://login.microsoftonline.com/common"
 # Shared variable to store the code
 auth_code_holder = {"code": None}
 
-# Create MSAL client
-msal_app = PublicClientApplication(client_id=CLIENT_ID, authority=AUTHORITY)
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class CallbackServer:
+    """
+    Minimal asyncio HTTP server for the OAuth redirect
+
+    `wait_for_code()` resolves the moment `/callback` is hit, with no polling and no extra
+    thread. It also serves the Prometheus `/metrics` route. Extra GET routes can be
+    registered in `routes`; a handler takes the parsed query string and returns
+    (status, content_type, body).
+    """
+
+    def __init__(self, host="localhost", port=8000, scopes=SCOPES):
+        self.host = host
+        self.port = port
+        self.scopes = scopes
+        self.routes = {"/": self._auth, "/callback": self._callback, "/metrics": self._metrics}
+        self._server = None
+        self._code = None
+
+    async def start(self):
+        self._code = asyncio.get_running_loop().create_future()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def wait_for_code(self, timeout=120):
+        """Wait for the redirect to deliver the authorization code"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._code), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("❌ Timed out waiting for auth code.") from None
 
-# Step 1: Generate auth URL and open in browser
-@app.route("/")
-def auth():
-    auth_url = msal_app.get_authorization_request_url(SCOPES, redirect_uri=REDIRECT_URI)
-    webbrowser.open(auth_url)
-    return "Opening Microsoft login page..."
+    # Step 1: Generate auth URL and open in browser
+    def _auth(self, query):
+        webbrowser.open(get_auth_url(self.scopes))
+        return 200, "text/plain", "Opening Microsoft login page..."
 
+    def _metrics(self, query):
+        from utils.metrics import metrics_route
+        return metrics_route(query)
 
+    def _callback(self, query):
+        if "error" in query:
+            if not self._code.done():
+                self._code.set_exception(PermissionError(query.get("error_description", query["error"])))
+            return 400, "text/plain", "Authorization failed."
+
+        code = query.get("code")
+        if not code:
+            return 400, "text/plain", "Authorization code not found."
+
+        # Store the code globally
+        auth_code_holder["code"] = code
+        if not self._code.done():
+            self._code.set_result(code)
+        return 200, "text/plain; charset=utf-8", "✅ Authorization complete! You may return to your app."
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # drain the headers; none of the routes need them
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                status, content_type, body = 400, "text/plain", "Bad request."
+            elif parts[0] != "GET":
+                status, content_type, body = 405, "text/plain", "Method not allowed."
+            else:
+                url = urlsplit(parts[1])
+                handler = self.routes.get(url.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if handler is None:
+                    status, content_type, body = 404, "text/plain", "Not found."
+                else:
+                    status, content_type, body = handler(query)
+
+            payload = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def get_auth_url(scopes=SCOPES):
+    # the MSAL client lives with the persistent token cache
+    from .token_cache import get_msal_app
+    return get_msal_app().get_authorization_request_url(scopes, redirect_uri=REDIRECT_URI)
 
-@app.route("/callback")
-def callback():
-    code = request.args.get("code")
-    if not code:
-        return "Authorization code not found."
-    
-    # Store the code globally
-    auth_code_holder["code"] = code
-    return "✅ Authorization complete! You may return to your app."
 
 def get_auth_code():
     return auth_code_holder["code"]
 
-def run_server():
-    app.run(port=8000)
+
+# opens the login page and returns the code as soon as the redirect arrives
+async def wait_for_auth_code(timeout=120, port=8000, scopes=SCOPES):
+    print("🔁 Waiting for user to authenticate and for code to arrive...")
+    async with CallbackServer(port=port, scopes=scopes) as server:
+        webbrowser.open(get_auth_url(scopes))
+        code = await server.wait_for_code(timeout)
+    print("✅ Received auth code!")
+    return code
+
 
 if __name__ == "__main__":
-    app.run(port=8000)
\ No newline at end of file
+    print(asyncio.run(wait_for_auth_code()))
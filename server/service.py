@@ -0,0 +1,306 @@
+import asyncio
+import contextlib
+import hmac
+import os
+import sys
+import uuid
+from collections import defaultdict
+from typing import Awaitable, Callable, Optional
+
+from pydantic import ValidationError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+# requests being worked on at once, across all users
+SERVICE_MAX_IN_FLIGHT = int(os.getenv("SERVICE_MAX_IN_FLIGHT", "64"))
+# admitted requests allowed to wait for a worker slot; beyond this the service answers 429
+SERVICE_MAX_QUEUE = int(os.getenv("SERVICE_MAX_QUEUE", "256"))
+# requests one user may have admitted (running or queued) at once
+SERVICE_PER_USER = int(os.getenv("SERVICE_PER_USER", "4"))
+# how long shutdown waits for admitted requests to finish
+SERVICE_DRAIN_SECONDS = float(os.getenv("SERVICE_DRAIN_SECONDS", "30"))
+
+# callers authenticate with "Authorization: Bearer <key>"; each key acts for one signed-in account,
+# given as "key=account,key=account" (account: username or home account id in the token cache)
+SERVICE_API_KEYS = os.getenv("SERVICE_API_KEYS", "")
+
+
+def parse_api_keys(spec: str) -> dict:
+    """API key -> account from a "key=account,key=account" string; malformed entries raise ValueError"""
+    keys = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        key, sep, account = entry.partition("=")
+        if not sep or not key.strip() or not account.strip():
+            raise ValueError(f"SERVICE_API_KEYS entry {entry!r} is not key=account")
+        keys[key.strip()] = account.strip()
+    return keys
+
+
+def authenticate(request: Request, api_keys: dict) -> Optional[str]:
+    """The account the request's bearer key acts for, or None"""
+    scheme, _, presented = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not presented.strip():
+        return None
+    account = None
+    # compare against every key in constant time, so timing says nothing about which one is close
+    for key, key_account in api_keys.items():
+        if hmac.compare_digest(key.encode(), presented.strip().encode()):
+            account = key_account
+    return account
+
+
+def _require(body, key: str, kind: type):
+    value = body.get(key) if isinstance(body, dict) else None
+    if not isinstance(value, kind):
+        raise ValueError(f"'{key}' ({kind.__name__}) is required")
+    return value
+
+
+# the caller's Idempotency-Key as a transactionId, scoped to the account so keys of two callers never meet
+def _transaction_id(request: Request, account: str) -> Optional[str]:
+    key = request.headers.get("idempotency-key", "").strip()
+    if not key:
+        return None
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{account}\n{key}"))
+
+
+class Rejected(Exception):
+    """The request was not admitted; `status` is 429 (saturated) or 503 (draining)"""
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class AdmissionControl:
+    """
+    Bounded admission for the scheduling service
+
+    At most `max_in_flight` requests run at once and at most `max_queue` more wait for a
+    slot; each user may hold `per_user` of those places. Requests beyond any limit are
+    rejected immediately instead of piling up, and after `drain()` starts nothing new is
+    admitted while the admitted requests finish.
+    """
+
+    def __init__(self, max_in_flight: int = SERVICE_MAX_IN_FLIGHT, max_queue: int = SERVICE_MAX_QUEUE,
+                 per_user: int = SERVICE_PER_USER):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._per_user = defaultdict(int)
+        self.admitted = 0
+        self.running = 0
+        self.rejected = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def queued(self):
+        return self.admitted - self.running
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user: str):
+        if self.draining:
+            self.rejected += 1
+            raise Rejected(503, "service is shutting down")
+        if self.admitted >= self.max_in_flight + self.max_queue:
+            self.rejected += 1
+            raise Rejected(429, "too many requests queued")
+        if self._per_user[user] >= self.per_user:
+            self.rejected += 1
+            raise Rejected(429, f"more than {self.per_user} concurrent requests for this user")
+
+        self._per_user[user] += 1
+        self.admitted += 1
+        self._idle.clear()
+        try:
+            async with self._slots:
+                self.running += 1
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+        finally:
+            self.admitted -= 1
+            self._per_user[user] -= 1
+            if not self._per_user[user]:
+                del self._per_user[user]
+            if not self.admitted:
+                self._idle.set()
+
+    async def drain(self, timeout: float = SERVICE_DRAIN_SECONDS):
+        """Stop admitting requests and wait (up to `timeout`) for the admitted ones to finish"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "status": "draining" if self.draining else "ok",
+            "running": self.running,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "users": len(self._per_user),
+        }
+
+
+def create_app(client_for_user: Callable[[str], Awaitable], agent, make_context,
+               admission: AdmissionControl = None, on_shutdown: Callable[[], Awaitable] = None,
+               api_keys: dict = None) -> Starlette:
+    """
+    ASGI app exposing the assistant as a shared service
+
+    Every request except /healthz and /metrics needs "Authorization: Bearer <key>"; the key
+    decides which account the request acts for (and whose admission limit it counts
+    against). Requests without a known key get 401. /schedule and /schedule-text take an
+    optional "Idempotency-Key" header: a retry with the same key returns the event created
+    the first time instead of a second one.
+
+    Routes (JSON in, JSON out):
+        POST /parse           {"text"}          -> meeting details
+        POST /resolve         {"names"}         -> {"emails": {name: email}}
+        POST /schedule        meeting details   -> created event ("allow_conflicts": true books over conflicts)
+        POST /schedule-text   {"text"}          -> {"details", "event", "usage"}
+        GET  /outbox/{transaction_id}           -> state of an event the caller queued in the outbox
+        GET  /healthz                           -> admission stats
+        GET  /metrics                           -> Prometheus text
+
+    Args:
+        client_for_user (Callable): async function returning the GraphServiceClient for a user id
+        agent (Agent): intent parser agent
+        make_context (Callable): builds the agent's run context (CurrentTime) for each request
+        admission (AdmissionControl, optional): admission limits, defaults from the SERVICE_* settings
+        on_shutdown (Callable, optional): awaited after the service has drained
+        api_keys (dict, optional): API key -> account, defaults to SERVICE_API_KEYS
+    """
+    from models import IntentParserOutput
+    from utils.graph import resolve_name_map_batched, schedule_meeting
+    from utils.intent import parse_intent
+    from utils.metrics import count, render_prometheus, span
+    from utils.single_pass import schedule_request
+    from utils.throttle import Throttled
+
+    admission = admission or AdmissionControl()
+    api_keys = parse_api_keys(SERVICE_API_KEYS) if api_keys is None else api_keys
+    if not api_keys:
+        print("⚠️ no SERVICE_API_KEYS configured; every request will be rejected with 401")
+
+    def unauthorized():
+        return JSONResponse({"error": "missing or unknown API key"}, status_code=401,
+                            headers={"WWW-Authenticate": "Bearer"})
+
+    def handler(stage, work):
+        async def endpoint(request: Request):
+            user = authenticate(request, api_keys)
+            if user is None:
+                return unauthorized()
+            try:
+                body = await request.json()
+            except ValueError:
+                return JSONResponse({"error": "body must be JSON"}, status_code=400)
+            try:
+                async with admission.slot(user):
+                    with span(f"service_{stage}"):
+                        result = await work(user, body, _transaction_id(request, user))
+            except Rejected as e:
+                count("scheduler_service_rejected_total", status=e.status)
+                return JSONResponse({"error": e.reason}, status_code=e.status, headers={"Retry-After": "1"})
+            except Throttled as e:
+                retry_after = str(max(1, round(e.retry_after or 1)))
+                return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": retry_after})
+            except PermissionError as e:
+                # no usable sign-in for this user
+                return JSONResponse({"error": str(e)}, status_code=401)
+            except (ValidationError, ValueError) as e:
+                return JSONResponse({"error": f"invalid request: {e}"}, status_code=422)
+            except Exception as e:
+                print(f"error handling {stage} for {user}: {e}")
+                return JSONResponse({"error": str(e)}, status_code=502)
+            return JSONResponse(result)
+        return endpoint
+
+    async def parse(user, body, txn):
+        details = await parse_intent(agent, _require(body, "text", str), make_context())
+        return details.model_dump()
+
+    async def resolve(user, body, txn):
+        client = await client_for_user(user)
+        names = _require(body, "names", list)
+        return {"emails": await resolve_name_map_batched(client, [str(name) for name in names])}
+
+    async def schedule(user, body, txn):
+        details = IntentParserOutput.model_validate(body)
+        client = await client_for_user(user)
+        return await schedule_meeting(client, details, allow_conflicts=bool(body.get("allow_conflicts")),
+                                      transaction_id=txn)
+
+    async def schedule_text(user, body, txn):
+        text = _require(body, "text", str)
+        client = await client_for_user(user)
+        result = await schedule_request(client, agent, text, make_context(), transaction_id=txn)
+        return {**result, "details": result["details"].model_dump()}
+
+    async def outbox_status(request: Request):
+        user = authenticate(request, api_keys)
+        if user is None:
+            return unauthorized()
+        outbox = sys.modules.get("utils.outbox")
+        # only the caller's own events; others' look unknown
+        status = await outbox.get_outbox().status(request.path_params["transaction_id"], owner=user) if outbox else None
+        if status is None:
+            return JSONResponse({"error": "unknown transaction id"}, status_code=404)
+        return JSONResponse(status)
+
+    async def healthz(request: Request):
+        return JSONResponse(admission.stats(), status_code=503 if admission.draining else 200)
+
+    async def metrics(request: Request):
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        if not await admission.drain():
+            print(f"shutdown: {admission.admitted} request(s) still running after {SERVICE_DRAIN_SECONDS}s")
+        if on_shutdown is not None:
+            await on_shutdown()
+
+    app = Starlette(
+        routes=[
+            Route("/parse", handler("parse", parse), methods=["POST"]),
+            Route("/resolve", handler("resolve", resolve), methods=["POST"]),
+            Route("/schedule", handler("schedule", schedule), methods=["POST"]),
+            Route("/schedule-text", handler("schedule_text", schedule_text), methods=["POST"]),
+            Route("/outbox/{transaction_id}", outbox_status),
+            Route("/healthz", healthz),
+            Route("/metrics", metrics),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.admission = admission
+    return app
+
+
+# runs the service with uvicorn until SIGINT/SIGTERM, then drains it
+async def serve(app: Starlette, host: str = "127.0.0.1", port: int = 8080):
+    import uvicorn
+
+    class Server(uvicorn.Server):
+        def handle_exit(self, sig, frame):
+            # reject new requests (503, /healthz too) at once while admitted ones finish
+            app.state.admission.draining = True
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning",
+                            timeout_graceful_shutdown=SERVICE_DRAIN_SECONDS, backlog=2048)
+    server = Server(config)
+    print(f"Scheduling service listening on http://{host}:{port}")
+    await server.serve()
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from functools import lru_cache
+
+from azure.core.credentials import AccessToken
+from msal import PublicClientApplication, SerializableTokenCache
+from msal_extensions import FilePersistence, PersistedTokenCache, build_encrypted_persistence
+
+from .autho_code_server import AUTHORITY, CLIENT_ID, REDIRECT_URI, wait_for_auth_code
+
+# where the token cache lives between runs
+TOKEN_CACHE_PATH = os.getenv(
+    "TOKEN_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".scheduling_assistant", "token_cache.bin")
+)
+
+
+def build_token_cache(path=TOKEN_CACHE_PATH):
+    """
+    Token cache persisted to `path`, encrypted at rest
+
+    Uses DPAPI on Windows, the Keychain on macOS and libsecret on Linux. Where none of
+    these is available (e.g. a headless Linux box) the cache is kept in memory only, unless
+    TOKEN_CACHE_ALLOW_UNENCRYPTED=1 opts into a plain file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        return PersistedTokenCache(build_encrypted_persistence(path))
+    except Exception as e:
+        if os.getenv("TOKEN_CACHE_ALLOW_UNENCRYPTED") == "1":
+            return PersistedTokenCache(FilePersistence(path))
+        reason = str(e).splitlines()[0] if str(e) else type(e).__name__
+        print(f"⚠️ Encrypted token cache unavailable ({reason}); tokens will not persist across runs.")
+        return SerializableTokenCache()
+
+
+# built on first use so importing the package does not pay for authority discovery
+@lru_cache(maxsize=None)
+def get_msal_app():
+    return PublicClientApplication(client_id=CLIENT_ID, authority=AUTHORITY, token_cache=build_token_cache())
+
+
+def _acquire_silent(app: PublicClientApplication, scopes, account_id=None, force_refresh=False):
+    for account in app.get_accounts():
+        if account_id and account_id not in (account.get("home_account_id"), account.get("username")):
+            continue
+        result = app.acquire_token_silent(scopes, account=account, force_refresh=force_refresh)
+        if result and "access_token" in result:
+            return result
+    return None
+
+
+# returns a token result, refreshing silently from the cache and only falling back to the browser if that fails
+async def acquire_token(scopes, timeout=120, account_id=None, force_refresh=False):
+    """
+    Get a token for `scopes`
+
+    Args:
+        scopes (list[str]): scopes to request
+        timeout (int): seconds to wait for the interactive sign-in
+        account_id (str, optional): home account id or username of a cached account; such
+            requests never open a browser and raise PermissionError when the cache cannot help
+        force_refresh (bool): redeem the refresh token even if the cached access token is still valid
+
+    Returns:
+        dict: the msal token result
+    """
+    app = get_msal_app()
+    # cache reads and refresh-token redemption are blocking calls
+    result = await asyncio.to_thread(_acquire_silent, app, scopes, account_id, force_refresh)
+    if result:
+        return result
+    if account_id:
+        raise PermissionError(f"no cached sign-in for {account_id}")
+
+    code = await wait_for_auth_code(timeout=timeout, scopes=scopes)
+    result = await asyncio.to_thread(
+        app.acquire_token_by_authorization_code, code, scopes, redirect_uri=REDIRECT_URI
+    )
+    if "access_token" not in result:
+        raise PermissionError(result.get("error_description", result.get("error", "token request failed")))
+    return result
+
+
+def _to_access_token(result) -> AccessToken:
+    expires_on = result.get("expires_on") or time.time() + int(result.get("expires_in", 0))
+    return AccessToken(result["access_token"], int(expires_on))
+
+
+class MsalTokenCredential:
+    """
+    azure-core style credential backed by the persistent MSAL cache
+
+    Hand it to GraphServiceClient in place of AuthorizationCodeCredential; tokens are
+    refreshed silently and the browser is only opened when the cache cannot help.
+    With `account_id` it acts for that cached account only and never opens a browser.
+    """
+
+    # refresh this many seconds before the token actually expires
+    REFRESH_MARGIN = 300
+
+    def __init__(self, scopes, account_id=None):
+        self.scopes = list(scopes)
+        self.account_id = account_id
+        self.tenant_id = None
+        self._token = None
+        # concurrent requests share one refresh (or one browser sign-in)
+        self._lock = asyncio.Lock()
+
+    @property
+    def expires_on(self):
+        return self._token.expires_on if self._token else 0
+
+    async def _acquire(self, force_refresh=False):
+        # msal keys its cache on the consented scopes, not the ".default" scope kiota may pass
+        result = await acquire_token(self.scopes, account_id=self.account_id, force_refresh=force_refresh)
+        self.tenant_id = (result.get("id_token_claims") or {}).get("tid", self.tenant_id)
+        self._token = _to_access_token(result)
+
+    async def get_token(self, *scopes, **kwargs):
+        # kiota asks for a token on every request; only go back to msal when it is about to expire
+        if self._token and self._token.expires_on - self.REFRESH_MARGIN > time.time():
+            # valid token: don't wait behind a background refresh()
+            return self._token
+        async with self._lock:
+            if not self._token or self._token.expires_on - self.REFRESH_MARGIN <= time.time():
+                await self._acquire()
+        return self._token
+
+    async def refresh(self):
+        """Get a new token now, e.g. from a background task ahead of expiry"""
+        async with self._lock:
+            await self._acquire(force_refresh=True)
+        return self._token
+
+    async def close(self):
+        pass
+
+
+# returns a credential, signing the user in first if there is no usable cached token
+async def get_credential(scopes):
+    credential = MsalTokenCredential(scopes)
+    await credential.get_token()
+    return credential
@@ -0,0 +1,80 @@
+import asyncio
+
+from bench.fake_graph import FakeGraph, fake_graph_client
+from utils.graph_json import BATCH_LIMIT, send_batch, users_by_given_name_url
+from utils.transport import close_http_client
+
+
+# starts a FakeGraph, runs check(fake, client) against it and shuts both down
+def run_against_fake(check, **options):
+    async def main():
+        fake = FakeGraph(**options)
+        base_url = await fake.start()
+        try:
+            return await check(fake, fake_graph_client(base_url))
+        finally:
+            await fake.stop()
+            await close_http_client()
+
+    return asyncio.run(main())
+
+
+def lookups(count):
+    return [{"id": str(i), "method": "GET", "url": users_by_given_name_url(f"Name{i}")} for i in range(count)]
+
+
+def test_more_than_a_batch_of_names_is_chunked():
+    names = 2 * BATCH_LIMIT + 5
+
+    async def check(fake, client):
+        responses = await send_batch(client, lookups(names))
+        assert sorted(responses, key=int) == [str(i) for i in range(names)]
+        assert all(response["status"] == 200 for response in responses.values())
+        assert responses["42"]["body"]["value"][0]["mail"] == "name42@contoso.example"
+        assert fake.counts["batches"] == 3
+        assert fake.counts["GET /users"] == names
+
+    run_against_fake(check)
+
+
+def test_failed_sub_request_is_retried_alone():
+    async def check(fake, client):
+        fake.fail_next("GET", "/users", 503)
+        responses = await send_batch(client, lookups(BATCH_LIMIT + 1))
+        assert all(response["status"] == 200 for response in responses.values())
+        assert fake.counts["faults"] == 1
+        # the first chunk, the second chunk, then a $batch with only the failed lookup
+        assert fake.counts["batches"] == 3
+        assert fake.counts["GET /users"] == BATCH_LIMIT + 2
+
+    run_against_fake(check)
+
+
+def test_post_without_transaction_id_is_not_retried_on_5xx():
+    async def check(fake, client):
+        fake.fail_next("POST", "/me/events", 503, 503)
+        responses = await send_batch(client, [
+            {"id": "plain", "method": "POST", "url": "/me/events", "body": {"subject": "a"}},
+            {"id": "keyed", "method": "POST", "url": "/me/events",
+             "body": {"subject": "b", "transactionId": "7d9c3a52-6a31-4c2e-9a53-0f0c8e4b1d11"}},
+        ])
+        # the 5xx may have come after the event was created, so only the keyed POST goes again
+        assert responses["plain"]["status"] == 503
+        assert responses["keyed"]["status"] == 201
+        assert fake.counts["POST /me/events"] == 3
+        assert [event["subject"] for event in fake.events.values()] == ["b"]
+
+    run_against_fake(check)
+
+
+def test_post_without_transaction_id_is_retried_on_429():
+    async def check(fake, client):
+        fake.fail_next("POST", "/me/events", 429)
+        responses = await send_batch(client, [
+            {"id": "plain", "method": "POST", "url": "/me/events", "body": {"subject": "a"}},
+        ])
+        # a 429 means Graph refused the request, so sending it again cannot create a duplicate
+        assert responses["plain"]["status"] == 201
+        assert fake.counts["POST /me/events"] == 2
+
+    run_against_fake(check)
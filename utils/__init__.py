@@ -1 +1,29 @@
-from .graph import schedule_meeting, get_user_info, resolve_emails_by_names, resolve_email_by_name
+import importlib
+
+# public names and the submodule that defines them; submodules are imported on first
+# attribute access so `import utils` stays cheap
+_EXPORTS = {
+    "schedule_meeting": ".graph",
+    "schedule_meetings": ".graph",
+    "get_user_info": ".graph",
+    "resolve_emails_by_names": ".graph",
+    "resolve_email_by_name": ".graph",
+    "resolve_emails_by_names_batched": ".graph",
+    "GraphContext": ".graph",
+    "build_graph_client": ".transport",
+    "close_http_client": ".transport",
+    "find_meeting_slots": ".availability",
+    "find_free_slots": ".availability",
+    "lookup_attendees": ".directory",
+    "DirectoryIndex": ".directory",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
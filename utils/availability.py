@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+import numpy as np
+from agents import RunContextWrapper, function_tool
+
+from .graph import GraphContext, resolve_name_map_batched
+from .graph_json import send_json
+from .metrics import span
+from .timezones import to_utc, zone_info
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# width of one column in the availability bitmap
+BUCKET_MINUTES = 15
+
+# free/busy statuses that block a slot
+BUSY_STATUSES = {"busy", "oof", "tentative"}
+
+
+def _parse_graph_time(value: dict, time_zone: str) -> datetime:
+    # Graph returns 7 fractional digits ("2025-05-01T09:00:00.0000000"); minute precision is all we need
+    parsed = datetime.fromisoformat(value["dateTime"][:19])
+    # scheduleItems come back in UTC unless a Prefer: outlook.timezone header says otherwise
+    item_zone = value.get("timeZone") or "UTC"
+    if item_zone == time_zone:
+        return parsed
+    try:
+        parsed = to_utc(parsed, item_zone)
+    except ValueError:
+        parsed = to_utc(parsed, "UTC")
+    return parsed.astimezone(zone_info(time_zone)).replace(tzinfo=None)
+
+
+# fetches free/busy for every email with a single getSchedule call
+async def get_busy_intervals(client: GraphServiceClient, emails: list[str], start: datetime, end: datetime,
+                             time_zone: str = "Pacific Standard Time"):
+    """
+    Get the busy intervals of several people with one getSchedule request
+
+    Args:
+        client (GraphServiceClient): authenticated client
+        emails (list[str]): SMTP addresses to look up
+        start (datetime): naive wall-clock start of the window, in `time_zone`
+        end (datetime): naive wall-clock end of the window, in `time_zone`
+        time_zone (str): Microsoft Graph compatible windows time zone; the returned
+            intervals are converted to this zone from the one Graph reports them in
+
+    Returns:
+        dict: email -> list of (start, end) naive datetimes
+    """
+    if not emails:
+        return {}
+    payload = {
+        "schedules": emails,
+        "startTime": {"dateTime": start.isoformat(timespec="seconds"), "timeZone": time_zone},
+        "endTime": {"dateTime": end.isoformat(timespec="seconds"), "timeZone": time_zone},
+        "availabilityViewInterval": BUCKET_MINUTES,
+    }
+    with span("get_schedule", attendees=len(emails)):
+        result = await send_json(client, "POST", "/me/calendar/getSchedule", payload, idempotent=True)
+
+    busy = {email: [] for email in emails}
+    for schedule in (result or {}).get("value", []):
+        intervals = busy.setdefault(schedule.get("scheduleId"), [])
+        for item in schedule.get("scheduleItems") or []:
+            if item.get("status") in BUSY_STATUSES:
+                intervals.append((_parse_graph_time(item["start"], time_zone),
+                                  _parse_graph_time(item["end"], time_zone)))
+    return busy
+
+
+def busy_matrix(busy: dict, emails: list[str], start: datetime, n_buckets: int,
+                bucket_minutes: int = BUCKET_MINUTES) -> np.ndarray:
+    """
+    Load busy intervals into a boolean matrix, one row per email and one column per bucket
+
+    A bucket is marked busy if any interval overlaps it. The intervals are painted with a
+    +1/-1 difference array and a cumulative sum, so the cost does not depend on their length.
+    """
+    rows, starts, ends = [], [], []
+    for row, email in enumerate(emails):
+        for interval_start, interval_end in busy.get(email, []):
+            rows.append(row)
+            starts.append((interval_start - start).total_seconds())
+            ends.append((interval_end - start).total_seconds())
+
+    diff = np.zeros((len(emails), n_buckets + 1), dtype=np.int32)
+    if rows:
+        bucket_seconds = bucket_minutes * 60
+        rows = np.asarray(rows)
+        first = np.clip(np.floor(np.asarray(starts) / bucket_seconds), 0, n_buckets).astype(np.int64)
+        last = np.clip(np.ceil(np.asarray(ends) / bucket_seconds), 0, n_buckets).astype(np.int64)
+        keep = last > first
+        np.add.at(diff, (rows[keep], first[keep]), 1)
+        np.add.at(diff, (rows[keep], last[keep]), -1)
+    return np.cumsum(diff[:, :-1], axis=1) > 0
+
+
+def working_hours_mask(start: datetime, n_buckets: int, work_start: int = 9, work_end: int = 17,
+                       weekdays_only: bool = True, bucket_minutes: int = BUCKET_MINUTES) -> np.ndarray:
+    """Boolean row marking the buckets that fall inside working hours"""
+    offsets = np.arange(n_buckets) * bucket_minutes
+    origin_minutes = start.hour * 60 + start.minute
+    minute_of_day = (origin_minutes + offsets) % (24 * 60)
+    mask = (minute_of_day >= work_start * 60) & (minute_of_day < work_end * 60)
+    if weekdays_only:
+        weekday = (start.weekday() + (origin_minutes + offsets) // (24 * 60)) % 7
+        mask &= weekday < 5
+    return mask
+
+
+def free_windows(free: np.ndarray, duration_buckets: int, top_n: int) -> list[int]:
+    """
+    Return the first `top_n` non-overlapping bucket indices where `free` holds for
+    `duration_buckets` consecutive buckets
+    """
+    if duration_buckets <= 0 or duration_buckets > len(free):
+        return []
+    # fits[i] is True when free[i:i + duration_buckets] is entirely True
+    runs = np.concatenate(([0], np.cumsum(free, dtype=np.int64)))
+    fits = (runs[duration_buckets:] - runs[:-duration_buckets]) == duration_buckets
+
+    picked = []
+    next_allowed = 0
+    for index in np.flatnonzero(fits):
+        if index < next_allowed:
+            continue
+        picked.append(int(index))
+        next_allowed = index + duration_buckets
+        if len(picked) == top_n:
+            break
+    return picked
+
+
+# finds common free windows for a list of attendee names
+async def find_meeting_slots(client: GraphServiceClient, names: list[str], duration_minutes: int,
+                             start: datetime = None, days: int = 7, time_zone: str = "Pacific Standard Time",
+                             work_start: int = 9, work_end: int = 17, top_n: int = 5):
+    """
+    Find the earliest windows where every resolved attendee is free
+
+    Args:
+        client (GraphServiceClient): authenticated client
+        names (list[str]): attendee names, resolved the same way schedule_meeting does
+        duration_minutes (int): meeting length
+        start (datetime, optional): naive wall-clock start of the search, defaults to now
+        days (int): length of the search horizon
+        time_zone (str): Microsoft Graph compatible windows time zone for the search and results
+        work_start (int): first working hour of the day
+        work_end (int): hour the working day ends
+        top_n (int): maximum number of windows to return
+
+    Returns:
+        list[dict]: slots with "start", "end" (ISO 8601) and "time_zone"
+    """
+    if start is None:
+        start = datetime.now()
+    # align the grid to the next bucket boundary
+    start = start.replace(second=0, microsecond=0)
+    start += timedelta(minutes=-start.minute % BUCKET_MINUTES)
+    n_buckets = days * 24 * 60 // BUCKET_MINUTES
+    end = start + timedelta(minutes=n_buckets * BUCKET_MINUTES)
+
+    emails_by_name = await resolve_name_map_batched(client, names)
+    emails = list(dict.fromkeys(emails_by_name.values()))
+    busy = await get_busy_intervals(client, emails, start, end, time_zone)
+
+    free = ~busy_matrix(busy, emails, start, n_buckets).any(axis=0)
+    free &= working_hours_mask(start, n_buckets, work_start, work_end)
+
+    duration_buckets = -(-duration_minutes // BUCKET_MINUTES)
+    slots = []
+    for index in free_windows(free, duration_buckets, top_n):
+        slot_start = start + timedelta(minutes=int(index) * BUCKET_MINUTES)
+        slots.append({
+            "start": slot_start.isoformat(timespec="seconds"),
+            "end": (slot_start + timedelta(minutes=duration_minutes)).isoformat(timespec="seconds"),
+            "time_zone": time_zone,
+        })
+    return slots
+
+
+@function_tool
+async def find_free_slots(ctx: RunContextWrapper[GraphContext], attendees: list[str], duration_minutes: int,
+                          days: int = 7, time_zone: str = "Pacific Standard Time", top_n: int = 5) -> list[dict]:
+    """Find the earliest times when all attendees are free during working hours.
+
+    Args:
+        attendees: Names of the people who must attend.
+        duration_minutes: Length of the meeting in minutes.
+        days: How many days ahead to search, starting now.
+        time_zone: Microsoft Graph compatible windows time zone for the results.
+        top_n: Maximum number of slots to return.
+    """
+    return await find_meeting_slots(ctx.context.client, attendees, duration_minutes,
+                                    days=days, time_zone=time_zone, top_n=top_n)
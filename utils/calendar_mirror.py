@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+
+from .graph_json import delta_expired, send_json
+from .metrics import span
+from .timezones import to_utc
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# enables conflict checks in schedule_meeting; the mirror database is stored at this path, and
+# other users' (in service mode) next to it
+CALENDAR_MIRROR_PATH = os.getenv("CALENDAR_MIRROR_PATH")
+# days ahead of now covered by the mirror (the window grows when a query falls outside it)
+CALENDAR_MIRROR_DAYS = int(os.getenv("CALENDAR_MIRROR_DAYS", "30"))
+# how old the mirror may get before a calendarView/delta round trip
+CALENDAR_REFRESH_SECONDS = float(os.getenv("CALENDAR_REFRESH_SECONDS", "60"))
+
+# showAs values that do not block the time
+NON_BLOCKING = ("free", "workingElsewhere")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    rid INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    subject TEXT,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL,
+    show_as TEXT,
+    is_cancelled INTEGER NOT NULL DEFAULT 0,
+    location TEXT,
+    web_link TEXT
+);
+-- interval index in whole minutes; rows are re-checked against the exact seconds
+CREATE VIRTUAL TABLE IF NOT EXISTS event_spans USING rtree_i32(rid, start_min, end_min);
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    window_start INTEGER NOT NULL,
+    window_end INTEGER NOT NULL,
+    delta_link TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def _timestamp(value: dict) -> int:
+    # Graph returns {"dateTime": "2025-05-01T16:00:00.0000000", "timeZone": "UTC"}
+    wall = datetime.fromisoformat(value["dateTime"][:19])
+    return int(to_utc(wall, value.get("timeZone") or "UTC").timestamp())
+
+
+def _iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _utc(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def _graph_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class CalendarMirror:
+    """
+    Local SQLite copy of the signed-in user's calendar over a time window
+
+    The first sync downloads calendarView/delta for the window; later syncs follow the
+    stored deltaLink and only apply changes. Overlap queries go through an R*Tree
+    index, so conflict checks and read-only questions need no Graph call. The async
+    methods and helpers run their SQLite work in a thread, off the event loop.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # used from asyncio.to_thread workers; sqlite3 serializes access to the connection
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        self._lock = asyncio.Lock()
+
+    def close(self):
+        self.db.close()
+
+    # --- writes ---
+
+    def upsert(self, item: dict):
+        """Insert or update one Graph event resource, or delete it if it is an @removed entry"""
+        row = self.db.execute("SELECT rid FROM events WHERE id = ?", (item["id"],)).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM event_spans WHERE rid = ?", (row["rid"],))
+            self.db.execute("DELETE FROM events WHERE rid = ?", (row["rid"],))
+        if "@removed" in item or not item.get("start") or not item.get("end"):
+            return
+        start_ts, end_ts = _timestamp(item["start"]), _timestamp(item["end"])
+        cursor = self.db.execute(
+            "INSERT INTO events (id, subject, start_ts, end_ts, show_as, is_cancelled, location, web_link) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (item["id"], item.get("subject"), start_ts, end_ts, item.get("showAs"),
+             int(bool(item.get("isCancelled"))), (item.get("location") or {}).get("displayName"),
+             item.get("webLink")),
+        )
+        self.db.execute("INSERT INTO event_spans (rid, start_min, end_min) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, start_ts // 60, -(-end_ts // 60)))
+
+    def _state(self):
+        return self.db.execute("SELECT * FROM sync_state WHERE id = 0").fetchone()
+
+    def _apply(self, items: list[dict]):
+        for item in items:
+            self.upsert(item)
+
+    def _finish_sync(self, delta_link):
+        self.db.execute("UPDATE sync_state SET delta_link = ?, synced_at = ? WHERE id = 0",
+                        (delta_link, time.time()))
+        self.db.commit()
+
+    def _reset(self, window_start: int, window_end: int):
+        self.db.execute("DELETE FROM events")
+        self.db.execute("DELETE FROM event_spans")
+        self.db.execute("INSERT OR REPLACE INTO sync_state VALUES (0, ?, ?, NULL, 0)", (window_start, window_end))
+
+    # --- sync ---
+
+    async def sync(self, client: GraphServiceClient, start: datetime, end: datetime, full: bool = False):
+        """
+        Bring the mirror up to date for [start, end]; callers hold the mirror's lock
+
+        A delta token only covers the window it was created for, so a window outside the
+        stored one starts a full download over the union of both, as does an expired
+        token (410). A sync that fails leaves the mirror as it was.
+        """
+        window_start, window_end = int(start.timestamp()), int(end.timestamp())
+        state = await asyncio.to_thread(self._state)
+        full = (full or state is None or state["delta_link"] is None
+                or window_start < state["window_start"] or window_end > state["window_end"])
+        if full:
+            if state is not None:
+                window_start = min(window_start, state["window_start"])
+                window_end = max(window_end, state["window_end"])
+            await asyncio.to_thread(self._reset, window_start, window_end)
+            url = (
+                f"/me/calendarView/delta?startDateTime={quote(_graph_time(_utc(window_start)), safe='')}"
+                f"&endDateTime={quote(_graph_time(_utc(window_end)), safe='')}"
+            )
+        else:
+            url = state["delta_link"]
+
+        changes = 0
+        delta_link = None
+        try:
+            with span("calendar_sync", full=full) as fields:
+                while url:
+                    page = await send_json(client, "GET", url) or {}
+                    items = page.get("value", [])
+                    await asyncio.to_thread(self._apply, items)
+                    changes += len(items)
+                    url = page.get("@odata.nextLink")
+                    delta_link = page.get("@odata.deltaLink", delta_link)
+                fields["changes"] = changes
+        except BaseException as e:
+            # nothing of a half-applied sync is kept
+            await asyncio.to_thread(self.db.rollback)
+            if not full and isinstance(e, Exception) and delta_expired(e):
+                print("calendar mirror: delta token expired, downloading the window again")
+                return await self.sync(client, start, end, full=True)
+            raise
+        await asyncio.to_thread(self._finish_sync, delta_link)
+        return changes
+
+    async def ensure_synced(self, client: GraphServiceClient, start: datetime, end: datetime):
+        """Sync only if [start, end] is outside the mirrored window or the mirror is stale"""
+        async with self._lock:
+            state = await asyncio.to_thread(self._state)
+            covered = (state is not None and state["delta_link"] is not None
+                       and start.timestamp() >= state["window_start"] and end.timestamp() <= state["window_end"])
+            if covered and time.time() - state["synced_at"] <= CALENDAR_REFRESH_SECONDS:
+                return
+            if not covered:
+                # download a default window around now rather than just the queried range
+                now = datetime.now(timezone.utc)
+                start = min(start, now - timedelta(days=1))
+                end = max(end, now + timedelta(days=CALENDAR_MIRROR_DAYS))
+            await self.sync(client, start, end)
+
+    # --- queries ---
+
+    def events_between(self, start: datetime, end: datetime, blocking_only: bool = False) -> list[dict]:
+        """Events overlapping [start, end), ordered by start time"""
+        start_ts, end_ts = int(start.timestamp()), int(end.timestamp())
+        query = (
+            "SELECT e.* FROM event_spans s JOIN events e ON e.rid = s.rid "
+            "WHERE s.start_min < ? AND s.end_min > ? AND e.start_ts < ? AND e.end_ts > ?"
+        )
+        if blocking_only:
+            query += f" AND e.is_cancelled = 0 AND COALESCE(e.show_as, '') NOT IN {NON_BLOCKING!r}"
+        rows = self.db.execute(query + " ORDER BY e.start_ts",
+                               (-(-end_ts // 60), start_ts // 60, end_ts, start_ts))
+        return [
+            {"id": row["id"], "subject": row["subject"], "start": _iso(row["start_ts"]),
+             "end": _iso(row["end_ts"]), "show_as": row["show_as"], "location": row["location"],
+             "web_link": row["web_link"]}
+            for row in rows
+        ]
+
+    async def record(self, item: dict):
+        """Upsert one event and commit, never in the middle of a sync"""
+        def write():
+            self.upsert(item)
+            self.db.commit()
+
+        async with self._lock:
+            await asyncio.to_thread(write)
+
+    def conflicts(self, start: datetime, end: datetime) -> list[dict]:
+        """Events that block any part of [start, end)"""
+        return self.events_between(start, end, blocking_only=True)
+
+
+# owner -> mirror; every user's calendar (and deltaLink) lives in its own database
+_mirrors = {}
+
+
+def mirror_owner(client: GraphServiceClient = None) -> str:
+    """Whose calendar a client reads: the client pool's key for the user, "me" for the CLI's own client"""
+    if client is None:
+        return "me"
+    from .outbox import outbox_owner
+    return outbox_owner(client)
+
+
+def _mirror_path(owner: str) -> str:
+    if not CALENDAR_MIRROR_PATH:
+        return ":memory:"
+    if owner == "me":
+        return CALENDAR_MIRROR_PATH
+    root, ext = os.path.splitext(CALENDAR_MIRROR_PATH)
+    return f"{root}-{hashlib.sha256(owner.encode('utf-8')).hexdigest()[:16]}{ext}"
+
+
+# the mirror of one user's calendar: on disk next to CALENDAR_MIRROR_PATH if set, in memory otherwise
+def get_calendar_mirror(client: GraphServiceClient = None, owner: str = None) -> CalendarMirror:
+    owner = owner or mirror_owner(client)
+    mirror = _mirrors.get(owner)
+    if mirror is None:
+        mirror = _mirrors[owner] = CalendarMirror(_mirror_path(owner))
+    return mirror
+
+
+# conflicts of a parsed meeting with the signed-in user's calendar; [] when the mirror is disabled
+async def find_conflicts(client: GraphServiceClient, details) -> list[dict]:
+    if not CALENDAR_MIRROR_PATH:
+        return []
+    try:
+        start = to_utc(datetime.fromisoformat(details.start_date_time), details.start_time_zone)
+        end = to_utc(datetime.fromisoformat(details.end_date_time), details.end_time_zone)
+    except ValueError:
+        # unparseable times are left for Graph to reject
+        return []
+    mirror = get_calendar_mirror(client)
+    await mirror.ensure_synced(client, start, end)
+    return await asyncio.to_thread(mirror.conflicts, start, end)
+
+
+# records an event `client` just created so the next conflict check sees it before the next delta sync
+async def record_created_event(client: GraphServiceClient, event: dict, details):
+    await record_event({
+        "id": event["id"],
+        "subject": event.get("subject"),
+        "start": {"dateTime": event["start"], "timeZone": details.start_time_zone},
+        "end": {"dateTime": event["end"], "timeZone": details.end_time_zone},
+        "showAs": "busy",
+        "webLink": event.get("web_link"),
+    }, client)
+
+
+# same for a Graph event resource, e.g. the response of POST /me/events, in the calendar of
+# `client`'s user (or of `owner`, as the outbox knows it)
+async def record_event(item: dict, client: GraphServiceClient = None, owner: str = None):
+    if not CALENDAR_MIRROR_PATH:
+        return
+    await get_calendar_mirror(client, owner).record(item)
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, TYPE_CHECKING
+
+from .metrics import count
+from .name_cache import set_directory_scope
+from .outbox import set_outbox_owner
+from .transport import build_graph_client
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# most users (or tenants) with a live client at once; the least recently used is dropped first
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "256"))
+# clients unused for this long are dropped
+CLIENT_POOL_IDLE_SECONDS = float(os.getenv("CLIENT_POOL_IDLE_SECONDS", "1800"))
+# tokens expiring within this many seconds are refreshed in the background; keep it above
+# the credential's own refresh margin so requests never hit an expiring token
+CLIENT_POOL_REFRESH_MARGIN = float(os.getenv("CLIENT_POOL_REFRESH_MARGIN", "600"))
+# how often the background task looks for idle clients and expiring tokens
+CLIENT_POOL_SWEEP_SECONDS = float(os.getenv("CLIENT_POOL_SWEEP_SECONDS", "30"))
+
+
+class _Entry:
+    __slots__ = ("client", "credential", "last_used")
+
+    def __init__(self, client, credential, last_used):
+        self.client = client
+        self.credential = credential
+        self.last_used = last_used
+
+
+class GraphClientPool:
+    """
+    Authenticated GraphServiceClients kept per user (or tenant)
+
+    A client and its credential (with the credential's token state) are built on the
+    first request for a key and reused afterwards; concurrent first requests share one
+    build. Memory is bounded by `max_size` (LRU) and `idle_seconds`, and a background
+    task refreshes tokens `refresh_margin` seconds before they expire, so requests find
+    a valid token. All clients share the transport of utils.transport.
+
+    `credential_factory(key)` returns an azure-core style credential for the key (e.g.
+    MsalTokenCredential with an account_id); credentials with a `tenant_id` put their
+    client in that tenant's name-cache scope.
+    """
+
+    def __init__(self, credential_factory: Callable, scopes: list[str], max_size: int = CLIENT_POOL_SIZE,
+                 idle_seconds: float = CLIENT_POOL_IDLE_SECONDS, refresh_margin: float = CLIENT_POOL_REFRESH_MARGIN,
+                 sweep_seconds: float = CLIENT_POOL_SWEEP_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.credential_factory = credential_factory
+        self.scopes = list(scopes)
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.refresh_margin = refresh_margin
+        self.sweep_seconds = sweep_seconds
+        self.clock = clock
+        # key -> _Entry, least recently used first
+        self._entries = OrderedDict()
+        # key -> future resolving to an _Entry
+        self._building = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.refreshed = 0
+        self.refresh_failures = 0
+
+    async def get(self, key: str) -> GraphServiceClient:
+        """Return the client for `key`, building (and signing it in) on first use"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.last_used = self.clock()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            count("scheduler_client_pool_total", result="hit")
+            return entry.client
+
+        if (building := self._building.get(key)) is not None:
+            try:
+                return (await asyncio.shield(building)).client
+            except asyncio.CancelledError:
+                if not building.cancelled():
+                    raise
+                # the request building it was cancelled, not this one
+                return await self.get(key)
+
+        self.misses += 1
+        count("scheduler_client_pool_total", result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._building[key] = future
+        try:
+            entry = await self._build(key)
+        except Exception as e:
+            future.set_exception(e)
+            # nobody else may be waiting; don't let the loop warn about it
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._building[key]
+        future.set_result(entry)
+        self._insert(key, entry)
+        return entry.client
+
+    async def _build(self, key: str) -> _Entry:
+        credential = self.credential_factory(key)
+        if asyncio.iscoroutine(credential):
+            credential = await credential
+        # signs in now, so the first Graph call doesn't wait on the token
+        await credential.get_token(*self.scopes)
+        client = build_graph_client(credential, self.scopes)
+        if tenant_id := getattr(credential, "tenant_id", None):
+            set_directory_scope(client, f"tenant-{tenant_id}")
+        # events it queues in the outbox are sent later with this user's client
+        set_outbox_owner(client, key)
+        return _Entry(client, credential, self.clock())
+
+    def _insert(self, key: str, entry: _Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            _, oldest = self._entries.popitem(last=False)
+            self._discard(oldest)
+
+    def _discard(self, entry: _Entry):
+        self.evicted += 1
+        count("scheduler_client_pool_evicted_total")
+        close = getattr(entry.credential, "close", None)
+        if close is not None:
+            asyncio.ensure_future(close())
+
+    def evict(self, key: str):
+        """Drop the client for `key`, e.g. after the user signed out"""
+        if (entry := self._entries.pop(key, None)) is not None:
+            self._discard(entry)
+
+    async def sweep(self):
+        """Drop idle clients and refresh tokens that expire within the refresh margin"""
+        now = self.clock()
+        for key in [key for key, entry in self._entries.items() if now - entry.last_used > self.idle_seconds]:
+            self.evict(key)
+
+        deadline = time.time() + self.refresh_margin
+        expiring = [(key, entry) for key, entry in self._entries.items()
+                    if hasattr(entry.credential, "refresh") and getattr(entry.credential, "expires_on", 0) <= deadline]
+        results = await asyncio.gather(*(entry.credential.refresh() for _, entry in expiring), return_exceptions=True)
+        for (key, _), result in zip(expiring, results):
+            if isinstance(result, Exception):
+                # the refresh token was revoked or expired; the user has to sign in again
+                print(f"token refresh failed for {key}: {result}")
+                self.refresh_failures += 1
+                self.evict(key)
+                count("scheduler_client_pool_refresh_total", result="failed")
+            else:
+                self.refreshed += 1
+                count("scheduler_client_pool_refresh_total", result="ok")
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"client pool sweep failed: {e}")
+
+    def start(self):
+        """Start the background sweeper (idle expiry and token refresh)"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+        return self
+
+    async def close(self):
+        """Stop the sweeper and drop every client"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        for key in list(self._entries):
+            self.evict(key)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "refreshed": self.refreshed,
+            "refresh_failures": self.refresh_failures,
+        }
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from urllib.parse import quote
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+from agents import RunContextWrapper, function_tool
+
+from .graph import GraphContext, resolve_name_map_batched
+from .graph_json import delta_expired, send_json
+from .metrics import span
+from .name_cache import directory_scope
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# only the fields needed to match names and address invitations
+USER_FIELDS = ["id", "givenName", "surname", "displayName", "mail", "userPrincipalName"]
+DELTA_URL = "/users/delta?$select=" + quote(",".join(USER_FIELDS))
+
+# enables the local index; the snapshot is stored at this path (other tenants' next to it)
+DIRECTORY_INDEX_PATH = os.getenv("DIRECTORY_INDEX_PATH")
+# how old the snapshot may get before a users/delta refresh
+DIRECTORY_REFRESH_SECONDS = float(os.getenv("DIRECTORY_REFRESH_SECONDS", "900"))
+
+# candidates within this score of the best one make a lookup ambiguous
+AMBIGUITY_MARGIN = 0.05
+# best scores below this come from typo (trigram) matches only and need confirmation
+FUZZY_SCORE = 0.6
+
+
+def _tokens(text: Optional[str]) -> list[str]:
+    return [t for t in (text or "").casefold().replace(".", " ").replace("-", " ").split() if t]
+
+
+def _trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class Resolution:
+    """Result of a local name lookup"""
+    name: str
+    email: Optional[str]
+    ambiguous: bool = False
+    candidates: list[dict] = field(default_factory=list)
+
+
+class DirectoryIndex:
+    """
+    Local snapshot of the tenant directory with a ranked name index
+
+    A character trie over the given name, surname and display-name words answers
+    prefix queries (the same semantics as Graph's startswith(givenName, ...)), and a
+    trigram index catches typos. Lookups are in-process and take microseconds.
+    """
+
+    def __init__(self, users: Optional[dict] = None, delta_link: Optional[str] = None, synced_at: float = 0.0):
+        self.users = {}
+        self.delta_link = delta_link
+        self.synced_at = synced_at
+        self._trie = {}
+        self._trigrams = {}
+        for user in (users or {}).values():
+            self._add(user)
+
+    # --- index maintenance ---
+
+    def _words(self, user):
+        given = _tokens(user.get("givenName"))
+        others = _tokens(user.get("surname")) + _tokens(user.get("displayName"))
+        return [(w, True) for w in given] + [(w, False) for w in others if w not in given]
+
+    def _add(self, user):
+        self.users[user["id"]] = user
+        for word, _ in self._words(user):
+            node = self._trie
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node.setdefault("", set()).add(user["id"])
+            for gram in _trigrams(word):
+                self._trigrams.setdefault(gram, set()).add(user["id"])
+
+    def _remove(self, user_id):
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return
+        for word, _ in self._words(user):
+            node = self._trie
+            for ch in word:
+                node = node.get(ch)
+                if node is None:
+                    break
+            else:
+                node.get("", set()).discard(user_id)
+            for gram in _trigrams(word):
+                self._trigrams.get(gram, set()).discard(user_id)
+
+    def apply_delta(self, items: list[dict]):
+        """Apply users/delta items: removals, new users and changed fields"""
+        for item in items:
+            user_id = item.get("id")
+            if not user_id:
+                continue
+            previous = self.users.get(user_id)
+            self._remove(user_id)
+            if "@removed" in item:
+                continue
+            merged = dict(previous or {})
+            merged.update({k: v for k, v in item.items() if k in USER_FIELDS})
+            self._add(merged)
+
+    # --- queries ---
+
+    def _prefix_ids(self, prefix: str) -> set[str]:
+        node = self._trie
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return set()
+        ids, stack = set(), [node]
+        while stack:
+            current = stack.pop()
+            for key, child in current.items():
+                if key == "":
+                    ids |= child
+                else:
+                    stack.append(child)
+        return ids
+
+    def _score_token(self, token: str, user) -> float:
+        best = 0.0
+        for word, is_given in self._words(user):
+            if word == token:
+                score = 1.0 if is_given else 0.85
+            elif word.startswith(token):
+                score = 0.9 if is_given else 0.75
+            else:
+                grams = _trigrams(token)
+                overlap = len(grams & _trigrams(word)) / len(grams | _trigrams(word))
+                score = 0.6 * overlap if overlap >= 0.3 else 0.0
+            best = max(best, score)
+        return best
+
+    def search(self, name: str, limit: int = 5) -> list[tuple[float, dict]]:
+        """Ranked candidates for `name`; every word of the query has to match some name word"""
+        tokens = _tokens(name)
+        if not tokens:
+            return []
+        candidate_ids = None
+        for token in tokens:
+            ids = self._prefix_ids(token)
+            if not ids:
+                # no prefix match: fall back to users sharing trigrams with the token
+                ids = set().union(*(self._trigrams.get(g, set()) for g in _trigrams(token)))
+            candidate_ids = ids if candidate_ids is None else candidate_ids & ids
+
+        scored = []
+        for user_id in candidate_ids or ():
+            user = self.users[user_id]
+            score = sum(self._score_token(t, user) for t in tokens) / len(tokens)
+            if score > 0:
+                scored.append((score, user))
+        scored.sort(key=lambda pair: (-pair[0], pair[1].get("displayName") or ""))
+        return scored[:limit]
+
+    def resolve(self, name: str, limit: int = 5) -> Resolution:
+        """Best match for `name`, flagged ambiguous when it is only a typo match or others score about as well"""
+        ranked = self.search(name, limit)
+        candidates = [
+            {"name": user.get("displayName"), "email": user.get("mail") or user.get("userPrincipalName"),
+             "score": round(score, 3)}
+            for score, user in ranked
+        ]
+        if not ranked:
+            return Resolution(name, None)
+        ambiguous = ranked[0][0] < FUZZY_SCORE or (len(ranked) > 1 and ranked[1][0] >= ranked[0][0] - AMBIGUITY_MARGIN)
+        return Resolution(name, candidates[0]["email"], ambiguous, candidates)
+
+    # --- persistence ---
+
+    def save(self, path: str):
+        """Write the snapshot (users + delta link) as gzipped JSON; the indexes are rebuilt on load"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"users": list(self.users.values()), "delta_link": self.delta_link,
+                       "synced_at": self.synced_at}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DirectoryIndex":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        users = {user["id"]: user for user in data.get("users", [])}
+        return cls(users, data.get("delta_link"), data.get("synced_at", 0.0))
+
+    # --- sync ---
+
+    async def sync(self, client: GraphServiceClient):
+        """Download the directory (first run) or only the changes since the last sync"""
+        url = self.delta_link or DELTA_URL
+        changes = 0
+        with span("directory_sync", full=self.delta_link is None) as fields:
+            while url:
+                page = await send_json(client, "GET", url) or {}
+                items = page.get("value", [])
+                self.apply_delta(items)
+                changes += len(items)
+                url = page.get("@odata.nextLink")
+                if "@odata.deltaLink" in page:
+                    self.delta_link = page["@odata.deltaLink"]
+            fields["changes"] = changes
+        self.synced_at = time.time()
+        return changes
+
+
+class _Snapshot:
+    """One snapshot file's index, the lock for loading it and its background refresh"""
+
+    def __init__(self):
+        self.index: Optional[DirectoryIndex] = None
+        self.lock = asyncio.Lock()
+        self.refresh: Optional[asyncio.Task] = None
+        # when a failed refresh may be tried again
+        self.refresh_after = 0.0
+
+
+# snapshot path -> _Snapshot; every directory (tenant) has its own
+_snapshots = {}
+
+
+def _snapshot_path(client: GraphServiceClient, path: str) -> str:
+    scope = directory_scope(client)
+    if scope.startswith("client-"):
+        # a client without a tenant scope (the CLI's own): the configured path
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:16]}{ext}"
+
+
+async def _refresh_index(client: GraphServiceClient, snapshot: _Snapshot, path: str):
+    try:
+        try:
+            await snapshot.index.sync(client)
+            index = snapshot.index
+        except Exception as e:
+            if not delta_expired(e):
+                raise
+            # the delta token expired: download everything into a new index, keep serving the old one
+            print("directory delta token expired, downloading the directory again")
+            index = DirectoryIndex()
+            await index.sync(client)
+            snapshot.index = index
+        await asyncio.to_thread(index.save, path)
+    except Exception as e:
+        print(f"directory refresh failed: {e}")
+        snapshot.refresh_after = time.time() + 60
+
+
+# returns the local directory index of `client`'s directory when DIRECTORY_INDEX_PATH is set, loading and
+# refreshing it as needed; only the very first sync runs inline, later ones refresh in the background
+async def get_directory_index(client: GraphServiceClient, path: Optional[str] = DIRECTORY_INDEX_PATH):
+    if not path:
+        return None
+    path = _snapshot_path(client, path)
+    snapshot = _snapshots.setdefault(path, _Snapshot())
+    async with snapshot.lock:
+        if snapshot.index is None and os.path.exists(path):
+            snapshot.index = await asyncio.to_thread(DirectoryIndex.load, path)
+        if snapshot.index is None:
+            snapshot.index = DirectoryIndex()
+        if not snapshot.index.synced_at:
+            # nothing to serve yet
+            await snapshot.index.sync(client)
+            await asyncio.to_thread(snapshot.index.save, path)
+    now = time.time()
+    if now - snapshot.index.synced_at > DIRECTORY_REFRESH_SECONDS and now >= snapshot.refresh_after and \
+            (snapshot.refresh is None or snapshot.refresh.done()):
+        snapshot.refresh = asyncio.create_task(_refresh_index(client, snapshot, path))
+    return snapshot.index
+
+
+@function_tool
+async def lookup_attendees(ctx: RunContextWrapper[GraphContext], names: list[str]) -> list[dict]:
+    """Look up attendees in the directory before scheduling.
+
+    Returns the best email for each name, the ranked candidates, and whether the name is
+    ambiguous (several people match about equally well). Ask the user which person they
+    mean when a name is ambiguous.
+
+    Args:
+        names: Attendee names as the user wrote them.
+    """
+    index = await get_directory_index(ctx.context.client)
+    if index is None:
+        emails = await resolve_name_map_batched(ctx.context.client, names)
+        return [{"name": name, "email": emails.get(name), "ambiguous": False, "candidates": []} for name in names]
+    return [
+        {"name": r.name, "email": r.email, "ambiguous": r.ambiguous, "candidates": r.candidates}
+        for r in (index.resolve(name) for name in names)
+    ]
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Callable, TYPE_CHECKING
+
+from agents import Agent, Runner
+
+from .graph import build_event, resolve_name_map_batched
+from .graph_json import send_json, to_json
+from .metrics import count, log_event, record_usage, span, track_usage
+from .single_pass import schedule_request
+from .validation import validate_meeting
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# IntentParserOutput fields -> the Graph event property that carries them
+_EVENT_PROPERTIES = {
+    "subject": "subject",
+    "attendees": "attendees",
+    "start_date_time": "start",
+    "start_time_zone": "start",
+    "end_date_time": "end",
+    "end_time_zone": "end",
+    "description": "body",
+    "location": "location",
+}
+# what PATCH sends for a property build_event leaves out because it was cleared
+_CLEARED = {
+    "attendees": [],
+    "body": {"contentType": "text", "content": ""},
+    "location": {"displayName": ""},
+}
+
+
+# the meeting with a follow-up's changes applied; a moved start keeps the meeting's length
+def apply_patch(details, patch):
+    """
+    Apply an IntentPatch to an IntentParserOutput
+
+    Attendees are matched case-insensitively, so "drop Bob" removes "bob". When only the
+    start moves, the end moves with it.
+
+    Returns:
+        IntentParserOutput: a copy with the patched fields
+    """
+    update = {field: value for field in ("subject", "start_date_time", "start_time_zone", "end_date_time",
+                                         "end_time_zone", "description", "location")
+              if (value := getattr(patch, field)) is not None}
+
+    removed = {name.casefold() for name in patch.remove_attendees}
+    attendees = [name for name in details.attendees or [] if name.casefold() not in removed]
+    for name in patch.add_attendees:
+        if name.casefold() not in {attendee.casefold() for attendee in attendees}:
+            attendees.append(name)
+    if attendees != (details.attendees or []):
+        update["attendees"] = attendees
+
+    if patch.start_date_time is not None and patch.end_date_time is None:
+        try:
+            length = datetime.fromisoformat(details.end_date_time) - datetime.fromisoformat(details.start_date_time)
+            end = datetime.fromisoformat(patch.start_date_time) + length
+            update["end_date_time"] = end.strftime("%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            # left for validate_meeting to report
+            pass
+    return details.model_copy(update=update)
+
+
+# Graph event properties that differ between two versions of a meeting
+def changed_properties(before, after) -> list[str]:
+    changed = list(dict.fromkeys(
+        prop for field, prop in _EVENT_PROPERTIES.items() if getattr(before, field) != getattr(after, field)
+    ))
+    # a series' range starts on the date of its first occurrence
+    if after.recurrence is not None and "start" in changed:
+        changed.append("recurrence")
+    return changed
+
+
+class MeetingSession:
+    """
+    A scheduled meeting and the follow-ups that edit it
+
+    `schedule` creates the meeting single-pass (utils.single_pass) and keeps its parse,
+    event id and resolved attendees. Each `edit` then asks the edit agent for an
+    IntentPatch (only the fields the follow-up changes) instead of re-parsing the whole
+    request, resolves only attendees that were added, and PATCHes the existing event with
+    the changed properties instead of creating a new one.
+    """
+
+    def __init__(self, client: GraphServiceClient, parser_agent: Agent, edit_agent: Agent,
+                 make_context: Callable):
+        self.client = client
+        self.parser_agent = parser_agent
+        self.edit_agent = edit_agent
+        self.make_context = make_context
+        self.details = None
+        self.event = None
+        # attendee name -> email, for the meeting's current attendees
+        self.emails = {}
+
+    async def schedule(self, user_input: str, stream: bool = False):
+        """
+        Schedule a new meeting and make it the one later edits apply to
+
+        Returns:
+            dict: schedule_request's {"details", "event", "usage"}
+        """
+        context = self.make_context()
+        result = await schedule_request(self.client, self.parser_agent, user_input, context, stream=stream)
+        if not result["event"].get("id") and result["event"].get("status") == "conflict":
+            # nothing was booked, so there is no meeting to edit yet
+            return result
+        # the same repairs schedule_meeting made before creating the event
+        self.details, _ = validate_meeting(result["details"], getattr(context, "current_time", None))
+        self.event = result["event"]
+        # just resolved by schedule_meeting, so this is answered by the name cache
+        self.emails = await resolve_name_map_batched(self.client, self.details.attendees or [])
+        return result
+
+    async def edit(self, user_input: str):
+        """
+        Apply a follow-up such as "make it 3pm instead" or "add bob" to the scheduled meeting
+
+        Args:
+            user_input (str): the follow-up request
+
+        Returns:
+            dict: {"details", "event", "changed", "usage"}; changed lists the Graph event
+                properties that were patched (empty if the follow-up changed nothing)
+
+        Raises:
+            InvalidMeeting: the edited times or zones are wrong beyond repair; the event is
+                left as it was
+        """
+        from models import MeetingEditContext
+
+        if self.details is None:
+            raise RuntimeError("no meeting to edit; schedule one first")
+
+        current_time = self.make_context().current_time
+        context = MeetingEditContext(current_time=current_time, meeting=self.details.model_dump_json())
+        with track_usage() as usage:
+            with span("edit_parse") as fields:
+                result = await Runner.run(starting_agent=self.edit_agent, input=user_input, context=context)
+                fields.update(record_usage(result, stage="edit"))
+
+        patched = apply_patch(self.details, result.final_output)
+        # a meeting that has begun can still get attendees or a location; only a new start must be ahead
+        moved = (patched.start_date_time, patched.start_time_zone) != \
+            (self.details.start_date_time, self.details.start_time_zone)
+        details, repairs = validate_meeting(patched, current_time, check_past=moved)
+        for repair in repairs:
+            print(f"'{details.subject}': {repair}")
+        changed = changed_properties(self.details, details)
+        if changed:
+            await self._patch(details, changed)
+
+        count("scheduler_meetings_total", mode="edit")
+        log_event("meeting", mode="edit", changed=",".join(changed), llm_calls=usage["requests"],
+                  input_tokens=usage["input_tokens"], cached_input_tokens=usage["cached_input_tokens"],
+                  output_tokens=usage["output_tokens"])
+        return {"details": details, "event": self.event, "changed": changed, "usage": dict(usage)}
+
+    async def _patch(self, details, changed: list[str]):
+        from .calendar_mirror import record_event
+
+        emails = dict(self.emails)
+        if added := [name for name in details.attendees or [] if name not in emails]:
+            emails.update(await resolve_name_map_batched(self.client, added))
+        emails = {name: emails[name] for name in details.attendees or [] if name in emails}
+
+        event = to_json(build_event(details, list(emails.values())))
+        body = {prop: event.get(prop, _CLEARED.get(prop)) for prop in changed}
+        event_id = await self._event_id()
+        with span("patch_event", properties=len(body)):
+            updated = await send_json(self.client, "PATCH", f"/me/events/{event_id}", body) or {}
+        if updated.get("id"):
+            await record_event({**updated, "showAs": "busy"}, self.client)
+
+        self.details, self.emails = details, emails
+        self.event = {
+            **self.event,
+            "id": event_id,
+            "subject": details.subject,
+            "start": details.start_date_time,
+            "end": details.end_date_time,
+            "web_link": updated.get("webLink", self.event.get("web_link")),
+        }
+
+    # id of the scheduled event, waiting for the outbox to send it if it was queued
+    async def _event_id(self) -> str:
+        if self.event.get("id"):
+            return self.event["id"]
+        from .outbox import get_outbox
+
+        status = await get_outbox().wait(self.event["transaction_id"])
+        if status is None or not status.get("id"):
+            raise RuntimeError(f"event was not created: {(status or {}).get('error', 'unknown transaction id')}")
+        self.event.update(id=status["id"], web_link=status.get("web_link"), status=status["status"])
+        return status["id"]
@@ -0,0 +1,336 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+from models import IntentParserOutput
+
+from .timezones import ABBREVIATIONS
+from .validation import YEAR_ROLLOVER
+
+DEFAULT_TIME_ZONE = "Pacific Standard Time"
+DEFAULT_DURATION_MINUTES = 30
+
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tue": 1, "tues": 1, "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thur": 3, "thurs": 3, "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5, "sunday": 6, "sun": 6,
+}
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8, "sep": 9, "sept": 9,
+    "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+
+_WEEKDAY = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_ZONE = "|".join(sorted(ABBREVIATIONS, key=len, reverse=True))
+_CLOCK = r"(?:\d{1,2}(?::\d{2})?\s*(?:[ap]\.?m\.?)?|noon|midnight)"
+# words that end an attendee list or a subject phrase
+_STOP = (r"(?=\s+(?:about|regarding|re|to discuss|with|on|at|from|for|in|between|tomorrow|today|tonight"
+         r"|next|this|coming|" + _WEEKDAY + r")\b|\s+\d|\s*[.?!;(]|$)")
+
+_PATTERNS = {
+    # recurrence, availability and edits, and negations ("don't schedule ...") need the model
+    "bail": re.compile(r"\b(?:every|each|weekly|daily|monthly|biweekly|recurring|cancel|cancelled|canceled"
+                       r"|call off|reschedule|move|delete|available|availability|free|when|not|never|dont|no longer)\b"
+                       r"|\b\w+n['’]t\b|\?", re.I),
+    "range": re.compile(rf"(?:\b(?P<pre>from|between|at)\s+)?(?P<s>{_CLOCK})\s*(?P<sep>-|–|\bto\b|\buntil\b|\btill\b|\band\b)"
+                        rf"\s*(?P<e>{_CLOCK})(?![\w:])", re.I),
+    "time": re.compile(r"(?:\bat\s+|@\s*)?(?P<t>\b\d{1,2}(?::\d{2})?\s*[ap]\.?m\.?|\b\d{1,2}:\d{2}|\bnoon|\bmidnight)"
+                       r"(?![\w:])|\bat\s+(?P<bare>\d{1,2})\b(?![:/])", re.I),
+    "duration": re.compile(r"(?:\bfor\s+)?(?:(?P<n>\d+(?:\.\d+)?)|(?P<half>half an?)|(?P<one>an?|one))\s*-?\s*"
+                           r"(?P<unit>hours?|hrs?|minutes?|mins?)\b", re.I),
+    "relative": re.compile(r"\b(?:the\s+)?(?P<w>day after tomorrow|tomorrow|today|tonight)\b", re.I),
+    "in_days": re.compile(r"\bin\s+(?P<n>\d+|a|one|two|three)\s+(?P<unit>days?|weeks?)\b", re.I),
+    "weekday": re.compile(rf"\b(?:on\s+)?(?:(?P<mod>next|this|coming)\s+)?(?P<d>{_WEEKDAY})\b\.?", re.I),
+    "iso_date": re.compile(r"\b(?:on\s+)?(?P<y>\d{4})-(?P<m>\d{2})-(?P<d>\d{2})\b"),
+    "us_date": re.compile(r"\b(?:on\s+)?(?P<m>\d{1,2})/(?P<d>\d{1,2})(?:/(?P<y>\d{2,4}))?\b"),
+    "month_day": re.compile(rf"\b(?:on\s+)?(?P<mon>{_MONTH})\.?\s+(?P<d>\d{{1,2}})(?![\d:])(?:st|nd|rd|th)?(?:,?\s+(?P<y>\d{{4}}))?\b",
+                            re.I),
+    "day_month": re.compile(rf"\b(?:on\s+)?(?:the\s+)?(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<mon>{_MONTH})\b"
+                            r"(?:,?\s+(?P<y>\d{4}))?", re.I),
+    "zone": re.compile(rf"\b(?:in\s+)?(?P<z>{_ZONE})(?:\s+(?:standard|daylight))?(?:\s+time)?\b", re.I),
+    "attendees": re.compile(r"\bwith\s+(?P<names>[a-z][\w'.&, -]*?)" + _STOP, re.I),
+    "topic": re.compile(r"\b(?:about|regarding|re:|to discuss)\s+(?P<subj>[^.?!;]+?)" + _STOP, re.I),
+    "quoted": re.compile(r"[\"“](?P<subj>[^\"”]+)[\"”]"),
+    "lead": re.compile(r"^\s*(?:(?:hey|hi|please|can you|could you|would you|i want to|i'd like to|i would like to"
+                       r"|i need to|let's|lets)\s+)*(?:schedule|book|set up|setup|create|arrange|plan|add|put together)"
+                       r"\s+(?:a|an|the|my|our)?\s*(?P<subj>.+?)" + _STOP, re.I),
+    "head": re.compile(r"^\s*(?P<subj>[a-z][\w' :-]*?)" + _STOP, re.I),
+    "room": re.compile(r"\b(?:in|at)\s+(?P<loc>(?:conference\s+|meeting\s+)?room\s+[\w-]+)", re.I),
+    "place": re.compile(r"\b(?:in|at)\s+(?P<loc>[A-Z][\w'-]*(?:\s+[A-Z0-9][\w'-]*)*)"),
+}
+
+# words that carry no meeting details; anything else left unexplained lowers the confidence
+_FILLER = set("""
+a an the i i'd we me us my our you please can could would want like need to let's lets hey hi
+schedule book set setup up create arrange plan add put together invite meeting meet call sync
+on at for from and in of time some quick new
+""".split())
+
+# attendees that name a group rather than a person ("the team", "everyone"); the model has to expand them
+_GROUP_WORDS = {"team", "teams", "everyone", "everybody", "all", "group", "folks", "staff", "department",
+                "dept", "squad", "crew", "managers", "leads"}
+_GROUP_LEADS = {"the", "my", "our", "your", "all"}
+
+_GENERIC_SUBJECTS = {"meeting", "call", "sync", "meet", "chat", "catch up", "catchup", "quick call", "quick sync"}
+
+
+@dataclass
+class FastParse:
+    """Result of the rule-based parser; `details` is None when the text could not be parsed"""
+    details: Optional[IntentParserOutput]
+    confidence: float
+    reasons: list[str] = field(default_factory=list)
+
+
+def _clock(value: str, meridiem: Optional[str] = None):
+    """(hour, minute, unambiguous) for '2', '2:30', '14:00', '2pm', 'noon'"""
+    value = value.lower().replace(".", "").replace(" ", "")
+    if value == "noon":
+        return 12, 0, True
+    if value == "midnight":
+        return 0, 0, True
+    own = _meridiem(value)
+    digits = value[:-2] if own else value
+    hour_text, _, minute_text = digits.partition(":")
+    hour, minute = int(hour_text), int(minute_text or 0)
+    if hour > 23 or minute > 59:
+        raise ValueError(value)
+    # "14:00" and "09:30" are 24-hour clock times
+    explicit = own is not None or hour > 12 or hour_text.startswith("0")
+    meridiem = own or (None if explicit else meridiem)
+    if meridiem and hour <= 12:
+        hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    return hour, minute, explicit or meridiem is not None
+
+
+def _meridiem(value: str):
+    value = value.lower().replace(".", "").replace(" ", "")
+    return value[-2:] if value[-2:] in ("am", "pm") else None
+
+
+def _business_hour(hour: int) -> int:
+    # "at 3" almost always means 3pm; 8-11 mean the morning
+    return hour + 12 if 1 <= hour <= 7 else hour
+
+
+def _next_weekday(today: datetime, weekday: int) -> datetime:
+    return today + timedelta(days=(weekday - today.weekday() - 1) % 7 + 1)
+
+
+def _with_year(now: datetime, month: int, day: int, year: Optional[str]) -> datetime:
+    if year:
+        year = int(year)
+        return datetime(year + 2000 if year < 100 else year, month, day)
+    candidate = datetime(now.year, month, day)
+    if candidate.date() >= now.date():
+        return candidate
+    # a bare date already behind us means next year's only if that is close (same rule as
+    # validate_meeting); otherwise it stays in the past and the parse is left to the model
+    following = datetime(now.year + 1, month, day)
+    return following if following - now <= YEAR_ROLLOVER else candidate
+
+
+class _Text:
+    """The request plus a record of which characters a rule has explained"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.used = [False] * len(text)
+
+    def find(self, name: str):
+        for match in _PATTERNS[name].finditer(self.text):
+            if not any(self.used[match.start():match.end()]):
+                return match
+        return None
+
+    def take(self, match, group=0):
+        for i in range(match.start(group), match.end(group)):
+            self.used[i] = True
+
+    def leftover(self) -> list[str]:
+        rest = "".join(" " if used else ch for ch, used in zip(self.text, self.used))
+        return [w for w in re.findall(r"[a-z0-9']+", rest.lower()) if w not in _FILLER]
+
+
+def fast_parse(text: str, now: datetime) -> FastParse:
+    """
+    Parse common scheduling phrasings without a model call
+
+    Handles relative and absolute dates, single times and time ranges, durations,
+    time-zone abbreviations, "with <names>" attendee lists, "about <topic>" subjects and
+    rooms/places. The confidence starts at 1 and is lowered for every guess (default
+    duration, am/pm inferred, no explicit date) and for every word no rule explains.
+
+    Args:
+        text (str): the user's request
+        now (datetime): naive reference time (CurrentTime) that relative dates are based on
+
+    Returns:
+        FastParse: the parsed details (or None) with a confidence between 0 and 1
+    """
+    reasons = []
+    if _PATTERNS["bail"].search(text):
+        return FastParse(None, 0.0, ["needs the model (recurrence, availability, edit or negation)"])
+
+    t = _Text(text)
+    penalty = 0.0
+
+    # --- when ---
+    day, end_day_offset = None, 0
+    if m := t.find("iso_date"):
+        day = datetime(int(m["y"]), int(m["m"]), int(m["d"]))
+    elif m := t.find("month_day"):
+        day = _with_year(now, MONTHS[m["mon"].lower()], int(m["d"]), m["y"])
+    elif m := t.find("day_month"):
+        day = _with_year(now, MONTHS[m["mon"].lower()], int(m["d"]), m["y"])
+    elif m := t.find("us_date"):
+        day = _with_year(now, int(m["m"]), int(m["d"]), m["y"])
+    elif m := t.find("relative"):
+        word = m["w"].lower()
+        day = now + timedelta(days={"today": 0, "tonight": 0, "tomorrow": 1}.get(word, 2))
+    elif m := t.find("in_days"):
+        n = {"a": 1, "one": 1, "two": 2, "three": 3}.get(m["n"].lower()) or int(m["n"])
+        day = now + timedelta(days=n * (7 if m["unit"].lower().startswith("week") else 1))
+    elif m := t.find("weekday"):
+        day = _next_weekday(now, WEEKDAYS[m["d"].lower()])
+        if m["mod"] and m["mod"].lower() == "next" and day.isocalendar()[1] == now.isocalendar()[1]:
+            # "next friday" said on a wednesday can mean either friday; let the model decide
+            penalty += 0.25
+            reasons.append("'next <weekday>' close to today")
+    if m:
+        t.take(m)
+
+    start_hm = end_hm = None
+    if m := t.find("range"):
+        if m["sep"].lower() == "and" and (m["pre"] or "").lower() != "between":
+            # "at 2pm and 4pm" is two times, not a range
+            return FastParse(None, 0.0, ["two times joined by 'and'"])
+        end_meridiem = _meridiem(m["e"])
+        try:
+            start_h, start_m, start_explicit = _clock(m["s"], _meridiem(m["s"]) or end_meridiem)
+            end_h, end_m, end_explicit = _clock(m["e"], end_meridiem or _meridiem(m["s"]))
+        except ValueError:
+            return FastParse(None, 0.0, ["invalid clock time"])
+        if not start_explicit and not end_explicit:
+            start_h, end_h = _business_hour(start_h), _business_hour(end_h)
+            penalty += 0.2
+            reasons.append("am/pm guessed")
+        if (start_h, start_m) >= (end_h, end_m) and not _meridiem(m["s"]) and start_h >= 12:
+            # "11-1pm": the start is in the morning
+            start_h -= 12
+        if (start_h, start_m) >= (end_h, end_m) and not _meridiem(m["e"]) and end_h < 12:
+            # "9am-5": the end is in the afternoon
+            end_h += 12
+        if (start_h, start_m) >= (end_h, end_m):
+            end_day_offset = 1
+        start_hm, end_hm = (start_h, start_m), (end_h, end_m)
+        t.take(m)
+    elif m := t.find("time"):
+        if m["bare"]:
+            start_hm = (_business_hour(int(m["bare"])), 0)
+            penalty += 0.2
+            reasons.append("am/pm guessed")
+        else:
+            try:
+                hour, minute, _ = _clock(m["t"])
+            except ValueError:
+                return FastParse(None, 0.0, ["invalid clock time"])
+            start_hm = (hour, minute)
+        t.take(m)
+
+    if start_hm is None:
+        return FastParse(None, 0.0, ["no start time"])
+
+    duration = None
+    if m := t.find("duration"):
+        n = 0.5 if m["half"] else 1 if m["one"] else float(m["n"])
+        duration = timedelta(hours=n) if m["unit"].lower().startswith("h") else timedelta(minutes=n)
+        t.take(m)
+
+    if day is None:
+        day = now
+        penalty += 0.15
+        reasons.append("no date given")
+    start = day.replace(hour=start_hm[0], minute=start_hm[1], second=0, microsecond=0)
+    if day is now and start <= now:
+        start += timedelta(days=1)
+    if end_hm is not None:
+        end = start.replace(hour=end_hm[0], minute=end_hm[1]) + timedelta(days=end_day_offset)
+    elif duration:
+        end = start + duration
+    else:
+        end = start + timedelta(minutes=DEFAULT_DURATION_MINUTES)
+        penalty += 0.1
+        reasons.append("default duration")
+    if start < now:
+        return FastParse(None, 0.0, ["start is in the past"])
+
+    time_zone = DEFAULT_TIME_ZONE
+    if m := t.find("zone"):
+        time_zone = ABBREVIATIONS[m["z"].lower()]
+        t.take(m)
+
+    # --- who ---
+    attendees = []
+    if m := t.find("attendees"):
+        for name in re.split(r",\s*(?:and\s+)?|\s+and\s+|\s*&\s*", m["names"]):
+            name = name.strip(" .")
+            if not name or name.lower() in ("me", "myself", "us"):
+                continue
+            words = name.lower().split()
+            if words[0] in _GROUP_LEADS or _GROUP_WORDS.intersection(words):
+                penalty += 0.5
+                reasons.append(f"group attendee {name!r}")
+            elif len(name.split()) > 2 or not re.fullmatch(r"[A-Za-z][\w'.-]*(?: [A-Za-z][\w'.-]*)?", name):
+                penalty += 0.3
+                reasons.append(f"unusual attendee {name!r}")
+            attendees.append(name)
+        t.take(m)
+        # "John (john@example.com)": the parenthesis only repeats the person
+        if (paren := re.compile(r"\s*\([^)]*\)").match(text, m.end())):
+            t.take(paren)
+
+    # --- where ---
+    location = ""
+    if m := t.find("room") or t.find("place"):
+        location = m["loc"]
+        if location.lower() in ABBREVIATIONS or location.lower() in WEEKDAYS or location.lower() in MONTHS:
+            location = ""
+        else:
+            t.take(m)
+
+    # --- what ---
+    subject = ""
+    for name in ("quoted", "topic", "lead", "head"):
+        if m := t.find(name):
+            subject = m["subj"].strip(" ,")
+            t.take(m)
+            break
+    if subject.lower() in _GENERIC_SUBJECTS or not subject:
+        kind = subject.capitalize() or "Meeting"
+        subject = f"{kind} with {', '.join(attendees)}" if attendees else kind
+        if not attendees:
+            penalty += 0.1
+            reasons.append("no subject")
+    else:
+        subject = subject[0].upper() + subject[1:]
+
+    leftover = t.leftover()
+    if leftover:
+        penalty += 0.1 * len(leftover)
+        reasons.append(f"unexplained words: {' '.join(leftover)}")
+
+    details = IntentParserOutput(
+        subject=subject,
+        start_date_time=start.isoformat(timespec="seconds"),
+        start_time_zone=time_zone,
+        end_date_time=end.isoformat(timespec="seconds"),
+        end_time_zone=time_zone,
+        attendees=attendees,
+        description="",
+        location=location,
+    )
+    return FastParse(details, max(0.0, round(1.0 - penalty, 3)), reasons)
@@ -1,40 +1,25 @@
+from __future__ import annotations
+
 import asyncio
 from dotenv import load_dotenv
 import os
-from azure.identity.aio import ClientSecretCredential
-from azure.identity import DeviceCodeCredential, InteractiveBrowserCredential
-from msgraph import GraphServiceClient
-from msgraph.generated.models.date_time_time_zone import DateTimeTimeZone
-from msgraph.generated.models.event import Event
-from msgraph.generated.models.item_body import ItemBody
-from msgraph.generated.models.body_type import BodyType
-from msgraph.generated.models.location import Location
-from msgraph.generated.models.attendee import Attendee
-from msgraph.generated.models.email_address import EmailAddress
-from msgraph.generated.models.online_meeting_provider_type import OnlineMeetingProviderType
-from msgraph.generated.users.users_request_builder import UsersRequestBuilder
-from msgraph.generated.users.item.events.events_request_builder import EventsRequestBuilder
-from kiota_abstractions.base_request_configuration import RequestConfiguration
-from agents import function_tool
-from datetime import datetime, timedelta
-from pprint import pprint
-import requests
-from msal import PublicClientApplication
-
-from pydantic import BaseModel, Field
-
-
-
-class IntentParserOutput(BaseModel):
-    """Class for structuring the output to parse the intent of a meeting through teams by using Microsoft Graph api"""
-    subject: str = Field(description="Meeting subject/title")
-    start_date_time: str = Field(description="Start time in ISO 8601 format")
-    start_time_zone: str = Field(description="Microsoft Graph compatible windows time zone")
-    end_date_time: str = Field(description="End time in ISO 8601 format")
-    end_time_zone: str = Field(description="Microsoft Graph compatible windows time zone")
-    attendees: list[str] = Field(description="List of attendee names")
-    description: str = Field(description="Meeting description/body")
-    location: str = Field(description="Meeting location")
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from .graph_json import odata_quote, send_batch, to_json, users_by_given_name_url
+from .metrics import span
+from .name_cache import directory_scope, name_cache
+from .throttle import THROTTLE_STATUSES, Throttled, graph_call
+
+# msgraph and its generated models are imported inside the functions that use them
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+    from models import IntentParserOutput
+
+# run context handed to agent tools that need to call Graph
+@dataclass
+class GraphContext:
+    client: GraphServiceClient
 
 # load environment variables from .env or set them directly here
 
@@ -89,36 +74,65 @@ async def get_user_info():
         "email": user.mail or user.user_principal_name
     }
 
-async def get_events():
-    # query_params = EventsRequestBuilder.EventsRequestBuilderGetQueryParameters(
-	# 	select = ["subject","body","bodyPreview","organizer","attendees","start","end","location"],
-    # )
-
-    # request_configuration = RequestConfiguration(
-    # query_parameters = query_params,
-    # )
-    headers = {
-    "Authorization": f"Bearer {access_token}"
-    }
-    response = requests.get("https://graph.microsoft.com/v1.0/me/calendars", headers=headers)
-    print(response.status_code)
+# lists the signed-in user's events between start and end (aware datetimes, default the next 7 days);
+# answered from the local calendar mirror, which only talks to Graph when it is stale
+async def get_events(client: GraphServiceClient, start: datetime = None, end: datetime = None):
+    from .calendar_mirror import get_calendar_mirror
+
+    start = start or datetime.now(timezone.utc)
+    end = end or start + timedelta(days=7)
+    mirror = get_calendar_mirror(client)
+    await mirror.ensure_synced(client, start, end)
+    return await asyncio.to_thread(mirror.events_between, start, end)
+
+
+# looks up one givenName in the directory; returns None when nobody matches and raises on errors
+async def _lookup_email_by_name(client: GraphServiceClient, name: str):
+    from msgraph.generated.users.users_request_builder import UsersRequestBuilder
+    from kiota_abstractions.base_request_configuration import RequestConfiguration
+
+    query_params = UsersRequestBuilder.UsersRequestBuilderGetQueryParameters(
+        filter=f"startswith(givenName, '{odata_quote(name)}') eq true",
+    )
+    request_configuration = RequestConfiguration(query_parameters=query_params)
+    with span("resolve", names=1):
+        result = await graph_call(client, lambda: client.users.get(request_configuration=request_configuration))
+
+    if result.value and len(result.value) > 0:
+        user = result.value[0]
+        return user.mail or user.user_principal_name
+    else:
+        print("No match found")
+        return None
 
+# local directory snapshot when DIRECTORY_INDEX_PATH is set, otherwise None and lookups go to Graph
+async def _directory_index(client: GraphServiceClient):
+    if not os.getenv("DIRECTORY_INDEX_PATH"):
+        return None
+    from .directory import get_directory_index
+    return await get_directory_index(client)
+
+# email for `name` from the directory index; an ambiguous name is left unresolved rather than
+# inviting whoever happens to rank first (the lookup_attendees tool lets the agent ask instead)
+def _index_email(index, name: str):
+    resolution = index.resolve(name)
+    if resolution.ambiguous:
+        options = ", ".join(f"{c['name']} <{c['email']}>" for c in resolution.candidates)
+        print(f"'{name}' is ambiguous, not invited: {options}")
+        return None
+    return resolution.email
 
-# resolves the user's email based on the givenName
+# resolves the user's email based on the givenName; raises Throttled rather than dropping the attendee
 async def resolve_email_by_name(client: GraphServiceClient, name: str):
     try:
-        query_params = UsersRequestBuilder.UsersRequestBuilderGetQueryParameters(
-            filter=f"startswith(givenName, '{name}') eq true",
+        index = await _directory_index(client)
+        if index is not None:
+            return _index_email(index, name)
+        return await name_cache.resolve(
+            directory_scope(client), name, lambda n: _lookup_email_by_name(client, n)
         )
-        request_configuration = RequestConfiguration(query_parameters=query_params)
-        result = await client.users.get(request_configuration=request_configuration)
-
-        if result.value and len(result.value) > 0:
-            user = result.value[0]
-            return user.mail or user.user_principal_name
-        else:
-            print("No match found")
-            return None
+    except Throttled:
+        raise
     except Exception as e:
         print(f"error searching for '{name}'")
         return None
@@ -129,8 +143,103 @@ async def resolve_emails_by_names(client: GraphServiceClient, names: list[str]):
     results = await asyncio.gather(*tasks)
     return [email for email in results if email]
 
+# looks up names through $batch; names whose lookup failed are left out of the result,
+# but throttling that outlasted the retries raises Throttled
+async def _lookup_names_batched(client: GraphServiceClient, names: list[str]):
+    sub_requests = [
+        {"id": str(i), "method": "GET", "url": users_by_given_name_url(name)}
+        for i, name in enumerate(names)
+    ]
+    with span("resolve", names=len(names)):
+        responses = await send_batch(client, sub_requests)
+
+    found = {}
+    for i, name in enumerate(names):
+        response = responses[str(i)]
+        if response.get("status") in THROTTLE_STATUSES:
+            raise Throttled(response["status"])
+        if response.get("status") != 200:
+            print(f"error searching for '{name}'")
+            continue
+        users = (response.get("body") or {}).get("value") or []
+        if users:
+            user = users[0]
+            found[name] = user.get("mail") or user.get("userPrincipalName")
+        else:
+            print("No match found")
+            found[name] = None
+    return found
+
+# resolves each unique name once (cache first, then $batch) and returns a name -> email mapping
+async def resolve_name_map_batched(client: GraphServiceClient, names: list[str]):
+    index = await _directory_index(client)
+    if index is not None:
+        results = {name: _index_email(index, name) for name in dict.fromkeys(names)}
+        return {name: email for name, email in results.items() if email}
+    results = await name_cache.resolve_many(
+        directory_scope(client), names, lambda missing: _lookup_names_batched(client, missing)
+    )
+    return {name: email for name, email in results.items() if email}
+
+# batched version of resolve_emails_by_names: one $batch request per 20 names instead of one request per name
+async def resolve_emails_by_names_batched(client: GraphServiceClient, names: list[str]):
+    emails_by_name = await resolve_name_map_batched(client, names)
+    results = [emails_by_name.get(name) for name in names]
+    return [email for email in results if email]
+
+# builds the Graph event for a parsed meeting and its resolved attendee emails; its transactionId
+# is new for every call, so Graph creates one event however often this event is sent
+def build_event(details: IntentParserOutput, resolved_emails: list[str], transaction_id: str = None):
+    import uuid
+    from msgraph.generated.models.date_time_time_zone import DateTimeTimeZone
+    from msgraph.generated.models.event import Event
+    from msgraph.generated.models.item_body import ItemBody
+    from msgraph.generated.models.body_type import BodyType
+    from msgraph.generated.models.location import Location
+    from msgraph.generated.models.attendee import Attendee
+    from msgraph.generated.models.email_address import EmailAddress
+    from msgraph.generated.models.online_meeting_provider_type import OnlineMeetingProviderType
+
+    event = Event(subject=details.subject, transaction_id=transaction_id or str(uuid.uuid4()))
+
+    if details.description:
+        event.body = ItemBody(content=details.description, content_type=BodyType.Text)
+
+    event.start = DateTimeTimeZone(date_time=details.start_date_time, time_zone=details.start_time_zone)
+    event.end = DateTimeTimeZone(date_time=details.end_date_time, time_zone=details.end_time_zone)
+
+    if details.location:
+        event.location = Location(display_name=details.location)
+
+    if resolved_emails:
+        event.attendees = [
+            Attendee(email_address=EmailAddress(address=email)) for email in resolved_emails
+        ]
+
+    if details.recurrence is not None:
+        from datetime import date
+        from .recurrence import patterned_recurrence
+
+        start_date = date.fromisoformat(details.start_date_time[:10])
+        event.recurrence = patterned_recurrence(details.recurrence, start_date, details.start_time_zone)
+
+    event.allow_new_time_proposals = True
+    event.is_online_meeting = True
+    event.online_meeting_provider = OnlineMeetingProviderType.TeamsForBusiness
+    return event
+
+# checks and repairs the parsed times and zones locally, so bad parses never cost a Graph round trip
+def _validated(details: IntentParserOutput, current_time=None):
+    from .validation import validate_meeting
+
+    details, repairs = validate_meeting(details, current_time)
+    for repair in repairs:
+        print(f"'{details.subject}': {repair}")
+    return details
+
 # schedules a meeting
-async def schedule_meeting(client: GraphServiceClient, details: IntentParserOutput):
+async def schedule_meeting(client: GraphServiceClient, details: IntentParserOutput, allow_conflicts: bool = False,
+                           transaction_id: str = None):
     """
     Schedule a meeting using Microsoft Graph API
     
@@ -143,47 +252,118 @@ async def schedule_meeting(client: GraphServiceClient, details: IntentParserOutp
         attendees (list, optional): List of attendee email addresses
         description (str, optional): Meeting description
         location (str, optional): Meeting location
+        allow_conflicts (bool): book the meeting even if it overlaps events in the
+            organizer's calendar
+        transaction_id (str, optional): idempotency key used as the Graph transactionId, so
+            a caller retrying the same request gets the event created the first time
         
     Returns:
-        dict: Created event details
+        dict: Created event details. When the local calendar mirror (CALENDAR_MIRROR_PATH)
+            is enabled, a meeting that overlaps existing events is not booked unless
+            allow_conflicts is set: "id" is None, "status" is "conflict" and "conflicts"
+            lists the overlapping events (also set when it was booked anyway). With the outbox
+            (OUTBOX_PATH) the event is queued instead: "id" and "web_link" are None and
+            "status" / "transaction_id" tell how to follow it (utils.outbox). A recurring
+            meeting also has "occurrences" and "occurrence_conflicts", the occurrences some
+            attendees are busy for (utils.recurrence)
+
+    Raises:
+        InvalidMeeting: times or zones that are wrong beyond repair, before any Graph call
     """
 
-    # extract fields from the structured output
-    subject = details.subject
-    start_date_time = details.start_date_time
-    start_time_zone = details.start_time_zone
-    end_date_time = details.end_date_time
-    end_time_zone = details.end_time_zone
-    attendees = details.attendees
-    description = details.description
-    location = details.location
+    details = _validated(details)
+    resolved_emails = await resolve_emails_by_names_batched(client, details.attendees or [])
+    return await book_meeting(client, details, resolved_emails, allow_conflicts, transaction_id)
 
-    # Resolve attendee names → emails
-    resolved_emails = await resolve_emails_by_names(client, attendees or [])
+# books an already validated meeting for resolved attendees; shared by schedule_meeting and batch runs
+async def book_meeting(client: GraphServiceClient, details: IntentParserOutput, resolved_emails: list[str],
+                       allow_conflicts: bool = False, transaction_id: str = None):
+    """
+    Check a meeting against the calendars, then create it (or queue it in the outbox)
 
-    # Build the event
-    event = Event(subject=subject)
+    Args:
+        client (GraphServiceClient): authenticated client
+        details (IntentParserOutput): meeting that already passed validate_meeting
+        resolved_emails (list[str]): attendee emails
+        allow_conflicts (bool): book it even if it overlaps the organizer's events
+        transaction_id (str, optional): Graph transactionId, so sending the same meeting
+            again (a retry, a resumed batch) creates one event; new for every call by default
 
-    if description:
-        event.body = ItemBody(content=description, content_type=BodyType.Text)
+    Returns:
+        dict: same as schedule_meeting
+    """
+    from .calendar_mirror import find_conflicts, record_created_event
+
+    # a series' free/busy is fetched before the event exists, or getSchedule could
+    # report the new series itself as busy time in the attendees' calendars;
+    # the organizer's calendar is checked locally at the same time
+    series, conflicts = await asyncio.gather(
+        _series_conflicts(client, details, resolved_emails),
+        find_conflicts(client, details),
+    )
+    if conflicts and not allow_conflicts:
+        print(f"'{details.subject}' overlaps {len(conflicts)} existing event(s), not booked")
+        return {
+            "id": None,
+            "subject": details.subject,
+            "start": details.start_date_time,
+            "end": details.end_date_time,
+            "web_link": None,
+            "status": "conflict",
+            "conflicts": conflicts,
+        }
+
+    if os.getenv("OUTBOX_PATH"):
+        event = await _queue_event(client, details, resolved_emails, transaction_id)
+    else:
+        event = await create_event(client, details, resolved_emails, transaction_id)
+        await record_created_event(client, event, details)
+    if series is not None:
+        event.update(occurrences=series["occurrences"], occurrence_conflicts=series["conflicts"])
+        if series["conflicts"]:
+            print(f"'{details.subject}': attendees are busy for {len(series['conflicts'])} "
+                  f"of {series['occurrences']} occurrence(s)")
+    if conflicts:
+        print(f"'{details.subject}' overlaps {len(conflicts)} existing event(s), booked anyway")
+        event["conflicts"] = conflicts
+    return event
+
+# attendee conflicts of every occurrence of a recurring meeting; None for single meetings
+async def _series_conflicts(client: GraphServiceClient, details: IntentParserOutput, resolved_emails: list[str]):
+    if details.recurrence is None:
+        return None
+    # numpy is only loaded for recurring meetings
+    from .recurrence import series_conflicts
 
-    event.start = DateTimeTimeZone(date_time=start_date_time, time_zone=start_time_zone)
-    event.end = DateTimeTimeZone(date_time=end_date_time, time_zone=end_time_zone)
+    return await series_conflicts(client, details, resolved_emails)
 
-    if location:
-        event.location = Location(display_name=location)
+# writes the event to the outbox and returns its acknowledgement; a background worker creates it
+async def _queue_event(client: GraphServiceClient, details: IntentParserOutput, resolved_emails: list[str],
+                       transaction_id: str = None):
+    from .outbox import get_outbox
 
-    if resolved_emails:
-        event.attendees = [
-            Attendee(email_address=EmailAddress(address=email)) for email in resolved_emails
-        ]
+    ack = await get_outbox().enqueue(client, to_json(build_event(details, resolved_emails, transaction_id)))
+    return {
+        "id": ack.get("id"),
+        "subject": details.subject,
+        "start": details.start_date_time,
+        "end": details.end_date_time,
+        "web_link": ack.get("web_link"),
+        "status": ack["status"],
+        "transaction_id": ack["transaction_id"],
+    }
 
-    event.allow_new_time_proposals = True
-    event.is_online_meeting = True
-    event.online_meeting_provider = OnlineMeetingProviderType.TeamsForBusiness
+# creates the event for already-resolved attendees
+async def create_event(client: GraphServiceClient, details: IntentParserOutput, resolved_emails: list[str],
+                       transaction_id: str = None):
+    # Build the event
+    event = build_event(details, resolved_emails, transaction_id)
 
     # Call Graph API
-    created_event = await client.me.events.post(event)
+    with span("create_event", attendees=len(resolved_emails)):
+        # the transactionId makes a repeated POST return the event created the first time
+        created_event = await graph_call(client, lambda: client.me.events.post(event),
+                                         idempotent=bool(event.transaction_id))
 
     return {
         "id": created_event.id,
@@ -193,6 +373,71 @@ async def schedule_meeting(client: GraphServiceClient, details: IntentParserOutp
         "web_link": created_event.web_link
     }
 
+# schedules many meetings, resolving each attendee once and posting the events through $batch
+async def schedule_meetings(client: GraphServiceClient, details_list: list[IntentParserOutput]):
+    """
+    Schedule several meetings with a handful of Graph requests
+
+    Attendee names are deduplicated across all meetings and resolved together, then the
+    events are created through $batch, 20 per request. Each event carries its own
+    transactionId, so a sub-request sent again after a 429/5xx whose first attempt was
+    carried out still creates one meeting. A $batch request that fails as a whole is
+    reported per meeting, without losing the other batches' results. Meetings that fail local validation
+    (utils.validation) are reported with status 400 and never sent.
+
+    Args:
+        client (GraphServiceClient): authenticated client
+        details_list (list[IntentParserOutput]): meetings to create
+
+    Returns:
+        list[dict]: one entry per input, in order, with "ok", "event" (same shape as
+            schedule_meeting's result) or "error" ({"status", "message"})
+    """
+    from .validation import InvalidMeeting
+
+    results = [None] * len(details_list)
+    valid = {}
+    for i, details in enumerate(details_list):
+        try:
+            valid[i] = _validated(details)
+        except InvalidMeeting as e:
+            results[i] = {"ok": False, "error": {"status": 400, "message": str(e)}}
+
+    all_names = [name for details in valid.values() for name in (details.attendees or [])]
+    emails_by_name = await resolve_name_map_batched(client, all_names)
+
+    sub_requests = []
+    for i, details in valid.items():
+        resolved_emails = [emails_by_name[name] for name in (details.attendees or []) if name in emails_by_name]
+        sub_requests.append({
+            "id": str(i),
+            "method": "POST",
+            "url": "/me/events",
+            "headers": {"Content-Type": "application/json"},
+            "body": to_json(build_event(details, resolved_emails)),
+        })
+    with span("create_events_batch", meetings=len(sub_requests)):
+        responses = await send_batch(client, sub_requests)
+
+    for i in valid:
+        response = responses[str(i)]
+        body = response.get("body") or {}
+        if response.get("status") == 201:
+            results[i] = {
+                "ok": True,
+                "event": {
+                    "id": body.get("id"),
+                    "subject": body.get("subject"),
+                    "start": (body.get("start") or {}).get("dateTime"),
+                    "end": (body.get("end") or {}).get("dateTime"),
+                    "web_link": body.get("webLink"),
+                },
+            }
+        else:
+            message = (body.get("error") or {}).get("message", "unknown error")
+            results[i] = {"ok": False, "error": {"status": response.get("status"), "message": message}}
+    return results
+
 
 # For testing the module directly
 if __name__ == "__main__":
@@ -218,7 +463,7 @@ if __name__ == "__main__":
     # scopes = ["User.Read", "User.Read.All", "Calendars.ReadWrite", "User.ReadBasic.All", "VirtualAppointment.ReadWrite", "OnlineMeetings.ReadWrite"]
     # client = GraphServiceClient(credentials=credentials, scopes=scopes)
 
-    asyncio.run(get_events())
+    # asyncio.run(get_events(client))
 
     
 
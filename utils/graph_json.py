@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+
+from .metrics import record_graph_response
+from .name_cache import directory_scope
+from .throttle import REFUSED_STATUSES, THROTTLE_STATUSES, graph_call, graph_scheduler
+
+if TYPE_CHECKING:
+    from kiota_abstractions.serialization import Parsable
+    from msgraph import GraphServiceClient
+
+# Graph rejects a $batch payload with more than 20 sub-requests
+BATCH_LIMIT = 20
+
+# sub-request statuses that are worth sending again
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+# error codes Graph uses when a delta token can no longer be followed
+_EXPIRED_DELTA_CODES = {"syncStateNotFound", "syncStateInvalid", "resyncRequired"}
+
+
+def delta_expired(error: BaseException) -> bool:
+    """Whether `error` says a deltaLink has expired and the delta query must start over (410 Gone)"""
+    if getattr(error, "response_status_code", None) == 410:
+        return True
+    return getattr(getattr(error, "error", None), "code", None) in _EXPIRED_DELTA_CODES
+
+
+def odata_quote(value: str) -> str:
+    """Escape a value for use inside a single-quoted OData string literal"""
+    return value.replace("'", "''")
+
+
+def to_json(model: Parsable) -> dict:
+    """Serialize an SDK model (e.g. an Event) to the JSON body Graph expects"""
+    from kiota_serialization_json.json_serialization_writer import JsonSerializationWriter
+
+    writer = JsonSerializationWriter()
+    writer.write_object_value(None, model)
+    return json.loads(writer.get_serialized_content())
+
+
+def users_by_given_name_url(name: str) -> str:
+    """Relative Graph url for the `startswith(givenName, ...)` lookup used by resolve_email_by_name"""
+    query = quote(f"startswith(givenName, '{odata_quote(name)}') eq true", safe="(),'")
+    return f"/users?$filter={query}"
+
+
+def is_idempotent(method: str, payload=None) -> bool:
+    """Whether sending a request twice is harmless: anything but a POST, or a POST carrying a transactionId"""
+    return method != "POST" or bool((payload or {}).get("transactionId"))
+
+
+# sends a JSON request through the client's request adapter so auth, middleware and base_url are shared
+async def send_json(client: GraphServiceClient, method: str, url: str, payload=None, cost: float = 1,
+                    idempotent: bool = None):
+    """
+    Send a raw JSON request to Graph using the client's request adapter
+
+    The request goes through utils.throttle, which rate-limits it and retries throttling
+    (only 429 for requests that are not idempotent).
+
+    Args:
+        client (GraphServiceClient): authenticated client; its adapter's base_url is honoured,
+            so pointing it at a local fake Graph server works without any other changes
+        method (str): HTTP method, e.g. "GET" or "POST"
+        url (str): path relative to the base url (e.g. "/$batch") or an absolute nextLink/deltaLink
+        payload (dict, optional): JSON body
+        cost (float): rate-limit tokens the request takes (sub-requests in a $batch)
+        idempotent (bool, optional): whether the request may be sent twice; by default
+            decided by is_idempotent, so pass True for read-only POSTs such as getSchedule
+
+    Returns:
+        dict: decoded JSON response, or None for empty responses
+    """
+    from kiota_abstractions.method import Method
+    from kiota_abstractions.request_information import RequestInformation
+
+    adapter = client.request_adapter
+    if url.startswith("http"):
+        info = RequestInformation(Method[method])
+        info.url = url
+    else:
+        info = RequestInformation(Method[method], "{+baseurl}" + url)
+    info.headers.try_add("Accept", "application/json")
+    if payload is not None:
+        info.headers.try_add("Content-Type", "application/json")
+        info.content = json.dumps(payload).encode("utf-8")
+
+    if idempotent is None:
+        idempotent = is_idempotent(method, payload)
+    body = await graph_call(client, lambda: adapter.send_primitive_async(info, "bytes", None), cost, idempotent)
+    if not body:
+        return None
+    return json.loads(body)
+
+
+# sub-response reported for every sub-request of a $batch POST that failed as a whole
+def _chunk_error(req: dict, error: Exception) -> dict:
+    status = getattr(error, "status", None) or getattr(error, "response_status_code", None) or 500
+    return {"id": req["id"], "status": status, "body": {"error": {"message": str(error)}}}
+
+
+def _retry_delay(response: dict, attempt: int) -> float:
+    headers = {k.lower(): v for k, v in (response.get("headers") or {}).items()}
+    try:
+        return float(headers["retry-after"])
+    except (KeyError, TypeError, ValueError):
+        return min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+
+
+# sends a list of sub-requests through Graph $batch, chunked by BATCH_LIMIT
+async def send_batch(client: GraphServiceClient, requests: list[dict], max_retries: int = 3,
+                     retry_statuses=RETRYABLE_STATUSES, concurrency: int = 4):
+    """
+    Send sub-requests through the Graph JSON $batch endpoint
+
+    Sub-requests are packed BATCH_LIMIT at a time. Only the sub-requests that come back
+    with a retryable status (429/5xx) are sent again, honouring their Retry-After header;
+    a POST without a transactionId is only sent again after a 429, since a 5xx may come
+    after it was carried out. A $batch request that fails as a whole reports the error
+    for each of its sub-requests, keeping the results of the other chunks. At most `concurrency` $batch requests are in flight at once, since Graph caps the number
+    of concurrent requests per mailbox. Throttled sub-requests also slow down the tenant's
+    other Graph calls through utils.throttle.
+
+    Args:
+        client (GraphServiceClient): authenticated client
+        requests (list[dict]): sub-requests, each with a unique "id", "method" and "url"
+            and optionally "body" / "headers"
+        max_retries (int): number of extra attempts for retryable sub-requests
+        retry_statuses (set, optional): statuses to retry
+        concurrency (int): maximum number of $batch requests in flight
+
+    Returns:
+        dict: sub-request id -> sub-response ({"status", "headers", "body"})
+    """
+    responses = {}
+    pending = list(requests)
+    attempt = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post_chunk(chunk):
+        # the $batch POST itself may be sent again only if every sub-request may
+        idempotent = all(is_idempotent(req["method"], req.get("body")) for req in chunk)
+        async with semaphore:
+            return await send_json(client, "POST", "/$batch", {"requests": chunk}, cost=len(chunk),
+                                   idempotent=idempotent)
+
+    while pending:
+        chunks = [pending[i:i + BATCH_LIMIT] for i in range(0, len(pending), BATCH_LIMIT)]
+        results = await asyncio.gather(*(post_chunk(chunk) for chunk in chunks), return_exceptions=True)
+
+        retry, delay, throttled = [], 0.0, False
+        by_id = {req["id"]: req for req in pending}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                for req in chunk:
+                    responses[req["id"]] = _chunk_error(req, result)
+                continue
+            for response in (result or {}).get("responses", []):
+                responses[response["id"]] = response
+                record_graph_response(response.get("status"), subrequest=True)
+                req = by_id[response["id"]]
+                if response.get("status") in retry_statuses and attempt < max_retries and \
+                        (is_idempotent(req["method"], req.get("body")) or response.get("status") in REFUSED_STATUSES):
+                    retry.append(req)
+                    delay = max(delay, _retry_delay(response, attempt))
+                    if response.get("status") in THROTTLE_STATUSES:
+                        throttled = True
+
+        # sub-requests missing from the response are reported as failed rather than dropped
+        for req in pending:
+            responses.setdefault(req["id"], {"id": req["id"], "status": 500, "body": None})
+
+        if not retry:
+            break
+        attempt += 1
+        if throttled:
+            # slows down every caller of this tenant, not just this batch
+            graph_scheduler.throttled(directory_scope(client), delay, attempt)
+        await asyncio.sleep(delay)
+        pending = retry
+
+    return responses
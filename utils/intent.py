@@ -0,0 +1,159 @@
+import json
+import os
+import re
+from datetime import datetime
+from typing import Callable
+
+from agents import Agent, Runner
+from pydantic import BaseModel
+
+from .metrics import count, record_usage, span
+from .parse_cache import parse_cache
+
+# fast-path results at or above this confidence skip the model; anything above 1 disables the fast path
+FAST_PARSE_THRESHOLD = float(os.getenv("FAST_PARSE_THRESHOLD", "0.8"))
+
+
+# rule-based parse of the request, or None when it should go to the model
+def _try_fast_parse(agent: Agent, user_input: str, context):
+    from models import IntentParserOutput
+    from .fast_parse import fast_parse
+
+    current_time = getattr(context, "current_time", None)
+    if FAST_PARSE_THRESHOLD > 1 or agent.output_type is not IntentParserOutput or not current_time:
+        return None
+    with span("fast_parse") as fields:
+        result = fast_parse(user_input, datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S"))
+        hit = result.details is not None and result.confidence >= FAST_PARSE_THRESHOLD
+        fields.update(confidence=result.confidence, hit=hit)
+    count("scheduler_fast_parse_total", result="hit" if hit else "fallthrough")
+    return result.details if hit else None
+
+
+# reference date the agent's output may be memoized under, or None if it is not cacheable
+def _cache_date(agent: Agent, context):
+    output_type = agent.output_type
+    reference_date = (getattr(context, "current_time", None) or "")[:10]
+    if parse_cache.max_size > 0 and reference_date and isinstance(output_type, type) \
+            and issubclass(output_type, BaseModel):
+        return reference_date
+    return None
+
+
+# answers the request from the parse cache or the fast path, or returns None if the agent has to run
+def _parse_locally(agent: Agent, user_input: str, context, fast_path: bool):
+    reference_date = _cache_date(agent, context)
+    if reference_date and (cached := parse_cache.get(user_input, reference_date)) is not None:
+        return agent.output_type.model_validate(cached)
+    if fast_path:
+        return _try_fast_parse(agent, user_input, context)
+    return None
+
+
+def _remember(agent: Agent, user_input: str, context, output):
+    if reference_date := _cache_date(agent, context):
+        parse_cache.put(user_input, reference_date, output.model_dump())
+
+
+# runs the intent parser agent and returns its structured output
+async def parse_intent(agent: Agent, user_input: str, context, fast_path: bool = True):
+    """
+    Parse a natural-language request into the agent's output_type
+
+    Requests the agent already parsed today are answered from utils.parse_cache.
+    Formulaic requests are parsed by the rule-based fast path (utils.fast_parse) and
+    only fall through to the agent when its confidence is below FAST_PARSE_THRESHOLD.
+
+    Args:
+        agent (Agent): intent parser agent
+        user_input (str): the user's request
+        context: run context for the agent (CurrentTime)
+        fast_path (bool): try the rule-based parser first
+
+    Returns:
+        IntentParserOutput: the parsed meeting details
+    """
+    if (details := _parse_locally(agent, user_input, context, fast_path)) is not None:
+        return details
+
+    with span("parse") as fields:
+        result = await Runner.run(starting_agent=agent, input=user_input, context=context)
+        fields.update(record_usage(result))
+    _remember(agent, user_input, context, result.final_output)
+    return result.final_output
+
+
+class AttendeeStream:
+    """
+    Pulls attendee names out of the structured output while it is still being generated
+
+    Feed it the text deltas of the model's JSON; `feed` returns the names whose string
+    (and the following ',' or ']') has been completed by that delta.
+    """
+
+    _LIST = re.compile(r'(?<!\\)"attendees"\s*:\s*\[')
+    _ITEM = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*([,\]])')
+    _END = re.compile(r"\s*\]")
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = None
+        self.done = False
+
+    def feed(self, delta: str) -> list[str]:
+        self.buffer += delta
+        if self.done:
+            return []
+        if self.position is None:
+            match = self._LIST.search(self.buffer)
+            if not match:
+                return []
+            self.position = match.end()
+        names = []
+        while match := self._ITEM.match(self.buffer, self.position):
+            names.append(json.loads(f'"{match[1]}"'))
+            self.position = match.end()
+            if match[2] == "]":
+                self.done = True
+                return names
+        if self._END.match(self.buffer, self.position):
+            self.done = True
+        return names
+
+
+# streamed parse_intent; on_attendees(names) is called as soon as attendee names appear in the output
+async def parse_intent_streamed(agent: Agent, user_input: str, context,
+                                on_attendees: Callable[[list[str]], None] = None, fast_path: bool = True):
+    """
+    Parse a request like parse_intent, but with the streamed runner
+
+    Lets callers start work on attendees (directory lookups, free/busy) while the model
+    is still generating the rest of the meeting details. Cached and fast-path parses
+    return without a model call and report their attendees at once.
+
+    Args:
+        agent (Agent): intent parser agent
+        user_input (str): the user's request
+        context: run context for the agent (CurrentTime)
+        on_attendees (Callable, optional): called with each batch of newly completed names
+        fast_path (bool): try the rule-based parser first
+
+    Returns:
+        IntentParserOutput: the parsed meeting details
+    """
+    if (details := _parse_locally(agent, user_input, context, fast_path)) is not None:
+        if on_attendees and details.attendees:
+            on_attendees(list(details.attendees))
+        return details
+
+    extractor = AttendeeStream()
+    with span("parse", streamed=True) as fields:
+        result = Runner.run_streamed(starting_agent=agent, input=user_input, context=context)
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and event.data.type == "response.output_text.delta":
+                names = extractor.feed(event.data.delta)
+                if names and on_attendees:
+                    on_attendees(names)
+        fields.update(record_usage(result))
+    _remember(agent, user_input, context, result.final_output)
+    return result.final_output
@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# SCHEDULER_METRICS=0 turns every span and counter into a no-op
+ENABLED = os.getenv("SCHEDULER_METRICS", "1") != "0"
+
+# upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("scheduling_assistant.metrics")
+logger.addHandler(logging.NullHandler())
+
+# (metric name, sorted label items) -> value
+_counters = defaultdict(float)
+# (metric name, sorted label items) -> [bucket counts..., sum, count]
+_histograms = {}
+# usage totals of the enclosing track_usage() blocks, shared with the tasks they start
+_usage = ContextVar("scheduler_usage", default=())
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def count(name: str, value: float = 1, **labels):
+    """Add `value` to a counter"""
+    if ENABLED:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record one latency sample in a histogram"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            hist[i] += 1
+    hist[-2] += seconds
+    hist[-1] += 1
+
+
+def log_event(event: str, **fields):
+    """Emit one structured JSON log line, if anyone is listening"""
+    if ENABLED and logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, "ts": time.time(), **fields}, default=str))
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """
+    Time a pipeline stage
+
+    Records the wall time in the `scheduler_stage_duration_seconds` histogram, counts
+    failures, and logs a JSON line with the stage, duration and any extra `fields`.
+    The yielded dict can be filled in by the caller to add fields to the log line.
+    """
+    if not ENABLED:
+        yield {}
+        return
+    extra = dict(fields)
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield extra
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("scheduler_stage_duration_seconds", elapsed, stage=stage)
+        if not ok:
+            count("scheduler_stage_errors_total", stage=stage)
+        log_event("span", stage=stage, duration_ms=round(elapsed * 1000, 3), ok=ok, **extra)
+
+
+def record_graph_response(status: int, subrequest: bool = False):
+    """Count one Graph response (or $batch sub-response) and whether it was throttled"""
+    kind = "subrequest" if subrequest else "http"
+    count("scheduler_graph_requests_total", kind=kind, status=status)
+    if status in (429, 503):
+        count("scheduler_graph_throttled_total", kind=kind, status=status)
+
+
+def _cached_tokens(usage) -> int:
+    # input_tokens_details only exists on newer SDK versions (and some providers leave it out)
+    details = getattr(usage, "input_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def record_usage(result, stage: str = "parse"):
+    """
+    Record LLM usage from a Runner result
+
+    Returns:
+        dict: requests, input_tokens, cached_input_tokens and output_tokens of this run
+    """
+    summary = {"requests": 0, "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0}
+    # one ModelResponse per model call made during the run
+    for response in result.raw_responses:
+        summary["requests"] += response.usage.requests
+        summary["input_tokens"] += response.usage.input_tokens
+        summary["cached_input_tokens"] += _cached_tokens(response.usage)
+        summary["output_tokens"] += response.usage.output_tokens
+    for field, value in summary.items():
+        count(f"scheduler_llm_{field}_total", value, stage=stage)
+    for tracked in _usage.get():
+        for field, value in summary.items():
+            tracked[field] += value
+    return summary
+
+
+@contextmanager
+def track_usage():
+    """
+    Collect the LLM usage of everything run inside the block, e.g. one scheduled meeting
+    or a whole session; blocks nest, and a run counts towards every enclosing block
+
+    Yields a dict of requests, input_tokens, cached_input_tokens and output_tokens that
+    record_usage adds to.
+    """
+    tracked = {"requests": 0, "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0}
+    token = _usage.set(_usage.get() + (tracked,))
+    try:
+        yield tracked
+    finally:
+        _usage.reset(token)
+
+
+def format_usage(usage: dict) -> str:
+    """One-line summary of a track_usage() dict"""
+    cached = usage.get("cached_input_tokens", 0)
+    share = f" ({cached / usage['input_tokens']:.0%} cached)" if usage["input_tokens"] else ""
+    return (f"{usage['requests']} LLM call(s), {usage['input_tokens']} input tokens{share}, "
+            f"{usage['output_tokens']} output tokens")
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    seen_types = set()
+    for (name, labels), value in sorted(_counters.items()):
+        if name not in seen_types:
+            lines.append(f"# TYPE {name} counter")
+            seen_types.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), hist in sorted(_histograms.items()):
+        if name not in seen_types:
+            lines.append(f"# TYPE {name} histogram")
+            seen_types.add(name)
+        for bound, bucket_count in zip(LATENCY_BUCKETS, hist):
+            lines.append(f"{name}_bucket{_format_labels(labels, le=bound)} {bucket_count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {hist[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist[-2]:g}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_route(query):
+    """CallbackServer route handler for /metrics"""
+    return 200, "text/plain; version=0.0.4", render_prometheus()
+
+
+def enable_json_log(stream=sys.stderr):
+    """Write the structured JSON log lines to `stream`"""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def reset():
+    """Clear all recorded metrics"""
+    _counters.clear()
+    _histograms.clear()
@@ -0,0 +1,188 @@
+import asyncio
+import itertools
+import os
+import time
+import weakref
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from .metrics import count
+
+# cache entries from different directories never mix; see directory_scope
+_scopes = weakref.WeakKeyDictionary()
+_scope_ids = itertools.count()
+
+
+def directory_scope(client):
+    """Cache scope of a Graph client; by default every client (request adapter) is its own scope"""
+    return _scopes.setdefault(client.request_adapter, f"client-{next(_scope_ids)}")
+
+
+def set_directory_scope(client, scope: str):
+    """Share cache entries between clients of the same tenant, e.g. scope=tenant_id"""
+    _scopes[client.request_adapter] = scope
+
+
+class NameResolutionCache:
+    """
+    In-process cache for attendee name -> email lookups
+
+    - identical lookups already in flight are coalesced into one call (single-flight)
+    - found emails are kept for `ttl` seconds, "no match" answers for `negative_ttl`
+    - failed lookups are never cached
+    - at most `max_size` entries, least recently used evicted first
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, negative_ttl: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        # key -> (email or None, expires_at)
+        self._entries = OrderedDict()
+        # key -> future resolving to email or None
+        self._inflight = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(scope, name: str):
+        # givenName matching in Graph is case-insensitive
+        return scope, name.strip().casefold()
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        email, expires_at = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, email
+
+    def _put(self, key, email):
+        ttl = self.ttl if email else self.negative_ttl
+        self._entries[key] = (email, self.clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _count(self, result, n=1):
+        count("scheduler_name_cache_total", n, result=result)
+
+    async def resolve(self, scope, name: str, lookup: Callable[[str], Awaitable[Optional[str]]]):
+        """Resolve one name, calling `lookup(name)` only on a miss; lookup errors propagate"""
+        results = await self.resolve_many(scope, [name], lambda names: self._single(lookup, names[0]))
+        return results.get(name)
+
+    @staticmethod
+    async def _single(lookup, name):
+        return {name: await lookup(name)}
+
+    async def resolve_many(self, scope, names: list[str],
+                           lookup_many: Callable[[list[str]], Awaitable[dict]]) -> dict:
+        """
+        Resolve several names, sending every miss to a single `lookup_many(names)` call
+
+        `lookup_many` returns {name: email or None}; a name it leaves out counts as
+        failed and is not cached. If it raises (e.g. Throttled), so does every call
+        waiting on those names.
+
+        Returns:
+            dict: name -> email or None, for every input name
+        """
+        results, waiting, missing = {}, {}, {}
+        for name in dict.fromkeys(names):
+            key = self._key(scope, name)
+            found, email = self._get(key)
+            if found:
+                results[name] = email
+                if email:
+                    self.hits += 1
+                    self._count("hit")
+                else:
+                    self.negative_hits += 1
+                    self._count("negative_hit")
+            elif key in self._inflight:
+                self.coalesced += 1
+                self._count("coalesced")
+                waiting[name] = self._inflight[key]
+            elif key not in missing.values():
+                self.misses += 1
+                self._count("miss")
+                missing[name] = key
+            else:
+                # same name in a different spelling/case in this very call
+                waiting[name] = key
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {name: loop.create_future() for name in missing}
+            for name, key in missing.items():
+                self._inflight[key] = futures[name]
+            try:
+                found = await lookup_many(list(missing))
+            except asyncio.CancelledError:
+                # this caller gave up (e.g. a cancelled prefetch); waiters look the names up again
+                for future in futures.values():
+                    future.cancel()
+                raise
+            except BaseException as e:
+                for future in futures.values():
+                    future.set_exception(e)
+                    # the exception is re-raised below; stop asyncio warning that nobody retrieved it
+                    future.exception()
+                raise
+            finally:
+                for key in missing.values():
+                    self._inflight.pop(key, None)
+            for name, key in missing.items():
+                if name in found:
+                    self._put(key, found[name])
+                futures[name].set_result(found.get(name))
+                results[name] = found.get(name)
+
+        retry = []
+        for name, pending in waiting.items():
+            if isinstance(pending, tuple):
+                # resolved by this call under another spelling
+                results[name] = next(results[n] for n, k in missing.items() if k == pending)
+            else:
+                try:
+                    results[name] = await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+                    retry.append(name)
+        if retry:
+            results.update(await self.resolve_many(scope, retry, lookup_many))
+        return results
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self._entries.clear()
+
+
+# process-wide cache used by utils.graph
+name_cache = NameResolutionCache(
+    max_size=int(os.getenv("NAME_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("NAME_CACHE_TTL", "3600")),
+    negative_ttl=float(os.getenv("NAME_CACHE_NEGATIVE_TTL", "300")),
+)
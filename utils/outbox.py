@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from typing import Awaitable, Callable, Optional, TYPE_CHECKING
+
+from .graph_json import send_json
+from .metrics import count, span
+from .throttle import backoff_delay
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# events being sent to Graph at once
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+# sends per event before it is marked failed
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+# seconds one POST may take before it counts as a failed attempt
+OUTBOX_SEND_TIMEOUT = float(os.getenv("OUTBOX_SEND_TIMEOUT", "30"))
+
+# statuses worth another attempt; anything else in 4xx means the event itself is wrong
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    transaction_id TEXT UNIQUE NOT NULL,
+    owner TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    event_id TEXT,
+    web_link TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+"""
+
+# who a client acts for; rows are sent later with a client for the same owner
+_owners = weakref.WeakKeyDictionary()
+
+
+def set_outbox_owner(client: GraphServiceClient, owner: str):
+    """Record which user `client` acts for, e.g. the client pool's key"""
+    _owners[client.request_adapter] = owner
+
+
+def outbox_owner(client: GraphServiceClient) -> str:
+    return _owners.get(client.request_adapter, "me")
+
+
+class Outbox:
+    """
+    Write-ahead outbox for event creation
+
+    `enqueue` stores the event JSON in SQLite (WAL) with a transactionId and returns an
+    acknowledgement as soon as the row is committed. Background workers POST queued
+    events with bounded concurrency and retry failures with backoff; Graph treats a
+    repeated transactionId as the same event, so retries (and replays after a crash)
+    never create duplicates. The id belongs to one scheduling request: scheduling the
+    same meeting again later is a new event.
+    """
+
+    def __init__(self, path: str = ":memory:", workers: int = OUTBOX_WORKERS,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS, send_timeout: float = OUTBOX_SEND_TIMEOUT):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.send_timeout = send_timeout
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # used from asyncio.to_thread workers; _lock keeps each read-modify-write in one piece
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+            # a commit survives a crash of the process; only an OS crash may lose the last few
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        # sends cut short by a crash go out again under the same transactionId
+        self.db.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+        self.db.commit()
+        # owner -> live client
+        self._clients = {}
+        self.client_for: Optional[Callable[[str], Awaitable[GraphServiceClient]]] = None
+        self._tasks = []
+        self._wakeup = None
+        # transaction id -> futures of callers waiting for the outcome
+        self._waiters = {}
+
+    # runs fn(*args) against the database in a worker thread, one caller at a time
+    async def _db(self, fn, *args):
+        return await asyncio.to_thread(self._locked, fn, *args)
+
+    def _locked(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    # --- producer side ---
+
+    async def enqueue(self, client: GraphServiceClient, payload: dict, transaction_id: str = None) -> dict:
+        """
+        Queue an event for creation and return its acknowledgement
+
+        Args:
+            client (GraphServiceClient): client of the organizer the event is created for
+            payload (dict): Graph event JSON, e.g. to_json(build_event(...))
+            transaction_id (str, optional): idempotency key of the request, so a client
+                retrying the same request gets the same event; defaults to the payload's
+                transactionId, or a new one
+
+        Returns:
+            dict: {"transaction_id", "status", ...}; status is "queued" for a new event, or
+                the current state ("sent" with its id, "sending") when the same key was
+                queued before. A key whose event failed for good is queued again
+        """
+        owner = outbox_owner(client)
+        self._clients[owner] = client
+        txn = transaction_id or payload.get("transactionId") or str(uuid.uuid4())
+        payload = {**payload, "transactionId": txn}
+        if await self._db(self._insert, txn, owner, json.dumps(payload)):
+            count("scheduler_outbox_total", result="queued")
+            self.start()
+            self._wakeup.set()
+            return {"transaction_id": txn, "status": "queued"}
+        count("scheduler_outbox_total", result="duplicate")
+        return await self.status(txn)
+
+    # True if the row was queued (or a failed one queued again), False if the key is taken
+    def _insert(self, txn: str, owner: str, payload: str) -> bool:
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO outbox (transaction_id, owner, payload, next_attempt, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (txn, owner, payload, now, now, now),
+        )
+        if not cursor.rowcount:
+            # e.g. a 401 that has been fixed since; Graph never created the event, so send it again
+            cursor = self.db.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt = ?, payload = ?, error = NULL, "
+                "updated_at = ? WHERE transaction_id = ? AND owner = ? AND status = 'failed'",
+                (now, payload, now, txn, owner),
+            )
+        self.db.commit()
+        return bool(cursor.rowcount)
+
+    async def status(self, txn: str, owner: str = None) -> Optional[dict]:
+        """State of a queued event: queued/sending/sent/failed, with the event id once sent; None if
+        unknown or, with `owner`, queued by someone else"""
+        row = await self._db(self._row, txn)
+        if row is None or (owner is not None and row["owner"] != owner):
+            return None
+        return self._describe(row)
+
+    def _row(self, txn: str):
+        return self.db.execute("SELECT * FROM outbox WHERE transaction_id = ?", (txn,)).fetchone()
+
+    @staticmethod
+    def _describe(row) -> dict:
+        result = {"transaction_id": row["transaction_id"],
+                  "status": "queued" if row["status"] == "pending" else row["status"],
+                  "attempts": row["attempts"]}
+        if row["event_id"]:
+            result.update(id=row["event_id"], web_link=row["web_link"])
+        if row["error"]:
+            result["error"] = row["error"]
+        return result
+
+    async def wait(self, txn: str, timeout: Optional[float] = None) -> dict:
+        """Wait until a queued event was sent (or failed for good) and return its status"""
+        current = await self.status(txn)
+        if current is None or current["status"] in ("sent", "failed"):
+            return current
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(txn, []).append(future)
+        return await asyncio.wait_for(future, timeout)
+
+    async def pending(self) -> int:
+        return await self._db(self._count)
+
+    # queued or in-flight rows, of `owners` only if given
+    def _count(self, owners: list[str] = None) -> int:
+        query = "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+        if owners is not None:
+            query += f" AND owner IN ({', '.join('?' * len(owners))})"
+        return self.db.execute(query, owners or []).fetchone()[0]
+
+    # --- workers ---
+
+    def start(self, client_for: Callable[[str], Awaitable[GraphServiceClient]] = None):
+        """
+        Start the workers on the running loop (enqueue does this on first use)
+
+        Args:
+            client_for (Callable, optional): async owner -> client, used for rows queued by
+                an earlier process whose owner has no live client yet
+        """
+        if client_for is not None:
+            self.client_for = client_for
+        self._tasks = [task for task in self._tasks if not task.done()]
+        if not self._tasks:
+            self._wakeup = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        return self
+
+    async def _client(self, owner: str):
+        client = self._clients.get(owner)
+        if client is None and self.client_for is not None:
+            client = self._clients[owner] = await self.client_for(owner)
+        return client
+
+    # takes the next due row and marks it as being sent; None and the wait until one is due otherwise
+    def _claim(self, owners: Optional[list[str]]):
+        now = time.time()
+        query = "SELECT * FROM outbox WHERE status = 'pending'"
+        params = []
+        if owners is not None:
+            # without client_for only owners that queued something in this process can be served
+            query += f" AND owner IN ({', '.join('?' * len(owners))})"
+            params = owners
+        row = self.db.execute(query + " ORDER BY next_attempt, id LIMIT 1", params).fetchone()
+        if row is None:
+            return None, None
+        if row["next_attempt"] > now:
+            return None, row["next_attempt"] - now
+        self.db.execute("UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?", (now, row["id"]))
+        self.db.commit()
+        return row, None
+
+    async def _work(self):
+        while True:
+            owners = list(self._clients) if self.client_for is None else None
+            row, wait = await self._db(self._claim, owners)
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._send(row)
+            except asyncio.CancelledError:
+                # sent again under the same transactionId by the next worker or process
+                self._locked(self._release, row["id"], time.time(), None)
+                raise
+            except Exception as e:
+                # e.g. a failed database write after the send; back the row off instead of
+                # leaving it in 'sending', where no worker would pick it up again
+                print(f"outbox worker error: {e}")
+                delay = backoff_delay(None, row["attempts"] + 1)
+                try:
+                    await self._db(self._release, row["id"], time.time() + delay, str(e))
+                except Exception as e:
+                    print(f"outbox: could not release {row['transaction_id']}: {e}")
+
+    # puts a row this worker claimed back in the queue
+    def _release(self, row_id: int, next_attempt: float, error: Optional[str]):
+        self.db.execute(
+            "UPDATE outbox SET status = 'pending', next_attempt = ?, error = COALESCE(?, error), updated_at = ? "
+            "WHERE id = ? AND status = 'sending'",
+            (next_attempt, error, time.time(), row_id),
+        )
+        self.db.commit()
+
+    async def _send(self, row):
+        attempt = row["attempts"] + 1
+        try:
+            # a failed token acquisition counts as a failed attempt like any other error
+            client = await self._client(row["owner"])
+            if client is None:
+                raise RuntimeError(f"no Graph client for {row['owner']}")
+            with span("outbox_send", attempt=attempt):
+                created = await asyncio.wait_for(
+                    send_json(client, "POST", "/me/events", json.loads(row["payload"])), self.send_timeout
+                )
+        except Exception as e:
+            status = getattr(e, "response_status_code", None)
+            retry = status is None or status in RETRYABLE_STATUSES
+            if retry and attempt < self.max_attempts:
+                delay = backoff_delay(None, attempt)
+                await self._update(row, "pending", attempt, next_attempt=time.time() + delay, error=str(e))
+                count("scheduler_outbox_total", result="retry")
+            else:
+                print(f"outbox: giving up on {row['transaction_id']} after {attempt} attempt(s): {e}")
+                await self._update(row, "failed", attempt, error=str(e))
+                count("scheduler_outbox_total", result="failed")
+            return
+
+        created = created or {}
+        await self._update(row, "sent", attempt, event_id=created.get("id"), web_link=created.get("webLink"))
+        count("scheduler_outbox_total", result="sent")
+        from .calendar_mirror import record_event
+        await record_event({**json.loads(row["payload"]), **created, "showAs": "busy"}, owner=row["owner"])
+
+    async def _update(self, row, status: str, attempts: int, next_attempt: float = None, **fields):
+        await self._db(self._write, row["id"], status, attempts, next_attempt, fields)
+        if status != "pending":
+            result = await self.status(row["transaction_id"])
+            for future in self._waiters.pop(row["transaction_id"], []):
+                if not future.done():
+                    future.set_result(result)
+
+    def _write(self, row_id: int, status: str, attempts: int, next_attempt: Optional[float], fields: dict):
+        self.db.execute(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt = COALESCE(?, next_attempt), "
+            "event_id = COALESCE(?, event_id), web_link = COALESCE(?, web_link), error = ?, updated_at = ? "
+            "WHERE id = ?",
+            (status, attempts, next_attempt, fields.get("event_id"), fields.get("web_link"),
+             fields.get("error"), time.time(), row_id),
+        )
+        self.db.commit()
+
+    async def _servable(self) -> int:
+        if self.client_for is not None:
+            return await self.pending()
+        if not self._clients:
+            return 0
+        return await self._db(self._count, list(self._clients))
+
+    async def drain(self, timeout: float = 30) -> bool:
+        """Wait (up to `timeout`) until every queued event this process can send has been sent"""
+        deadline = time.monotonic() + timeout
+        while self._tasks and await self._servable():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def close(self, timeout: float = 30):
+        """Drain, stop the workers and close the database"""
+        if self._tasks:
+            if not await self.drain(timeout):
+                print(f"outbox: {await self.pending()} event(s) left for the next start")
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+        self.db.close()
+
+
+_outbox = None
+
+
+# the process-wide outbox; setting OUTBOX_PATH makes schedule_meeting queue events in it
+def get_outbox() -> Outbox:
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(os.getenv("OUTBOX_PATH") or ":memory:")
+    return _outbox
+
+
+async def close_outbox(timeout: float = 30):
+    global _outbox
+    if _outbox is not None:
+        await _outbox.close(timeout)
+        _outbox = None
@@ -0,0 +1,112 @@
+import json
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+
+from .metrics import count
+
+# politeness and filler that never changes the meaning of a request
+_NOISE = re.compile(r"\b(?:please|pls|hey|hi|hello|thanks|thank you|kindly)\b")
+_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def normalize(text: str) -> str:
+    """Canonical form of a request: case, unicode, quotes, whitespace and trailing punctuation ignored"""
+    text = unicodedata.normalize("NFKC", text).translate(_QUOTES).casefold()
+    text = _NOISE.sub(" ", text)
+    text = re.sub(r"\s*,\s*", ", ", text)
+    return " ".join(text.split()).strip(" .!,")
+
+
+class ParseCache:
+    """
+    LRU memo of intent-parse results
+
+    Entries are keyed on the normalized request plus the reference date from
+    CurrentTime, so "tomorrow" is never answered with yesterday's parse. Values are the
+    JSON of the parsed output. With `path` set, every new entry is appended to a JSONL
+    file, which is read back (dropping entries for past dates) on start-up.
+    """
+
+    def __init__(self, max_size: int = 4096, path: Optional[str] = None):
+        self.max_size = max_size
+        self.path = path
+        # (normalized text, reference date) -> output JSON
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def get(self, text: str, reference_date: str) -> Optional[dict]:
+        key = (normalize(text), reference_date)
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            count("scheduler_parse_cache_total", result="miss")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        count("scheduler_parse_cache_total", result="hit")
+        return value
+
+    def put(self, text: str, reference_date: str, value: dict):
+        key = (normalize(text), reference_date)
+        self._insert(key, value)
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"text": key[0], "date": key[1], "value": value}) + "\n")
+
+    def _insert(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load(self):
+        today = date.today().isoformat()
+        kept = dropped = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn last line from a crash
+                    dropped += 1
+                    continue
+                if entry["date"] < today:
+                    dropped += 1
+                    continue
+                self._insert((entry["text"], entry["date"]), entry["value"])
+                kept += 1
+        if dropped or kept > len(self._entries):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for (text, reference_date), value in self._entries.items():
+                f.write(json.dumps({"text": text, "date": reference_date, "value": value}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self._entries.clear()
+
+
+# process-wide cache used by utils.intent; PARSE_CACHE_SIZE=0 disables it
+parse_cache = ParseCache(
+    max_size=int(os.getenv("PARSE_CACHE_SIZE", "4096")),
+    path=os.getenv("PARSE_CACHE_PATH"),
+)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import uuid
+from typing import Callable, TYPE_CHECKING
+
+from agents import Agent
+
+from .graph import book_meeting, resolve_emails_by_names_batched
+from .intent import parse_intent
+from .metrics import track_usage
+from .validation import InvalidMeeting, validate_meeting
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# sentinel that tells a stage's workers there is no more input
+_DONE = object()
+
+
+def completed_lines(output_path: str) -> set[int]:
+    """
+    Line numbers that already have a final result in `output_path`, used to resume after a crash
+
+    Lines that succeeded or failed for good (bad input, an InvalidMeeting) count as done;
+    transient failures such as throttling or timeouts run again.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for raw in f:
+            try:
+                result = json.loads(raw)
+                if result["ok"] or result.get("permanent"):
+                    done.add(result["line"])
+            except (ValueError, KeyError, TypeError):
+                # a line cut short by the crash; that request simply runs again
+                continue
+    return done
+
+
+def line_transaction_id(input_path: str, line_no: int, text: str) -> str:
+    """transactionId of one input line; the same on every run, so a resumed line never books twice"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{os.path.abspath(input_path)}\n{line_no}\n{text}"))
+
+
+def _read_requests(input_path: str, skip: set[int]):
+    with open(input_path, encoding="utf-8") as f:
+        for line_no, raw in enumerate(f, start=1):
+            if line_no in skip or not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError as e:
+                yield line_no, None, f"invalid JSON: {e}"
+                continue
+            text = record.get("text") if isinstance(record, dict) else record
+            if not isinstance(text, str) or not text.strip():
+                yield line_no, None, "missing 'text'"
+                continue
+            yield line_no, text, None
+
+
+async def _stage(workers: int, inbox: asyncio.Queue, outbox: asyncio.Queue, results: asyncio.Queue, fn,
+                 downstream_workers: int = 1):
+    # runs `fn` over every item with `workers` concurrent tasks; failures go straight to `results`
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            try:
+                await outbox.put(await fn(item))
+            except Exception as e:
+                await results.put({"line": item["line"], "ok": False, "error": f"{type(e).__name__}: {e}",
+                                   "permanent": isinstance(e, InvalidMeeting)})
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    for _ in range(downstream_workers):
+        await outbox.put(_DONE)
+
+
+# streams JSONL scheduling requests through parse -> resolve -> create and writes results as they finish
+async def run_batch(client: GraphServiceClient, agent: Agent, make_context: Callable, input_path: str,
+                    output_path: str = None, parse_workers: int = 8, resolve_workers: int = 4,
+                    create_workers: int = 4, queue_size: int = 64):
+    """
+    Process a JSONL file of natural-language scheduling requests
+
+    Each input line is either a JSON string or an object with a "text" field. Every stage
+    (intent parsing, name resolution, event creation) has its own worker count, and the
+    queues between stages are bounded so memory stays flat however large the file is.
+    Events are booked like schedule_meeting books them (calendar-mirror conflict check,
+    outbox when OUTBOX_PATH is set), with a transactionId derived from the input line, so a
+    line sent again after a timeout or on resume creates one event. A line that overlaps
+    existing events is reported as failed, with its "conflicts", and not booked.
+    Each result is appended to `output_path` as soon as it is ready, so results are not in
+    input order; re-running with the same output file skips the lines that succeeded or
+    failed for good, and retries the ones that failed for a transient reason.
+
+    Args:
+        client (GraphServiceClient): authenticated client
+        agent (Agent): intent parser agent with an IntentParserOutput output_type
+        make_context (Callable): returns a fresh run context for the agent
+        input_path (str): JSONL file of requests
+        output_path (str, optional): JSONL results file, defaults to `<input>.results.jsonl`
+        parse_workers (int): concurrent Runner.run calls
+        resolve_workers (int): concurrent attendee resolutions
+        create_workers (int): concurrent event creations
+        queue_size (int): capacity of each inter-stage queue
+
+    Returns:
+        dict: counts of "ok", "failed" and "skipped" lines
+    """
+    output_path = output_path or f"{os.path.splitext(input_path)[0]}.results.jsonl"
+    skip = completed_lines(output_path)
+
+    parse_q = asyncio.Queue(queue_size)
+    resolve_q = asyncio.Queue(queue_size)
+    create_q = asyncio.Queue(queue_size)
+    results = asyncio.Queue(queue_size)
+
+    async def parse(item):
+        context = make_context()
+        with track_usage() as usage:
+            details = await parse_intent(agent, item["text"], context)
+        # bad times or zones fail here, before any directory lookup
+        details, _ = validate_meeting(details, getattr(context, "current_time", None))
+        return {**item, "details": details, "usage": usage}
+
+    async def resolve(item):
+        emails = await resolve_emails_by_names_batched(client, item["details"].attendees or [])
+        return {**item, "emails": emails}
+
+    async def create(item):
+        txn = line_transaction_id(input_path, item["line"], item["text"])
+        event = await book_meeting(client, item["details"], item["emails"], transaction_id=txn)
+        if event.get("status") == "conflict":
+            return {"line": item["line"], "ok": False, "error": "overlaps existing events",
+                    "conflicts": event["conflicts"], "permanent": True}
+        return {"line": item["line"], "ok": True, "event": event, "attendees": item["emails"],
+                "usage": item["usage"]}
+
+    async def read():
+        for line_no, text, error in _read_requests(input_path, skip):
+            if error:
+                await results.put({"line": line_no, "ok": False, "error": error, "permanent": True})
+            else:
+                await parse_q.put({"line": line_no, "text": text})
+        for _ in range(parse_workers):
+            await parse_q.put(_DONE)
+
+    counts = {"ok": 0, "failed": 0, "skipped": len(skip)}
+
+    async def write():
+        with open(output_path, "a", encoding="utf-8") as f:
+            while (result := await results.get()) is not _DONE:
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+                counts["ok" if result["ok"] else "failed"] += 1
+
+    await asyncio.gather(
+        read(),
+        _stage(parse_workers, parse_q, resolve_q, results, parse, resolve_workers),
+        _stage(resolve_workers, resolve_q, create_q, results, resolve, create_workers),
+        _stage(create_workers, create_q, results, results, create),
+        write(),
+    )
+    return counts
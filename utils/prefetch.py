@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from agents import Agent
+
+from .graph import resolve_name_map_batched, schedule_meeting
+from .intent import parse_intent_streamed
+from .metrics import count
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+# how long to collect streamed names before resolving them together
+PREFETCH_WINDOW = float(os.getenv("PREFETCH_WINDOW", "0.02"))
+
+
+# parses a request with the streamed runner while resolving attendees as soon as they are generated
+async def parse_with_prefetch(client: GraphServiceClient, agent: Agent, user_input: str, context,
+                              fast_path: bool = True):
+    """
+    Streamed intent parse that overlaps directory lookups with generation
+
+    Each batch of attendee names that appears in the partial output is resolved right
+    away through the shared name cache, so the resolution schedule_meeting does next is
+    answered from the cache. Lookups for names missing from the final output are
+    cancelled. With the calendar mirror enabled it is synced during generation too.
+
+    Returns:
+        IntentParserOutput: the parsed meeting details, identical to parse_intent's
+    """
+    from .calendar_mirror import CALENDAR_MIRROR_PATH, get_calendar_mirror
+
+    tasks = {}
+    pending = []
+    loop = asyncio.get_running_loop()
+
+    def flush():
+        if pending:
+            task = asyncio.create_task(resolve_name_map_batched(client, list(pending)))
+            for name in pending:
+                tasks[name] = task
+            pending.clear()
+
+    def prefetch(names):
+        fresh = [name for name in dict.fromkeys(names) if name not in tasks and name not in pending]
+        if fresh and not pending:
+            # names usually stream in a few milliseconds apart; send them as one $batch
+            loop.call_later(PREFETCH_WINDOW, flush)
+        pending.extend(fresh)
+
+    background = set()
+    if CALENDAR_MIRROR_PATH:
+        now = datetime.now(timezone.utc)
+        background.add(asyncio.create_task(get_calendar_mirror(client).ensure_synced(client, now, now)))
+
+    try:
+        details = await parse_intent_streamed(agent, user_input, context, prefetch, fast_path)
+    except BaseException:
+        for task in set(tasks.values()) | background:
+            task.cancel()
+        raise
+
+    flush()
+    wanted = set(details.attendees or [])
+    cancelled = 0
+    for task in set(tasks.values()):
+        names = [name for name, t in tasks.items() if t is task]
+        if not wanted.intersection(names):
+            task.cancel()
+            cancelled += len(names)
+    # failures are not cached, so schedule_meeting simply looks those names up again
+    await asyncio.gather(*set(tasks.values()), *background, return_exceptions=True)
+    count("scheduler_prefetch_names_total", len(tasks), result="started")
+    count("scheduler_prefetch_names_total", cancelled, result="cancelled")
+    return details
+
+
+# streamed parse with attendee prefetch, then schedule_meeting
+async def schedule_streamed(client: GraphServiceClient, agent: Agent, user_input: str, context):
+    details = await parse_with_prefetch(client, agent, user_input, context)
+    return await schedule_meeting(client, details)
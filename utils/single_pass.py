@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from agents import Agent
+
+from .graph import schedule_meeting
+from .intent import parse_intent
+from .metrics import count, log_event, track_usage
+from .prefetch import parse_with_prefetch
+
+if TYPE_CHECKING:
+    from msgraph import GraphServiceClient
+
+
+# schedules a natural-language request with at most one model call and no tool-calling turns
+async def schedule_request(client: GraphServiceClient, agent: Agent, user_input: str, context,
+                           stream: bool = False, fast_path: bool = True, transaction_id: str = None):
+    """
+    Single-pass scheduling: one structured-output call, then plain Python
+
+    The intent parser produces the IntentParserOutput (or the parse cache / fast path
+    does, with no model call at all); attendee resolution, validation and event creation
+    then run directly instead of through an agent's tool calls.
+
+    Args:
+        client (GraphServiceClient): authenticated client
+        agent (Agent): intent parser agent
+        user_input (str): the user's request
+        context: run context for the agent (CurrentTime)
+        stream (bool): stream the parse and resolve attendees while it is generated
+        fast_path (bool): try the cache and rule-based parser before the model
+        transaction_id (str, optional): idempotency key for the event (see schedule_meeting)
+
+    Returns:
+        dict: {"details", "event", "usage"}; usage holds the model requests, input_tokens,
+            cached_input_tokens and output_tokens spent on this meeting
+    """
+    with track_usage() as usage:
+        if stream:
+            details = await parse_with_prefetch(client, agent, user_input, context, fast_path=fast_path)
+        else:
+            details = await parse_intent(agent, user_input, context, fast_path=fast_path)
+    event = await schedule_meeting(client, details, transaction_id=transaction_id)
+
+    count("scheduler_meetings_total", mode="single_pass")
+    log_event("meeting", mode="single_pass", llm_calls=usage["requests"], input_tokens=usage["input_tokens"],
+              cached_input_tokens=usage["cached_input_tokens"], output_tokens=usage["output_tokens"])
+    return {"details": details, "event": event, "usage": dict(usage)}
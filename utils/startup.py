@@ -0,0 +1,62 @@
+import re
+import subprocess
+import sys
+import time
+
+# "import time:       412 |       1289 |   agents.models" (self us, cumulative us, indented name)
+_IMPORTTIME_LINE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str):
+    """
+    Parse CPython's `-X importtime` output
+
+    Returns:
+        tuple: (records, other_lines) where records are (module, self_us, cumulative_us, depth)
+            and other_lines is the rest of stderr, passed through untouched
+    """
+    records, other_lines = [], []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+        elif not line.startswith("import time: self [us]"):
+            other_lines.append(line)
+    return records, other_lines
+
+
+def format_report(records, wall_seconds: float, top: int = 25) -> str:
+    total_us = sum(cumulative for _, _, cumulative, depth in records if depth == 0)
+    lines = [
+        f"Startup profile: {wall_seconds * 1000:.0f} ms wall, {total_us / 1000:.0f} ms importing "
+        f"{len(records)} modules",
+        "",
+        "Top-level imports (cumulative):",
+    ]
+    top_level = sorted((r for r in records if r[3] == 0), key=lambda r: r[2], reverse=True)
+    for module, _, cumulative, _ in top_level[:top]:
+        lines.append(f"  {cumulative / 1000:9.1f} ms  {module}")
+    lines += ["", "Slowest modules (self):"]
+    for module, self_us, _, _ in sorted(records, key=lambda r: r[1], reverse=True)[:top]:
+        lines.append(f"  {self_us / 1000:9.1f} ms  {module}")
+    return "\n".join(lines)
+
+
+# re-runs the command under `python -X importtime` and prints per-module import times
+def run_with_import_profile(argv: list[str], top: int = 25) -> int:
+    """
+    Run `argv` (a script and its arguments) in a child interpreter with import timing on
+
+    The child's stdout is passed through as-is; its import timings are summarised on stderr
+    once it exits. Returns the child's exit code.
+    """
+    start = time.perf_counter()
+    child = subprocess.run([sys.executable, "-X", "importtime", *argv], stderr=subprocess.PIPE, text=True)
+    wall_seconds = time.perf_counter() - start
+
+    records, other_lines = parse_importtime(child.stderr)
+    if other_lines:
+        print("\n".join(other_lines), file=sys.stderr)
+    print(format_report(records, wall_seconds, top), file=sys.stderr)
+    return child.returncode
@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+from .metrics import count
+from .name_cache import directory_scope
+
+# sustained Graph requests per second per tenant (directory scope), and the burst allowed on top;
+# keep it near the tenant's throttling ceiling and let the adaptive concurrency limit do the rest
+GRAPH_RATE = float(os.getenv("GRAPH_RATE", "100"))
+GRAPH_BURST = float(os.getenv("GRAPH_BURST", "200"))
+# concurrent requests per tenant: the starting point and the ceiling the adaptive limit may grow to
+GRAPH_CONCURRENCY = float(os.getenv("GRAPH_CONCURRENCY", "4"))
+GRAPH_MAX_CONCURRENCY = int(os.getenv("GRAPH_MAX_CONCURRENCY", "32"))
+# concurrent requests across all tenants
+GRAPH_TOTAL_CONCURRENCY = int(os.getenv("GRAPH_TOTAL_CONCURRENCY", "64"))
+# attempts after the first for a throttled request
+GRAPH_MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "4"))
+
+# statuses Graph uses for throttling
+THROTTLE_STATUSES = {429, 503, 504}
+# the throttling statuses that mean the request was refused; after a 503 or 504 a write may
+# still have been carried out, so those are only retried for idempotent requests
+REFUSED_STATUSES = {429}
+# extra wait on top of Retry-After, as a fraction of it, so throttled callers don't all return at once
+RETRY_JITTER = 0.2
+
+
+class Throttled(Exception):
+    """Graph kept throttling a request after every retry"""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"throttled by Graph (status {status})")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _header(headers, name: str):
+    if not headers:
+        return None
+    if hasattr(headers, "get") and (value := headers.get(name)) is not None:
+        return value
+    return {k.lower(): v for k, v in dict(headers).items()}.get(name)
+
+
+def throttle_info(error: BaseException):
+    """(status, Retry-After seconds or None) when `error` is a Graph throttling response, otherwise None"""
+    status = getattr(error, "response_status_code", None)
+    if status not in THROTTLE_STATUSES:
+        return None
+    try:
+        retry_after = float(_header(getattr(error, "response_headers", None), "retry-after"))
+    except (TypeError, ValueError):
+        retry_after = None
+    return status, retry_after
+
+
+def backoff_delay(retry_after: Optional[float], attempt: int) -> float:
+    """Seconds to wait before retrying: Retry-After plus jitter, or jittered exponential backoff"""
+    if retry_after is not None:
+        return retry_after * (1 + random.random() * RETRY_JITTER)
+    return min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+
+
+class _Lane:
+    """Per-tenant state: token bucket, adaptive concurrency limit and the requests waiting for it"""
+
+    def __init__(self, burst: float, limit: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.limit = limit
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.last_used = now
+        # (future, cost) in arrival order
+        self.waiters = deque()
+
+
+class GraphScheduler:
+    """
+    Shared admission for Graph calls
+
+    - every tenant (directory scope) has a token bucket of `rate` requests per second
+    - its concurrency limit adapts AIMD-style: +1/limit per success, halved on
+      throttling (at most once per round trip), between 1 and `max_concurrency`
+    - a throttled request pauses its tenant for Retry-After (with jitter) and is retried
+      up to `max_retries` times, then Throttled is raised; a non-idempotent request is
+      only retried after a 429, since a 503/504 may come after it was carried out
+    - tenants take turns for the `total_concurrency` slots, so a busy tenant can't
+      starve the others
+    """
+
+    def __init__(self, rate: float = GRAPH_RATE, burst: float = GRAPH_BURST,
+                 concurrency: float = GRAPH_CONCURRENCY, max_concurrency: int = GRAPH_MAX_CONCURRENCY,
+                 total_concurrency: int = GRAPH_TOTAL_CONCURRENCY, max_retries: int = GRAPH_MAX_RETRIES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.total_concurrency = total_concurrency
+        self.max_retries = max_retries
+        self.clock = clock
+        self._lanes = {}
+        # scopes with waiting requests, in the order they get their next turn
+        self._ring = OrderedDict()
+        self._timer = None
+        self.in_flight = 0
+        self.throttled_count = 0
+        self.retries = 0
+
+    def _lane(self, scope: str) -> _Lane:
+        lane = self._lanes.get(scope)
+        if lane is None:
+            now = self.clock()
+            if len(self._lanes) >= 1024:
+                # forget tenants that have been quiet for a while
+                for key in [key for key, old in self._lanes.items()
+                            if not old.in_flight and not old.waiters and now - old.last_used > 300]:
+                    del self._lanes[key]
+            lane = self._lanes[scope] = _Lane(self.burst, self.concurrency, now)
+        return lane
+
+    # when `lane` can start a request of `cost` tokens (refilling its bucket up to now)
+    def _ready_at(self, lane: _Lane, cost: float, now: float) -> float:
+        lane.tokens = min(self.burst, lane.tokens + (now - lane.updated) * self.rate)
+        lane.updated = now
+        need = min(cost, self.burst)
+        token_at = now if lane.tokens >= need else now + (need - lane.tokens) / self.rate
+        return max(token_at, lane.paused_until)
+
+    def _dispatch(self):
+        self._timer = None
+        now = self.clock()
+        wake = None
+        granted = True
+        while granted and self.in_flight < self.total_concurrency:
+            granted = False
+            for scope in list(self._ring):
+                lane = self._lanes[scope]
+                while lane.waiters and lane.waiters[0][0].done():
+                    lane.waiters.popleft()
+                if not lane.waiters:
+                    del self._ring[scope]
+                    continue
+                if self.in_flight >= self.total_concurrency:
+                    break
+                if lane.in_flight >= max(1, int(lane.limit)):
+                    # a finishing request dispatches again
+                    continue
+                future, cost = lane.waiters[0]
+                ready_at = self._ready_at(lane, cost, now)
+                if ready_at > now:
+                    wake = ready_at if wake is None else min(wake, ready_at)
+                    continue
+                lane.waiters.popleft()
+                lane.tokens -= cost
+                lane.in_flight += 1
+                lane.last_used = now
+                self.in_flight += 1
+                future.set_result(None)
+                # one request per tenant per turn
+                self._ring.move_to_end(scope)
+                granted = True
+
+        if wake is not None:
+            self._timer = asyncio.get_running_loop().call_later(wake - now, self._dispatch)
+
+    async def _acquire(self, scope: str, lane: _Lane, cost: float):
+        future = asyncio.get_running_loop().create_future()
+        lane.waiters.append((future, cost))
+        self._ring.setdefault(scope, None)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted just as the caller was cancelled
+                self._release(lane)
+            else:
+                future.cancel()
+            raise
+
+    def _release(self, lane: _Lane):
+        lane.in_flight -= 1
+        self.in_flight -= 1
+        if self._ring:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._dispatch()
+
+    def _succeeded(self, lane: _Lane):
+        lane.limit = min(self.max_concurrency, lane.limit + 1 / lane.limit)
+
+    def _throttled(self, lane: _Lane, started: float, delay: float):
+        now = self.clock()
+        self.throttled_count += 1
+        # requests already in flight were sent under the old limit; react once per round trip
+        if started >= lane.last_decrease:
+            lane.limit = max(1.0, lane.limit / 2)
+            lane.last_decrease = now
+        lane.paused_until = max(lane.paused_until, now + delay)
+
+    def throttled(self, scope: str, retry_after: Optional[float] = None, attempt: int = 0):
+        """Report throttling seen outside call() (e.g. a $batch sub-response) for `scope`"""
+        self._throttled(self._lane(scope), self.clock(), backoff_delay(retry_after, attempt))
+        count("scheduler_graph_throttled_total", source="batch")
+
+    async def call(self, scope: str, fn: Callable[[], Awaitable], cost: float = 1, idempotent: bool = True):
+        """
+        Run a Graph call under the scope's rate and concurrency limits, retrying throttling
+
+        Args:
+            scope (str): tenant / directory scope the call counts against
+            fn (Callable): makes the request; called again for each retry
+            cost (float): tokens the call takes, e.g. the number of sub-requests in a $batch
+            idempotent (bool): whether sending the request twice is harmless (reads, PATCH,
+                a POST with a transactionId); otherwise only 429 is retried
+
+        Returns:
+            whatever fn returns
+        """
+        lane = self._lane(scope)
+        for attempt in itertools.count():
+            await self._acquire(scope, lane, cost)
+            started = self.clock()
+            try:
+                result = await fn()
+            except Exception as e:
+                throttle = throttle_info(e)
+                if throttle is None:
+                    raise
+                status, retry_after = throttle
+                self._throttled(lane, started, backoff_delay(retry_after, attempt))
+                count("scheduler_graph_throttled_total", source="call", status=status)
+                if not idempotent and status not in REFUSED_STATUSES:
+                    # the outcome is unknown; the caller decides whether to send it again
+                    raise
+                if attempt >= self.max_retries:
+                    raise Throttled(status, retry_after) from e
+                self.retries += 1
+                continue
+            else:
+                self._succeeded(lane)
+                return result
+            finally:
+                self._release(lane)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": sum(not future.done() for lane in self._lanes.values() for future, _ in lane.waiters),
+            "throttled": self.throttled_count,
+            "retries": self.retries,
+            "limits": {scope: round(lane.limit, 2) for scope, lane in self._lanes.items()},
+        }
+
+
+# process-wide scheduler shared by every Graph call
+graph_scheduler = GraphScheduler()
+
+
+async def graph_call(client, fn: Callable[[], Awaitable], cost: float = 1, idempotent: bool = True):
+    """Run `fn` through the shared scheduler, counted against the client's tenant"""
+    return await graph_scheduler.call(directory_scope(client), fn, cost, idempotent)
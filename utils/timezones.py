@@ -0,0 +1,262 @@
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Windows time zone names used by Microsoft Graph -> IANA zone (CLDR windowsZones, territory 001)
+WINDOWS_TO_IANA = {
+    "Dateline Standard Time": "Etc/GMT+12",
+    "UTC-11": "Etc/GMT+11",
+    "Aleutian Standard Time": "America/Adak",
+    "Hawaiian Standard Time": "Pacific/Honolulu",
+    "Marquesas Standard Time": "Pacific/Marquesas",
+    "Alaskan Standard Time": "America/Anchorage",
+    "UTC-09": "Etc/GMT+9",
+    "Pacific Standard Time (Mexico)": "America/Tijuana",
+    "UTC-08": "Etc/GMT+8",
+    "Pacific Standard Time": "America/Los_Angeles",
+    "US Mountain Standard Time": "America/Phoenix",
+    "Mountain Standard Time (Mexico)": "America/Mazatlan",
+    "Mountain Standard Time": "America/Denver",
+    "Yukon Standard Time": "America/Whitehorse",
+    "Central America Standard Time": "America/Guatemala",
+    "Central Standard Time": "America/Chicago",
+    "Easter Island Standard Time": "Pacific/Easter",
+    "Central Standard Time (Mexico)": "America/Mexico_City",
+    "Canada Central Standard Time": "America/Regina",
+    "SA Pacific Standard Time": "America/Bogota",
+    "Eastern Standard Time (Mexico)": "America/Cancun",
+    "Eastern Standard Time": "America/New_York",
+    "Haiti Standard Time": "America/Port-au-Prince",
+    "Cuba Standard Time": "America/Havana",
+    "US Eastern Standard Time": "America/Indiana/Indianapolis",
+    "Turks And Caicos Standard Time": "America/Grand_Turk",
+    "Paraguay Standard Time": "America/Asuncion",
+    "Atlantic Standard Time": "America/Halifax",
+    "Venezuela Standard Time": "America/Caracas",
+    "Central Brazilian Standard Time": "America/Cuiaba",
+    "SA Western Standard Time": "America/La_Paz",
+    "Pacific SA Standard Time": "America/Santiago",
+    "Newfoundland Standard Time": "America/St_Johns",
+    "Tocantins Standard Time": "America/Araguaina",
+    "E. South America Standard Time": "America/Sao_Paulo",
+    "SA Eastern Standard Time": "America/Cayenne",
+    "Argentina Standard Time": "America/Argentina/Buenos_Aires",
+    "Greenland Standard Time": "America/Nuuk",
+    "Montevideo Standard Time": "America/Montevideo",
+    "Magallanes Standard Time": "America/Punta_Arenas",
+    "Saint Pierre Standard Time": "America/Miquelon",
+    "Bahia Standard Time": "America/Bahia",
+    "UTC-02": "Etc/GMT+2",
+    "Azores Standard Time": "Atlantic/Azores",
+    "Cape Verde Standard Time": "Atlantic/Cape_Verde",
+    "UTC": "UTC",
+    "GMT Standard Time": "Europe/London",
+    "Greenwich Standard Time": "Atlantic/Reykjavik",
+    "Sao Tome Standard Time": "Africa/Sao_Tome",
+    "Morocco Standard Time": "Africa/Casablanca",
+    "W. Europe Standard Time": "Europe/Berlin",
+    "Central Europe Standard Time": "Europe/Budapest",
+    "Romance Standard Time": "Europe/Paris",
+    "Central European Standard Time": "Europe/Warsaw",
+    "W. Central Africa Standard Time": "Africa/Lagos",
+    "Jordan Standard Time": "Asia/Amman",
+    "GTB Standard Time": "Europe/Bucharest",
+    "Middle East Standard Time": "Asia/Beirut",
+    "Egypt Standard Time": "Africa/Cairo",
+    "E. Europe Standard Time": "Europe/Chisinau",
+    "Syria Standard Time": "Asia/Damascus",
+    "West Bank Standard Time": "Asia/Hebron",
+    "South Africa Standard Time": "Africa/Johannesburg",
+    "FLE Standard Time": "Europe/Kiev",
+    "Israel Standard Time": "Asia/Jerusalem",
+    "South Sudan Standard Time": "Africa/Juba",
+    "Kaliningrad Standard Time": "Europe/Kaliningrad",
+    "Sudan Standard Time": "Africa/Khartoum",
+    "Libya Standard Time": "Africa/Tripoli",
+    "Namibia Standard Time": "Africa/Windhoek",
+    "Arabic Standard Time": "Asia/Baghdad",
+    "Turkey Standard Time": "Europe/Istanbul",
+    "Arab Standard Time": "Asia/Riyadh",
+    "Belarus Standard Time": "Europe/Minsk",
+    "Russian Standard Time": "Europe/Moscow",
+    "E. Africa Standard Time": "Africa/Nairobi",
+    "Volgograd Standard Time": "Europe/Volgograd",
+    "Iran Standard Time": "Asia/Tehran",
+    "Arabian Standard Time": "Asia/Dubai",
+    "Astrakhan Standard Time": "Europe/Astrakhan",
+    "Azerbaijan Standard Time": "Asia/Baku",
+    "Russia Time Zone 3": "Europe/Samara",
+    "Mauritius Standard Time": "Indian/Mauritius",
+    "Saratov Standard Time": "Europe/Saratov",
+    "Georgian Standard Time": "Asia/Tbilisi",
+    "Caucasus Standard Time": "Asia/Yerevan",
+    "Afghanistan Standard Time": "Asia/Kabul",
+    "West Asia Standard Time": "Asia/Tashkent",
+    "Ekaterinburg Standard Time": "Asia/Yekaterinburg",
+    "Pakistan Standard Time": "Asia/Karachi",
+    "Qyzylorda Standard Time": "Asia/Qyzylorda",
+    "India Standard Time": "Asia/Kolkata",
+    "Sri Lanka Standard Time": "Asia/Colombo",
+    "Nepal Standard Time": "Asia/Kathmandu",
+    "Central Asia Standard Time": "Asia/Almaty",
+    "Bangladesh Standard Time": "Asia/Dhaka",
+    "Omsk Standard Time": "Asia/Omsk",
+    "Myanmar Standard Time": "Asia/Yangon",
+    "SE Asia Standard Time": "Asia/Bangkok",
+    "Altai Standard Time": "Asia/Barnaul",
+    "W. Mongolia Standard Time": "Asia/Hovd",
+    "North Asia Standard Time": "Asia/Krasnoyarsk",
+    "N. Central Asia Standard Time": "Asia/Novosibirsk",
+    "Tomsk Standard Time": "Asia/Tomsk",
+    "China Standard Time": "Asia/Shanghai",
+    "North Asia East Standard Time": "Asia/Irkutsk",
+    "Singapore Standard Time": "Asia/Singapore",
+    "W. Australia Standard Time": "Australia/Perth",
+    "Taipei Standard Time": "Asia/Taipei",
+    "Ulaanbaatar Standard Time": "Asia/Ulaanbaatar",
+    "Aus Central W. Standard Time": "Australia/Eucla",
+    "Transbaikal Standard Time": "Asia/Chita",
+    "Tokyo Standard Time": "Asia/Tokyo",
+    "North Korea Standard Time": "Asia/Pyongyang",
+    "Korea Standard Time": "Asia/Seoul",
+    "Yakutsk Standard Time": "Asia/Yakutsk",
+    "Cen. Australia Standard Time": "Australia/Adelaide",
+    "AUS Central Standard Time": "Australia/Darwin",
+    "E. Australia Standard Time": "Australia/Brisbane",
+    "AUS Eastern Standard Time": "Australia/Sydney",
+    "West Pacific Standard Time": "Pacific/Port_Moresby",
+    "Tasmania Standard Time": "Australia/Hobart",
+    "Vladivostok Standard Time": "Asia/Vladivostok",
+    "Lord Howe Standard Time": "Australia/Lord_Howe",
+    "Bougainville Standard Time": "Pacific/Bougainville",
+    "Russia Time Zone 10": "Asia/Srednekolymsk",
+    "Magadan Standard Time": "Asia/Magadan",
+    "Norfolk Standard Time": "Pacific/Norfolk",
+    "Sakhalin Standard Time": "Asia/Sakhalin",
+    "Central Pacific Standard Time": "Pacific/Guadalcanal",
+    "Russia Time Zone 11": "Asia/Kamchatka",
+    "New Zealand Standard Time": "Pacific/Auckland",
+    "UTC+12": "Etc/GMT-12",
+    "Fiji Standard Time": "Pacific/Fiji",
+    "Chatham Islands Standard Time": "Pacific/Chatham",
+    "UTC+13": "Etc/GMT-13",
+    "Tonga Standard Time": "Pacific/Tongatapu",
+    "Samoa Standard Time": "Pacific/Apia",
+    "Line Islands Standard Time": "Pacific/Kiritimati",
+}
+
+# IANA zone -> Windows name: the reverse of the table plus common zones that share a Windows zone
+IANA_TO_WINDOWS = {iana: windows for windows, iana in WINDOWS_TO_IANA.items()}
+IANA_TO_WINDOWS.update({
+    "Etc/UTC": "UTC", "Etc/GMT": "UTC", "GMT": "UTC", "Zulu": "UTC",
+    "US/Pacific": "Pacific Standard Time", "America/Vancouver": "Pacific Standard Time",
+    "US/Mountain": "Mountain Standard Time", "America/Edmonton": "Mountain Standard Time",
+    "America/Boise": "Mountain Standard Time",
+    "US/Arizona": "US Mountain Standard Time",
+    "US/Central": "Central Standard Time", "America/Winnipeg": "Central Standard Time",
+    "US/Eastern": "Eastern Standard Time", "America/Toronto": "Eastern Standard Time",
+    "America/Detroit": "Eastern Standard Time", "America/Montreal": "Eastern Standard Time",
+    "America/Indianapolis": "US Eastern Standard Time",
+    "US/Alaska": "Alaskan Standard Time", "US/Hawaii": "Hawaiian Standard Time",
+    "America/Lima": "SA Pacific Standard Time", "America/Buenos_Aires": "Argentina Standard Time",
+    "America/Godthab": "Greenland Standard Time",
+    "Europe/Dublin": "GMT Standard Time", "Europe/Lisbon": "GMT Standard Time",
+    "Europe/Amsterdam": "W. Europe Standard Time", "Europe/Rome": "W. Europe Standard Time",
+    "Europe/Stockholm": "W. Europe Standard Time", "Europe/Vienna": "W. Europe Standard Time",
+    "Europe/Zurich": "W. Europe Standard Time", "Europe/Oslo": "W. Europe Standard Time",
+    "Europe/Luxembourg": "W. Europe Standard Time",
+    "Europe/Madrid": "Romance Standard Time", "Europe/Brussels": "Romance Standard Time",
+    "Europe/Copenhagen": "Romance Standard Time",
+    "Europe/Prague": "Central Europe Standard Time", "Europe/Belgrade": "Central Europe Standard Time",
+    "Europe/Bratislava": "Central Europe Standard Time", "Europe/Ljubljana": "Central Europe Standard Time",
+    "Europe/Zagreb": "Central European Standard Time", "Europe/Sarajevo": "Central European Standard Time",
+    "Europe/Athens": "GTB Standard Time",
+    "Europe/Kyiv": "FLE Standard Time", "Europe/Helsinki": "FLE Standard Time",
+    "Europe/Riga": "FLE Standard Time", "Europe/Tallinn": "FLE Standard Time",
+    "Europe/Vilnius": "FLE Standard Time", "Europe/Sofia": "FLE Standard Time",
+    "Asia/Tel_Aviv": "Israel Standard Time",
+    "Asia/Kuwait": "Arab Standard Time", "Asia/Qatar": "Arab Standard Time",
+    "Asia/Muscat": "Arabian Standard Time",
+    "Asia/Calcutta": "India Standard Time",
+    "Asia/Katmandu": "Nepal Standard Time", "Asia/Rangoon": "Myanmar Standard Time",
+    "Asia/Jakarta": "SE Asia Standard Time", "Asia/Ho_Chi_Minh": "SE Asia Standard Time",
+    "Asia/Saigon": "SE Asia Standard Time",
+    "Asia/Hong_Kong": "China Standard Time", "Asia/Macau": "China Standard Time",
+    "Asia/Chongqing": "China Standard Time", "PRC": "China Standard Time",
+    "Asia/Kuala_Lumpur": "Singapore Standard Time", "Asia/Manila": "Singapore Standard Time",
+    "Japan": "Tokyo Standard Time", "ROK": "Korea Standard Time",
+    "Australia/Melbourne": "AUS Eastern Standard Time", "Australia/Canberra": "AUS Eastern Standard Time",
+    "NZ": "New Zealand Standard Time",
+})
+
+# case-insensitive spellings of every known name -> canonical name
+_CANONICAL = {name.casefold(): name for name in (*WINDOWS_TO_IANA, *IANA_TO_WINDOWS)}
+# "UTC+5", "GMT-08:00" and the like
+_OFFSET = re.compile(r"^(?:utc|gmt)\s*([+-])\s*(\d{1,2})(?::?(\d{2}))?$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def zone_info(time_zone: str) -> ZoneInfo:
+    """ZoneInfo for a Windows or IANA zone name; raises ValueError for unknown names"""
+    try:
+        return ZoneInfo(WINDOWS_TO_IANA.get(time_zone, time_zone))
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"unknown time zone: {time_zone!r}")
+
+
+@lru_cache(maxsize=1024)
+def normalize_zone(time_zone: str) -> str:
+    """
+    Canonical Graph time zone for a zone name as the model may write it
+
+    Windows names (any case), IANA names, spoken abbreviations and whole-hour UTC
+    offsets are accepted. Zones with a Windows equivalent come back as the Windows name,
+    other valid IANA zones as themselves; anything else raises ValueError.
+    """
+    name = " ".join(time_zone.split())
+    folded = name.casefold()
+    if folded in _CANONICAL:
+        name = _CANONICAL[folded]
+        return name if name in WINDOWS_TO_IANA else IANA_TO_WINDOWS[name]
+    if folded in ABBREVIATIONS:
+        return ABBREVIATIONS[folded]
+    if match := _OFFSET.match(name):
+        sign, hours, minutes = match.groups()
+        if int(minutes or 0) or int(hours) > 14:
+            raise ValueError(f"unsupported UTC offset: {time_zone!r}")
+        if int(hours) == 0:
+            return "UTC"
+        # Etc/GMT signs are inverted: UTC+5 is Etc/GMT-5
+        iana = f"Etc/GMT{'-' if sign == '+' else '+'}{int(hours)}"
+        return IANA_TO_WINDOWS.get(iana, iana)
+    zone_info(name)
+    return name
+
+
+def to_utc(value: datetime, time_zone: str) -> datetime:
+    """Convert a naive wall-clock time in `time_zone` to an aware UTC datetime"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=zone_info(time_zone))
+    return value.astimezone(timezone.utc)
+
+
+# spoken abbreviations and names -> Windows time zone
+ABBREVIATIONS = {
+    "pst": "Pacific Standard Time", "pdt": "Pacific Standard Time", "pt": "Pacific Standard Time",
+    "pacific": "Pacific Standard Time",
+    "mst": "Mountain Standard Time", "mdt": "Mountain Standard Time", "mt": "Mountain Standard Time",
+    "mountain": "Mountain Standard Time",
+    "cst": "Central Standard Time", "cdt": "Central Standard Time", "ct": "Central Standard Time",
+    "central": "Central Standard Time",
+    "est": "Eastern Standard Time", "edt": "Eastern Standard Time", "et": "Eastern Standard Time",
+    "eastern": "Eastern Standard Time",
+    "akst": "Alaskan Standard Time", "akdt": "Alaskan Standard Time", "alaska": "Alaskan Standard Time",
+    "hst": "Hawaiian Standard Time", "hawaii": "Hawaiian Standard Time",
+    "utc": "UTC", "gmt": "UTC", "zulu": "UTC",
+    "bst": "GMT Standard Time", "london": "GMT Standard Time", "uk": "GMT Standard Time",
+    "cet": "W. Europe Standard Time", "cest": "W. Europe Standard Time",
+    "ist": "India Standard Time", "india": "India Standard Time",
+    "jst": "Tokyo Standard Time", "japan": "Tokyo Standard Time",
+    "aest": "AUS Eastern Standard Time", "aedt": "AUS Eastern Standard Time", "sydney": "AUS Eastern Standard Time",
+}
@@ -0,0 +1,68 @@
+import os
+
+import httpx
+from kiota_authentication_azure.azure_identity_authentication_provider import AzureIdentityAuthenticationProvider
+from kiota_http.middleware.options import RetryHandlerOption
+from msgraph import GraphRequestAdapter, GraphServiceClient
+from msgraph.graph_request_adapter import options as GRAPH_MIDDLEWARE_OPTIONS
+from msgraph_core import GraphClientFactory
+
+from .metrics import record_graph_response
+
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# connection pool limits, overridable from the environment
+MAX_CONNECTIONS = int(os.getenv("GRAPH_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GRAPH_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("GRAPH_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("GRAPH_HTTP2", "1") != "0"
+
+# the process-wide client, created on first use
+_http_client = None
+
+
+async def _record_response(response: httpx.Response):
+    record_graph_response(response.status_code)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared async HTTP client used for all Graph traffic
+
+    It keeps connections alive, speaks HTTP/2 (one connection multiplexes many
+    concurrent requests) and carries the Graph middleware pipeline (retry, redirect,
+    telemetry) once, however many GraphServiceClients are built on top of it.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            event_hooks={"response": [_record_response]},
+        )
+        # the SDK's own options: among others they rewrite /users/me-token-to-replace to /me.
+        # Throttling is retried by utils.throttle, which needs to see it to slow down.
+        options = {**GRAPH_MIDDLEWARE_OPTIONS, RetryHandlerOption.get_key(): RetryHandlerOption(should_retry=False)}
+        _http_client = GraphClientFactory.create_with_default_middleware(client=client, options=options)
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared client and its pooled connections, e.g. at process exit"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# builds a GraphServiceClient that sends its requests through the shared transport
+def build_graph_client(credential, scopes: list[str], base_url: str = GRAPH_BASE_URL) -> GraphServiceClient:
+    auth_provider = AzureIdentityAuthenticationProvider(credential, scopes=scopes)
+    adapter = GraphRequestAdapter(auth_provider, client=get_http_client())
+    adapter.base_url = base_url
+    return GraphServiceClient(request_adapter=adapter)
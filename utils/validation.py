@@ -0,0 +1,230 @@
+from datetime import datetime, timedelta, timezone
+from typing import Union
+
+from .timezones import normalize_zone, zone_info
+
+# meetings may start this long before CurrentTime ("now", or a request that took a while)
+PAST_GRACE = timedelta(minutes=5)
+# duration given to meetings whose end equals their start
+DEFAULT_DURATION = timedelta(minutes=30)
+# longest meeting an am/pm repair of the end may produce
+AMPM_MAX_DURATION = timedelta(hours=4)
+# a date that has passed this year moves to next year only if that is at most this far away
+YEAR_ROLLOVER = timedelta(days=183)
+DATE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class InvalidMeeting(ValueError):
+    """Parsed meeting details that cannot be scheduled; `problems` lists why"""
+
+    def __init__(self, problems: list[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+# naive wall-clock time in `zone`, from an ISO 8601 string that may carry an offset or "Z"
+def _parse_wall_time(value: str, zone: str) -> datetime:
+    parsed = datetime.fromisoformat(value.strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(zone_info(zone)).replace(tzinfo=None)
+    return parsed.replace(microsecond=0)
+
+
+# the same wall time, moved forward past a DST gap if it falls in one
+def _skip_gap(value: datetime, zone: str) -> datetime:
+    tz = zone_info(zone)
+    return value.replace(tzinfo=tz).astimezone(timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+
+def _add_years(value: datetime, years: int) -> datetime:
+    try:
+        return value.replace(year=value.year + years)
+    except ValueError:
+        # 29 February
+        return value.replace(year=value.year + years, day=28)
+
+
+def _utc(value: datetime, zone: str) -> datetime:
+    return value.replace(tzinfo=zone_info(zone)).astimezone(timezone.utc)
+
+
+def _reference_time(current_time: Union[str, datetime, None]) -> datetime:
+    if current_time is None:
+        return datetime.now(timezone.utc)
+    if isinstance(current_time, str):
+        current_time = datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
+    # CurrentTime is the local wall clock of this machine
+    return current_time.astimezone(timezone.utc)
+
+
+# repaired copy of a RecurrenceSpec for a series starting at `start`; unfixable problems go to `problems`
+def _check_recurrence(spec, start: datetime, problems: list, repairs: list):
+    from .recurrence import WEEKDAYS
+
+    update = {}
+    if spec.interval < 1:
+        update["interval"] = 1
+        repairs.append(f"recurrence interval {spec.interval} -> 1")
+    days = [day.lower() for day in spec.days_of_week if day.lower() in WEEKDAYS]
+    if spec.pattern_type in ("weekly", "relativeMonthly", "relativeYearly") and not days:
+        days = [WEEKDAYS[start.weekday()]]
+        repairs.append(f"recurrence without days of the week, using {days[0]} (the start)")
+    if days != spec.days_of_week:
+        update["days_of_week"] = days
+    if spec.pattern_type in ("absoluteMonthly", "absoluteYearly"):
+        if spec.day_of_month is None:
+            update["day_of_month"] = start.day
+        elif not 1 <= spec.day_of_month <= 31:
+            problems.append(f"recurrence day of month {spec.day_of_month} is not 1-31")
+    if spec.pattern_type.endswith("Yearly"):
+        if spec.month is None:
+            update["month"] = start.month
+        elif not 1 <= spec.month <= 12:
+            problems.append(f"recurrence month {spec.month} is not 1-12")
+    if spec.pattern_type.startswith("relative") and spec.index is None:
+        update["index"] = "first"
+    if spec.range_type == "endDate":
+        try:
+            end_date = datetime.fromisoformat((spec.end_date or "")[:10]).date()
+        except ValueError:
+            problems.append(f"recurrence end date {spec.end_date!r} is not YYYY-MM-DD")
+        else:
+            if end_date < start.date():
+                problems.append(f"recurrence ends ({end_date}) before it starts ({start.date()})")
+            update["end_date"] = end_date.isoformat()
+    if spec.range_type == "numbered" and not (spec.number_of_occurrences or 0) >= 1:
+        problems.append(f"recurrence needs a number of occurrences, got {spec.number_of_occurrences!r}")
+    if spec.range_type == "endDate" and spec.end_date == update.get("end_date"):
+        del update["end_date"]
+    return spec.model_copy(update=update) if update else spec
+
+
+# checks (and where unambiguous repairs) parsed meeting details before anything is sent to Graph
+def validate_meeting(details, current_time: Union[str, datetime, None] = None, check_past: bool = True):
+    """
+    Normalize and check the times and zones of parsed meeting details locally
+
+    Repairs: zone names are made canonical (see timezones.normalize_zone) and a missing
+    or unknown zone on one side takes the other side's; offsets and "Z" are converted to
+    wall-clock time in the zone; a wall time inside a DST gap moves past it; an end
+    equal to the start or past midnight is fixed, and so is an AM end after a PM start
+    that is 12 hours early (am/pm mix-up) when the meeting then lasts at most
+    AMPM_MAX_DURATION; a start in the past only because of the year moves to the first
+    year where it is not, and a date that has passed this year moves to next year when
+    that is within YEAR_ROLLOVER ("Jan 5" said on Dec 30). A
+    recurrence gets missing pattern fields from the start, and the start moves to the
+    series' first occurrence.
+
+    Args:
+        details (IntentParserOutput): parsed meeting
+        current_time (str | datetime, optional): CurrentTime of the parse
+            ("%Y-%m-%d %H:%M:%S" local time); defaults to now
+        check_past (bool): reject (or repair) a start before current_time; off when
+            editing a meeting whose start did not change, which may have begun already
+
+    Returns:
+        tuple[IntentParserOutput, list[str]]: the repaired details and what was repaired
+
+    Raises:
+        InvalidMeeting: for problems that cannot be repaired
+    """
+    problems, repairs = [], []
+
+    zones, unknown = {}, {}
+    for side in ("start", "end"):
+        raw = getattr(details, f"{side}_time_zone") or ""
+        try:
+            zones[side] = normalize_zone(raw)
+        except ValueError:
+            unknown[side] = raw
+            continue
+        if zones[side] != raw:
+            repairs.append(f"{side} time zone {raw!r} -> {zones[side]!r}")
+    if len(unknown) == 2:
+        raise InvalidMeeting([f"unknown time zone {raw!r}" for raw in dict.fromkeys(unknown.values())])
+    for side, raw in unknown.items():
+        other = zones["end" if side == "start" else "start"]
+        zones[side] = other
+        repairs.append(f"{side} time zone {raw!r} -> {other!r} (the {'end' if side == 'start' else 'start'} zone)")
+
+    times, shifts = {}, {}
+    for side in ("start", "end"):
+        raw = getattr(details, f"{side}_date_time") or ""
+        try:
+            times[side] = _parse_wall_time(raw, zones[side])
+        except ValueError:
+            problems.append(f"{side} time {raw!r} is not ISO 8601")
+            continue
+        shifted = _skip_gap(times[side], zones[side])
+        if shifted != times[side]:
+            repairs.append(f"{side} time {times[side]:%H:%M} does not exist in {zones[side]} (DST), "
+                           f"moved to {shifted:%H:%M}")
+            shifts[side] = shifted - times[side]
+            times[side] = shifted
+    if problems:
+        raise InvalidMeeting(problems)
+
+    start, end = times["start"], times["end"]
+    if "start" in shifts and "end" not in shifts and zones["start"] == zones["end"]:
+        # keep the requested duration
+        end += shifts["start"]
+    start_utc, end_utc = _utc(start, zones["start"]), _utc(end, zones["end"])
+    if end_utc == start_utc:
+        end = start + DEFAULT_DURATION
+        end_utc = _utc(end, zones["end"])
+        repairs.append(f"end time equal to start, set to {int(DEFAULT_DURATION.total_seconds() // 60)} minutes later")
+    elif end_utc < start_utc:
+        ampm_length = _utc(end + timedelta(hours=12), zones["end"]) - start_utc
+        if start.hour >= 12 and end.hour < 12 and timedelta(0) < ampm_length <= AMPM_MAX_DURATION:
+            end += timedelta(hours=12)
+            repairs.append("end time was 12 hours early (am/pm), moved 12 hours later")
+        elif end.date() == start.date() and \
+                _utc(end + timedelta(days=1), zones["end"]) - start_utc <= timedelta(hours=12):
+            end += timedelta(days=1)
+            repairs.append("end time is after midnight, moved to the next day")
+        else:
+            problems.append(f"end {end.isoformat()} is before start {start.isoformat()}")
+
+    now = _reference_time(current_time)
+    if check_past and not problems and start_utc < now - PAST_GRACE:
+        # a model that assumed the wrong year; other dates in the past are real mistakes
+        years = next((n for n in range(1, now.year - start.year + 2)
+                      if _utc(_add_years(start, n), zones["start"]) >= now - PAST_GRACE), None)
+        rollover = years == 1 and start.year == now.year and \
+            _utc(_add_years(start, 1), zones["start"]) - now <= YEAR_ROLLOVER
+        if years is not None and (start.year < now.year or rollover):
+            repairs.append(f"start {start:%Y-%m-%d} is in the past, moved to {start.year + years}")
+            start, end = _add_years(start, years), _add_years(end, years)
+        else:
+            problems.append(f"start {start.isoformat()} is before the current time")
+    if problems:
+        raise InvalidMeeting(problems)
+
+    recurrence = getattr(details, "recurrence", None)
+    if recurrence is not None:
+        from .recurrence import expand_dates
+
+        recurrence = _check_recurrence(recurrence, start, problems, repairs)
+        if problems:
+            raise InvalidMeeting(problems)
+        first = expand_dates(recurrence, start.date())
+        if not len(first):
+            raise InvalidMeeting(["recurrence has no occurrences"])
+        # Graph starts the series on the first day that fits the pattern, not on the parsed date
+        shift = first[0].item() - start.date()
+        if shift:
+            start, end = start + shift, end + shift
+            repairs.append(f"start {start - shift:%Y-%m-%d} does not fit the recurrence, "
+                           f"moved to the first occurrence {start:%Y-%m-%d}")
+
+    update = {
+        "start_time_zone": zones["start"],
+        "end_time_zone": zones["end"],
+        "start_date_time": start.strftime(DATE_TIME_FORMAT),
+        "end_date_time": end.strftime(DATE_TIME_FORMAT),
+    }
+    if recurrence is not None:
+        update["recurrence"] = recurrence
+    if all(getattr(details, key) == value for key, value in update.items()):
+        return details, repairs
+    return details.model_copy(update=update), repairs